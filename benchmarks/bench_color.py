@@ -0,0 +1,34 @@
+"""
+    Batched color conversions for a frame of bulbs : pure Python against NumPy (when installed)
+
+    python -m benchmarks.bench_color
+"""
+import random
+import timeit
+from pyyeelight import yeelightColor
+
+FRAME_SIZE = 10000
+
+
+def main(number=20):
+    colors = [(random.randrange(256), random.randrange(256), random.randrange(256)) for _ in range(FRAME_SIZE)]
+    hsv = [(random.randrange(360), random.randrange(101)) for _ in range(FRAME_SIZE)]
+    temperatures = [random.randrange(1700, 6501) for _ in range(FRAME_SIZE)]
+    numpy = yeelightColor.get_numpy()
+    print("{:<20}{:>14}{:>14}".format("{} colors".format(FRAME_SIZE), "python ms", "numpy ms"))
+    for name, function, values in (("rgb_to_int", yeelightColor.rgb_to_int_array, colors),
+                                   ("hsv_to_rgb", yeelightColor.hsv_to_rgb_array, hsv),
+                                   ("rgb_to_hsv", yeelightColor.rgb_to_hsv_array, colors),
+                                   ("ct_to_rgb", yeelightColor.ct_to_rgb_array, temperatures),
+                                   ("rgb_to_ct", yeelightColor.rgb_to_ct_array, colors)):
+        python = min(timeit.repeat(lambda: function(values, use_numpy=False), number=number, repeat=3)) / number
+        if numpy is None:
+            print("{:<20}{:>14.2f}{:>14}".format(name, python * 1e3, "-"))
+            continue
+        array = numpy.asarray(values)
+        vectorized = min(timeit.repeat(lambda: function(array, use_numpy=True), number=number, repeat=3)) / number
+        print("{:<20}{:>14.2f}{:>14.2f}".format(name, python * 1e3, vectorized * 1e3))
+
+
+if __name__ == "__main__":
+    main()
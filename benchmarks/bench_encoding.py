@@ -0,0 +1,49 @@
+"""
+    Throughput of YeelightCommand message encoding, compared to the string concatenation encoder it replaced
+
+    python -m benchmarks.bench_encoding
+"""
+import timeit
+from pyyeelight.yeelightMessage import YeelightCommand
+
+COMMANDS = [("set_rgb", [16711680, "smooth", 500]),
+            ("set_bright", [30, "smooth", 30]),
+            ("get_prop", ["power", "bright", "ct", "rgb", "hue", "sat", "color_mode", "flowing", "delayoff",
+                          "flow_params", "music_on", "name"]),
+            ("toggle", None)]
+
+
+class ConcatenationCommand(YeelightCommand):
+    """
+        Command with the string concatenation encoder used before the json one, kept here as reference
+    """
+
+    def build_message(self):
+        inline_params = ""
+        if self.params is not None:
+            if type(self.params) is list:
+                for x in self.params:
+                    if x != self.params[0]:
+                        inline_params += ", "
+                    if type(x) is int:
+                        inline_params += str(x)
+                    else:
+                        inline_params += '"{}"'.format(x)
+            else:
+                inline_params += '"{}"'.format(self.params)
+        self.message = '{{"id":{},"method":"{}","params":[{}]}}\r\n'.format(str(self.command_id), self.method,
+                                                                            inline_params)
+
+
+def main(number=20000):
+    print("{:<12}{:>16}{:>16}".format("method", "old cmd/s", "new cmd/s"))
+    for method, params in COMMANDS:
+        old = min(timeit.repeat(lambda: ConcatenationCommand(1234, method, params).get_message().encode(),
+                                number=number, repeat=3))
+        new = min(timeit.repeat(lambda: YeelightCommand(1234, method, params).get_message_bytes(), number=number,
+                                repeat=3))
+        print("{:<12}{:>16.0f}{:>16.0f}".format(method, number / old, number / new))
+
+
+if __name__ == "__main__":
+    main()
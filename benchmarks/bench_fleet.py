@@ -0,0 +1,98 @@
+"""
+    Scaling of YeelightFleet with the number of worker processes : group commands per second over a fleet of
+    simulated bulbs. The fake bulbs listen on distinct loopback ips (127.0.0.2, 127.0.0.3, ...) so the fleet can
+    shard them by ip, and are served from their own processes so they don't compete with the fleet for a GIL.
+
+    python -m benchmarks.bench_fleet
+    python -m benchmarks.bench_fleet --bulbs 2000 --processes 1 2 4 8
+"""
+import argparse
+import multiprocessing
+import os
+import time
+from pyyeelight import YeelightFleet
+from pyyeelight.tests.yeelightFakeBulb import YeelightFakeBulb
+
+
+def loopback_ip(index):
+    index += 2
+    return "127.{}.{}.{}".format(index >> 16 & 0xFF, index >> 8 & 0xFF, index & 0xFF)
+
+
+def serve_fakes(connection, first, count, latency):
+    """
+        Run fake bulbs until the benchmark is done, their addresses are sent back through the connection
+    """
+    fakes = [YeelightFakeBulb(host=loopback_ip(index), latency=latency) for index in range(first, first + count)]
+    for fake in fakes:
+        fake.start()
+    connection.send([fake.get_address() for fake in fakes])
+    connection.recv()
+    for fake in fakes:
+        fake.stop()
+
+
+def start_fakes(bulbs, servers, latency):
+    """
+        :return: the server processes with their connection, and the address of every fake bulb
+    """
+    processes = []
+    addresses = []
+    per_server = -(-bulbs // servers)
+    for first in range(0, bulbs, per_server):
+        connection, server_connection = multiprocessing.Pipe()
+        process = multiprocessing.Process(target=serve_fakes, daemon=True,
+                                          args=(server_connection, first, min(per_server, bulbs - first), latency))
+        process.start()
+        processes.append((process, connection))
+    for _, connection in processes:
+        addresses.extend(connection.recv())
+    return processes, addresses
+
+
+def bench_fleet(addresses, processes, rounds):
+    with YeelightFleet(addresses, processes=processes) as fleet:
+        result = fleet.refresh_property()
+        if not result.is_success():
+            raise RuntimeError("Fleet failed : {}".format(result))
+        started_at = time.perf_counter()
+        for index in range(rounds):
+            result = fleet.set_brightness(index % 100 + 1)
+            if not result.is_success():
+                raise RuntimeError("Fleet failed : {}".format(result))
+        elapsed = time.perf_counter() - started_at
+        if len(fleet.get_state()) != len(addresses):
+            raise RuntimeError("State of {} bulbs only".format(len(fleet.get_state())))
+    return {"cmd_per_s": len(addresses) * rounds / elapsed, "round": elapsed / rounds}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="YeelightFleet scaling against simulated bulbs")
+    parser.add_argument("--bulbs", type=int, default=512, help="number of fake bulbs")
+    parser.add_argument("--processes", type=int, nargs="+", help="numbers of worker processes to compare, "
+                                                                  "1 up to the number of cores by default")
+    parser.add_argument("--servers", type=int, default=os.cpu_count() or 1, help="processes serving the fake bulbs")
+    parser.add_argument("--rounds", type=int, default=20, help="group commands sent to the fleet")
+    parser.add_argument("--latency", type=float, default=0.0, help="response latency of the fake bulbs in seconds")
+    args = parser.parse_args(argv)
+    cores = os.cpu_count() or 1
+    counts = args.processes or sorted({1, 2, 4, 8, cores} & set(range(1, cores + 1)))
+
+    servers, addresses = start_fakes(args.bulbs, args.servers, args.latency)
+    try:
+        print("{:<12}{:>14}{:>12}{:>10}".format("processes", "cmd/s", "round ms", "speedup"))
+        reference = None
+        for processes in counts:
+            stats = bench_fleet(addresses, processes, args.rounds)
+            reference = reference or stats["cmd_per_s"]
+            print("{:<12}{:>14.0f}{:>12.2f}{:>10.2f}".format(processes, stats["cmd_per_s"], stats["round"] * 1e3,
+                                                              stats["cmd_per_s"] / reference))
+    finally:
+        for process, connection in servers:
+            connection.send(None)
+            process.join(5)
+    return 0
+
+
+if __name__ == "__main__":
+    main()
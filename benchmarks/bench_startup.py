@@ -0,0 +1,65 @@
+"""
+    Startup cost of a short lived process : time to import pyyeelight, to build a bulb without connecting, and
+    latency of the first command (connection and first schema validation included), each measured in a fresh
+    interpreter against a simulated bulb.
+
+    python -m benchmarks.bench_startup
+    python -m benchmarks.bench_startup --runs 20
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+from pyyeelight.tests.yeelightFakeBulb import YeelightFakeBulb
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Run in a fresh interpreter, prints the time of each phase in seconds
+STARTUP_SCRIPT = """
+import json, sys, time
+started_at = time.perf_counter()
+import pyyeelight
+imported_at = time.perf_counter()
+bulb = pyyeelight.YeelightBulb(sys.argv[1], int(sys.argv[2]), lazy=True)
+built_at = time.perf_counter()
+bulb.set_brightness(50)
+done_at = time.perf_counter()
+print(json.dumps({"import": imported_at - started_at, "construct": built_at - imported_at,
+                  "first_command": done_at - built_at}))
+"""
+
+
+def median(samples):
+    ordered = sorted(samples)
+    return ordered[len(ordered) // 2]
+
+
+def bench_startup(fake, runs):
+    """
+        :return: median time in seconds of each startup phase over the runs
+        :rtype: dict
+    """
+    environment = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, (ROOT, os.environ.get("PYTHONPATH")))))
+    ip, port = fake.get_address()
+    samples = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, "-c", STARTUP_SCRIPT, ip, str(port)], env=environment,
+                                check=True, stdout=subprocess.PIPE, universal_newlines=True).stdout
+        samples.append(json.loads(output))
+    return {phase: median([sample[phase] for sample in samples]) for phase in samples[0]}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="pyyeelight startup cost")
+    parser.add_argument("--runs", type=int, default=10, help="fresh interpreters started")
+    args = parser.parse_args(argv)
+    with YeelightFakeBulb() as fake:
+        stats = bench_startup(fake, args.runs)
+    for phase, value in stats.items():
+        print("{:<16}{:>10.2f} ms".format(phase, value * 1e3))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,192 @@
+"""
+    Benchmark suite run against simulated bulbs : encode/decode cost, commands per second and p50/p99 latency of
+    sequential and pipelined commands, fan-out time of a group command over a fleet of bulbs, startup cost of a
+    fresh process (see bench_startup).
+
+    python -m benchmarks.bench_suite              compare with the stored baseline, exit 1 on a regression
+    python -m benchmarks.bench_suite --save       store the results as the new baseline
+    python -m benchmarks.bench_suite --latency 0.002 --bulbs 32
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from pyyeelight import YeelightBulb, YeelightGroup
+from pyyeelight.yeelightAPICall import YeelightAPICall
+from pyyeelight.yeelightConnection import YeelightConnectionPool
+from pyyeelight.yeelightMessage import YeelightCommand, YeelightResponse, YeelightStreamReader
+from pyyeelight.tests.yeelightFakeBulb import YeelightFakeBulb
+from .bench_startup import bench_startup
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+# Relative change accepted before a result is reported as a regression, timings on a shared machine are noisy
+DEFAULT_TOLERANCE = 0.3
+
+# Results where a lower value is better, every other result is a rate
+LOWER_IS_BETTER = ("p50", "p99", "duration", "spread", "import", "construct", "first_command")
+
+# Fresh interpreters started by the startup benchmark
+STARTUP_RUNS = 5
+
+
+def percentile(samples, value):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * value / 100.0))]
+
+
+def latency_stats(samples, elapsed):
+    return {"cmd_per_s": len(samples) / elapsed,
+            "p50": percentile(samples, 50),
+            "p99": percentile(samples, 99)}
+
+
+def bench_encode(number):
+    started_at = time.perf_counter()
+    for command_id in range(number):
+        YeelightCommand(command_id, "set_rgb", [16711680, "smooth", 500]).get_message_bytes()
+    return {"cmd_per_s": number / (time.perf_counter() - started_at)}
+
+
+def bench_decode(number):
+    command = YeelightCommand(1234, "get_prop", ["power", "bright", "ct", "rgb"])
+    line = b'{"id":1234,"result":["on","50","4000","16711680"]}\r\n'
+    reader = YeelightStreamReader()
+    started_at = time.perf_counter()
+    for _ in range(number):
+        for data in reader.feed(line):
+            YeelightResponse(data, command)
+    return {"msg_per_s": number / (time.perf_counter() - started_at)}
+
+
+def bench_sequential(fake, count):
+    api_call = YeelightAPICall(*fake.get_address(), connection_pool=YeelightConnectionPool())
+    api_call.operate_on_bulb("get_prop", ["power"])
+    samples = []
+    started_at = time.perf_counter()
+    for index in range(count):
+        sent_at = time.perf_counter()
+        api_call.operate_on_bulb("set_bright", [index % 100 + 1, "smooth", 30])
+        samples.append(time.perf_counter() - sent_at)
+    elapsed = time.perf_counter() - started_at
+    api_call.close()
+    return latency_stats(samples, elapsed)
+
+
+def bench_pipeline(fake, count, batch):
+    api_call = YeelightAPICall(*fake.get_address(), connection_pool=YeelightConnectionPool())
+    api_call.operate_on_bulb("get_prop", ["power"])
+    calls = [("set_bright", [index % 100 + 1, "smooth", 30]) for index in range(batch)]
+    samples = []
+    started_at = time.perf_counter()
+    for _ in range(count // batch):
+        sent_at = time.perf_counter()
+        api_call.operate_on_bulb_pipeline(calls)
+        samples.append(time.perf_counter() - sent_at)
+    elapsed = time.perf_counter() - started_at
+    api_call.close()
+    stats = latency_stats(samples, elapsed)
+    stats["cmd_per_s"] *= batch
+    return stats
+
+
+def bench_fanout(fakes, rounds):
+    bulbs = [YeelightBulb(*fake.get_address()) for fake in fakes]
+    durations = []
+    spreads = []
+    with YeelightGroup(bulbs) as group:
+        # Warm-up round, the first validation loads voluptuous (measured by the startup benchmark)
+        group.set_brightness(50)
+        for index in range(rounds):
+            result = group.set_brightness(index % 100 + 1)
+            if not result.is_success():
+                raise RuntimeError("Fan-out failed : {}".format(result))
+            durations.append(result.get_duration())
+            spreads.append(result.get_spread())
+    for bulb in bulbs:
+        bulb.api_call.close()
+    return {"bulbs": len(fakes),
+            "duration": percentile(durations, 50),
+            "spread": percentile(spreads, 50),
+            "p99": percentile(durations, 99)}
+
+
+def run(latency, bulbs, count, batch, rounds, number):
+    results = {"encode": bench_encode(number), "decode": bench_decode(number)}
+    with YeelightFakeBulb(latency=latency) as fake:
+        results["sequential"] = bench_sequential(fake, count)
+        results["pipeline"] = bench_pipeline(fake, count, batch)
+        results["startup"] = bench_startup(fake, STARTUP_RUNS)
+    fakes = [YeelightFakeBulb(latency=latency) for _ in range(bulbs)]
+    for fake in fakes:
+        fake.start()
+    try:
+        results["fanout"] = bench_fanout(fakes, rounds)
+    finally:
+        for fake in fakes:
+            fake.stop()
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """
+        :return: description of each result worse than the baseline by more than the tolerance
+        :rtype: list of str
+    """
+    regressions = []
+    for name, values in results.items():
+        for key, value in values.items():
+            reference = baseline.get(name, {}).get(key)
+            if not reference or key == "bulbs":
+                continue
+            if key in LOWER_IS_BETTER:
+                change = value / reference - 1
+            else:
+                change = reference / value - 1
+            if change > tolerance:
+                regressions.append("{}.{} : {:.6g} (baseline {:.6g}, {:+.0%} worse)".format(name, key, value,
+                                                                                            reference, change))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="pyyeelight benchmarks against simulated bulbs")
+    parser.add_argument("--latency", type=float, default=0.0, help="response latency of the fake bulbs in seconds")
+    parser.add_argument("--bulbs", type=int, default=16, help="number of bulbs of the fan-out benchmark")
+    parser.add_argument("--count", type=int, default=2000, help="commands sent by the latency benchmarks")
+    parser.add_argument("--batch", type=int, default=16, help="commands per pipeline")
+    parser.add_argument("--rounds", type=int, default=50, help="group commands of the fan-out benchmark")
+    parser.add_argument("--number", type=int, default=20000, help="messages of the encode/decode benchmarks")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="baseline file")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument("--save", action="store_true", help="store the results as the baseline")
+    args = parser.parse_args(argv)
+
+    results = run(args.latency, args.bulbs, args.count, args.batch, args.rounds, args.number)
+    for name, values in results.items():
+        print("{:<12}".format(name) + "  ".join("{} {:.6g}".format(key, value) for key, value in values.items()))
+
+    parameters = {"latency": args.latency, "bulbs": args.bulbs, "count": args.count, "batch": args.batch,
+                  "rounds": args.rounds, "number": args.number}
+    if args.save:
+        with open(args.baseline, "w") as baseline_file:
+            json.dump({"parameters": parameters, "results": results}, baseline_file, indent=2, sort_keys=True)
+        print("Baseline stored in {}".format(args.baseline))
+        return 0
+    if not os.path.exists(args.baseline):
+        print("No baseline to compare with, store one with --save")
+        return 0
+    with open(args.baseline) as baseline_file:
+        baseline = json.load(baseline_file)
+    if baseline.get("parameters") != parameters:
+        print("The baseline was made with other parameters : {}".format(baseline.get("parameters")))
+        return 0
+    regressions = compare(results, baseline["results"], args.tolerance)
+    for regression in regressions:
+        print("REGRESSION " + regression)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,39 @@
+"""
+    Validation cost per command : schema built on every call (old behaviour), cached schema, fast mode
+
+    python -m benchmarks.bench_validation
+"""
+import timeit
+from voluptuous import Schema, All, Any, Range
+from pyyeelight import yeelightValidation
+
+VALUES = {'red': 255, 'green': 128, 'blue': 0, 'effect': "smooth", 'transition_time': 500}
+
+
+def schema_per_call():
+    schema = Schema({'red': All(int, Range(min=0, max=255)),
+                     'green': All(int, Range(min=0, max=255)),
+                     'blue': All(int, Range(min=0, max=255)),
+                     'effect': Any("sudden", "smooth"),
+                     'transition_time': All(int, Range(min=30))})
+    schema(VALUES)
+
+
+def cached_schema():
+    yeelightValidation.validate("set_rgb", VALUES, yeelightValidation.MODE_SCHEMA)
+
+
+def fast_mode():
+    yeelightValidation.validate("set_rgb", VALUES, yeelightValidation.MODE_FAST)
+
+
+def main(number=20000):
+    print("{:<20}{:>14}".format("set_rgb validation", "us / command"))
+    for name, function in (("schema per call", schema_per_call), ("cached schema", cached_schema),
+                           ("fast mode", fast_mode)):
+        duration = min(timeit.repeat(function, number=number, repeat=3)) / number
+        print("{:<20}{:>14.2f}".format(name, duration * 1e6))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""
+    Replay a journal recorded with YeelightJournal against fake bulbs, one per recorded bulb, at several speeds
+
+    python -m benchmarks.replay_journal traffic.journal
+    python -m benchmarks.replay_journal traffic.journal --speed 1 4 16 0 --latency 0.002
+"""
+import argparse
+import sys
+from pyyeelight.yeelightJournal import YeelightReplay, read_journal, RECORD_COMMAND
+from pyyeelight.tests.yeelightFakeBulb import YeelightFakeBulb
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay a pyyeelight journal against simulated bulbs")
+    parser.add_argument("journal", help="journal file")
+    parser.add_argument("--speed", type=float, nargs="+", default=[1.0],
+                        help="replay speeds, 1 for the recorded pace, 0 as fast as possible")
+    parser.add_argument("--latency", type=float, default=0.0, help="response latency of the fake bulbs in seconds")
+    args = parser.parse_args(argv)
+
+    records = [record for record in read_journal(args.journal) if record[0] == RECORD_COMMAND]
+    if not records:
+        print("No command in {}".format(args.journal))
+        return 1
+    bulbs = sorted({record[2] for record in records})
+    # Commands of a bulb that is off would be rejected, the fake bulbs start on like most recorded traffic
+    fakes = {bulb: YeelightFakeBulb(latency=args.latency) for bulb in bulbs}
+    for fake in fakes.values():
+        fake.start()
+    try:
+        addresses = {bulb: fake.get_address() for bulb, fake in fakes.items()}
+        print("{} commands to {} bulbs over {:.1f}s".format(len(records), len(bulbs), records[-1][1] - records[0][1]))
+        print("{:<8}{:>10}{:>12}{:>10}{:>10}{:>10}{:>8}".format("speed", "duration", "cmd/s", "p50 ms", "p99 ms",
+                                                                  "lag ms", "errors"))
+        for speed in args.speed:
+            stats = YeelightReplay(records, addresses, speed).run()
+            print("{:<8}{:>10.2f}{:>12.0f}{:>10.2f}{:>10.2f}{:>10.2f}{:>8}".format(
+                "max" if not speed else "{:g}x".format(speed), stats["duration"], stats["cmd_per_s"],
+                stats["p50"] * 1e3, stats["p99"] * 1e3, stats["lag"] * 1e3, stats["errors"]))
+    finally:
+        for fake in fakes.values():
+            fake.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,11 +1,25 @@
+import importlib
+import threading
+import time
 from .yeelightAPICall import YeelightAPICall
-from voluptuous import Schema, All, Any, Range
+from .yeelightMessage import YeelightNotification
+from .yeelightMetrics import YeelightMetrics, YeelightHistogram
+from .yeelightCircuitBreaker import YeelightCircuitBreaker, YeelightCircuitOpen, YeelightRetryPolicy
+from . import yeelightValidation
+from . import yeelightColor
+from .yeelightMusic import YeelightMusicMode
+from .yeelightRateLimiter import YeelightRateLimiter, YeelightCommandDropped
+from .yeelightScene import YeelightScene
+from .yeelightFlow import YeelightFlow, YeelightAnimation
+from .yeelightState import YeelightStateStore, YeelightBulbState
+from .yeelightCapability import YeelightCapabilities, YeelightCommandRefused
+from .yeelightJournal import YeelightJournal, YeelightReplay, read_journal
 
 
 class YeelightBulb:
     """
-     TODO : check every method with bulb off (software off) to see if the command is allowed
-
+        Commands the bulb can't run (not supported by its model, or not accepted while it is off, see
+        YeelightCapabilities) are refused locally with YeelightCommandRefused, without any network I/O.
     """
 
     POWER_OFF = "off"
@@ -37,15 +51,102 @@ class YeelightBulb:
     ADJUST_PROPERTY_COLOR_TEMPERATURE = "ct"
     ADJUST_PROPERTY_COLOR = "color"
 
-    def __init__(self, ip, port=55443):
-        self.api_call = YeelightAPICall(ip, port)
-        self.property = dict.fromkeys([self.PROPERTY_NAME_POWER, self.PROPERTY_NAME_BRIGHTNESS,
-                                       self.PROPERTY_NAME_COLOR_TEMPERATURE, self.PROPERTY_NAME_RGB_COLOR,
-                                       self.PROPERTY_NAME_HUE, self.PROPERTY_NAME_SATURATION,
-                                       self.PROPERTY_NAME_COLOR_MODE, self.PROPERTY_NAME_FLOW,
-                                       self.PROPERTY_NAME_SLEEP_REMAINING, self.PROPERTY_NAME_FLOW_PARAMETERS,
-                                       self.PROPERTY_NAME_MUSIC_IS_ON, self.PROPERTY_NAME_BULB_NAME])
-        self.refresh_property()
+    # Time in seconds to wait for the bulb to notify the new value after an adjust
+    ADJUST_NOTIFICATION_TIMEOUT = 0.5
+
+    VALIDATION_SCHEMA = yeelightValidation.MODE_SCHEMA
+    VALIDATION_FAST = yeelightValidation.MODE_FAST
+
+    # Properties of every bulb, stored in columns so the whole fleet can be queried at once
+    state_store = YeelightStateStore()
+
+    # Default of the lazy argument : True builds every bulb without any network I/O, e.g. in short lived scripts
+    lazy = False
+
+    # Capabilities of the bulbs that were neither discovered nor probed
+    UNKNOWN_CAPABILITIES = YeelightCapabilities()
+
+    def __init__(self, ip, port=55443, lazy=None, property_ttl=None, validation_mode=None, rate_limiter=None,
+                 metrics=None, journal=None):
+        """
+            :param ip: ip of the bulb
+            :param port: port of the bulb
+            :param lazy: if True, the properties are not loaded now but the first time they are read, and the
+                         bulb is built without connecting to it. The class default is used if None
+            :param property_ttl: time in seconds after which a cached property is read again from the bulb by
+                                 get_property. None keeps the cached values until they are refreshed or notified
+            :param validation_mode: VALIDATION_SCHEMA to check the inputs with voluptuous, VALIDATION_FAST for
+                                    plain range checks, None to use the global mode (see yeelightValidation)
+            :param rate_limiter: scheduler keeping the commands under the bulb quota, commands are sent right
+                                 away if None
+            :param metrics: metrics recording the commands sent to the bulb, see YeelightAPICall.metrics
+            :param journal: journal recording the commands sent to the bulb, see YeelightAPICall.journal
+
+            :type ip: str
+            :type port: int
+            :type lazy: bool
+            :type property_ttl: float
+            :type validation_mode: str
+            :type rate_limiter: YeelightRateLimiter
+            :type metrics: YeelightMetrics
+            :type journal: YeelightJournal
+        """
+        self.setup(YeelightAPICall(ip, port, metrics=metrics, journal=journal), property_ttl, validation_mode,
+                   rate_limiter)
+        if lazy is None:
+            lazy = self.lazy
+        if not lazy:
+            self.refresh_property()
+
+    @classmethod
+    def from_device(cls, device, **kwargs):
+        """
+            Build a bulb from a discovered device, the advertised properties are used without sending get_prop.
+            The properties that are not advertised are read the first time they are needed.
+
+            :param device: device found by YeelightDiscovery
+            :param kwargs: other arguments of the bulb constructor
+            :type device: YeelightDevice
+            :rtype: YeelightBulb
+        """
+        kwargs["lazy"] = True
+        bulb = cls(device.ip, device.port, **kwargs)
+        bulb.device = device
+        bulb.capabilities = YeelightCapabilities.from_device(device)
+        bulb.update_property({name: value for name, value in device.properties.items() if name in bulb.property})
+        return bulb
+
+    def setup(self, api_call, property_ttl=None, validation_mode=None, rate_limiter=None):
+        """
+            Set the bulb up around its API call, without any network I/O. Shared by the subclasses using another
+            API call. See __init__ for the other arguments.
+
+            :param api_call: API call sending the commands to the bulb
+            :type api_call: YeelightAPICall
+        """
+        self.api_call = api_call
+        self.validation_mode = validation_mode
+        self.rate_limiter = rate_limiter
+        self.music_mode = None
+        self.device = None
+        self.capabilities = None
+        self.init_property(property_ttl)
+        # Set by the notifications, only built once adjust needs to wait for one
+        self.notified = None
+        # Keep the properties up to date with the notifications sent by the bulb
+        self.api_call.add_notification_listener(self.on_notification)
+        # Without the connection there are no notifications, the properties can't be trusted anymore
+        self.api_call.add_close_listener(self.on_connection_closed)
+
+    def init_property(self, property_ttl=None):
+        """
+            Take a slot in the state store for the properties, every property is unknown until it is read from
+            the bulb. Values are typed by YeelightStateStore.decode : ints for the numeric properties, "on"/"off"
+            for power.
+        """
+        self.property = self.state_store.allocate(self, "{}:{}".format(self.api_call.ip, self.api_call.port))
+        self.property_ttl = property_ttl
+        self.subscribers = []
 
     def is_on(self):
         return self.property[self.PROPERTY_NAME_POWER] == self.POWER_ON
@@ -53,26 +154,269 @@ class YeelightBulb:
     def is_off(self):
         return self.property[self.PROPERTY_NAME_POWER] == self.POWER_OFF
 
-    def get_property(self, property_name):
-        try:
-            return self.property[property_name]
-        except KeyError:
+    def get_property(self, property_name, max_age=None):
+        """
+            Return a property, read again from the bulb only if the cached value is too old
+
+            :param property_name: name of the property
+            :param max_age: maximum age in seconds of the cached value, property_ttl is used if None
+            :type property_name: str
+            :type max_age: float
+        """
+        if property_name not in self.property:
             print("This property '{}' is not available".format(property_name))
             return None
+        stale = self.get_stale_properties([property_name], max_age)
+        if stale:
+            self.refresh_property(stale)
+        return self.property[property_name]
+
+    def get_properties(self, property_names=None, max_age=None):
+        """
+            Return several properties, the stale ones are read from the bulb with one get_prop command
+
+            :param property_names: names of the properties, all the properties if None
+            :param max_age: maximum age in seconds of the cached values, property_ttl is used if None
+            :rtype: dict
+        """
+        if property_names is None:
+            property_names = list(self.property)
+        stale = self.get_stale_properties(property_names, max_age)
+        if stale:
+            self.refresh_property(stale)
+        return {name: self.property[name] for name in property_names}
 
     def get_all_properties(self):
-        return self.property
+        return dict(self.property)
+
+    def get_rgb_color(self, max_age=None):
+        """
+            :param max_age: maximum age in seconds of the cached value, property_ttl is used if None
+            :return: (red, green, blue) of the rgb property, None if it is unknown
+            :rtype: tuple
+        """
+        rgb = self.get_property(self.PROPERTY_NAME_RGB_COLOR, max_age)
+        return yeelightColor.int_to_rgb(rgb) if rgb is not None else None
+
+    def get_property_age(self, property_name):
+        """
+            :return: time in seconds since the property was last updated, None if it has never been read
+            :rtype: float
+        """
+        if property_name not in self.property:
+            return None
+        timestamp = self.property.get_timestamp(property_name)
+        if timestamp is None:
+            return None
+        return time.monotonic() - timestamp
+
+    def get_stale_properties(self, property_names, max_age=None):
+        """
+            Select the properties that must be read again from the bulb : never read, or older than max_age
 
-    def refresh_property(self):
+            :param property_names: names of the properties to check
+            :param max_age: maximum age in seconds, property_ttl is used if None
+            :rtype: list
+        """
+        if max_age is None:
+            max_age = self.property_ttl
+        now = time.monotonic()
+        stale = []
+        for name in property_names:
+            timestamp = self.property.get_timestamp(name)
+            if timestamp is None or (max_age is not None and now - timestamp > max_age):
+                stale.append(name)
+        return stale
+
+    def validate(self, method, values):
+        """
+            Check the parameters of a command with the validation mode of the bulb
+
+            :param method: method of the bulb API
+            :param values: value of each parameter
+        """
+        yeelightValidation.validate(method, values, self.validation_mode)
+
+    def send_command(self, method, params=None):
+        """
+            Send a command that changes the bulb state : through the music mode channel if it is running (no
+            response), through the rate limiter if the bulb has one (the command may be queued and replaced by a
+            newer one of the same method), through the API call otherwise
+
+            :param method: method name (see API doc)
+            :param params: parameters used with the method
+            :return: the result of the command, a Future with the rate limiter, None in music mode
+        """
+        if self.music_mode is not None and self.music_mode.is_running():
+            self.music_mode.send(method, params)
+            return None
+        if self.rate_limiter is not None:
+            return self.rate_limiter.submit(self.api_call.operate_on_bulb, method, params)
+        return self.api_call.operate_on_bulb(method, params)
+
+    def call_command(self, method, params=None):
+        """
+            Send a command and wait for its result, after waiting for a token if the bulb has a rate limiter
+
+            :param method: method name (see API doc)
+            :param params: parameters used with the method
+            :return: the result of the command
+            :rtype: list
+        """
+        if self.rate_limiter is not None:
+            return self.rate_limiter.run(self.api_call.operate_on_bulb, method, params)
+        return self.api_call.operate_on_bulb(method, params)
+
+    def start_music_mode(self, host=None, port=0, queue_size=YeelightMusicMode.DEFAULT_QUEUE_SIZE):
+        """
+            Switch the bulb to music mode : the bulb connects back to a local server and the set_* and toggle
+            commands are then streamed to it without quota and without waiting for responses.
+            When commands come faster than they can be sent, only the latest one of each method is kept.
+
+            :param host: local ip the bulb connects to, guessed from the route to the bulb if None
+            :param port: local port the bulb connects to, any free port if 0
+            :param queue_size: maximum number of commands waiting to be sent
+
+            :type host: str
+            :type port: int
+            :type queue_size: int
+            :rtype: YeelightMusicMode
+        """
+        if self.is_music_mode():
+            return self.music_mode
+        self.check_command("set_music")
+        music_mode = YeelightMusicMode(self.api_call, host, port, queue_size)
+        music_mode.start()
+        self.music_mode = music_mode
+        self.update_property({self.PROPERTY_NAME_MUSIC_IS_ON: 1})
+        return music_mode
+
+    def stop_music_mode(self):
+        """
+            Close the music mode channel and switch the bulb back to normal mode
+        """
+        if self.music_mode is None:
+            return
+        music_mode = self.music_mode
+        self.music_mode = None
+        music_mode.stop()
+        self.update_property({self.PROPERTY_NAME_MUSIC_IS_ON: 0})
+
+    def is_music_mode(self):
+        return self.music_mode is not None and self.music_mode.is_running()
+
+    def get_capabilities(self):
+        """
+            :return: the capabilities of the bulb : from its discovery or probe, or cached for its ip and port
+            :rtype: YeelightCapabilities
+        """
+        if self.capabilities is None or self.capabilities.is_expired():
+            self.capabilities = None
+            capabilities = YeelightCapabilities.get_cached(self.api_call.ip, self.api_call.port)
+            if capabilities is None:
+                return self.UNKNOWN_CAPABILITIES
+            self.capabilities = capabilities
+        return self.capabilities
+
+    def probe_capabilities(self, timeout=1.0):
+        """
+            Ask the bulb which methods it supports, with a unicast discovery search sent only if they are not cached
+
+            :param timeout: time in seconds to wait for the answer
+            :rtype: YeelightCapabilities
+        """
+        self.capabilities = YeelightCapabilities.probe(self.api_call.ip, self.api_call.port, timeout)
+        return self.capabilities
+
+    def get_refusal(self, method):
+        """
+            :param method: method of the bulb API
+            :return: why the bulb can't run the method in its current state, None if it can
+            :rtype: str
+        """
+        return self.get_capabilities().get_refusal(method, self.property[self.PROPERTY_NAME_POWER])
+
+    def can_run(self, method):
+        return self.get_refusal(method) is None
+
+    def check_command(self, method):
+        """
+            Raise YeelightCommandRefused if the bulb can't run the method in its current state
+        """
+        self.get_capabilities().check(method, self.property[self.PROPERTY_NAME_POWER])
+
+    def get_circuit_state(self):
+        """
+            State of the circuit breaker of the bulb : "state" is closed while the bulb answers, open while its
+            commands fail fast after repeated connection failures (see YeelightCircuitBreaker)
+            :rtype: dict
+        """
+        return self.api_call.get_circuit_breaker().get_stats()
+
+    def update_property(self, changes):
+        """
+            Store new property values and the time they were updated
+
+            :param changes: new value of each changed property
+            :type changes: dict
+        """
+        self.property.set_values(changes, time.monotonic())
+
+    def subscribe(self, callback):
+        """
+            Register a callback called each time the bulb notifies a property change
+
+            :param callback: function called with the bulb and the dict of the changed properties
+        """
+        self.subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        if callback in self.subscribers:
+            self.subscribers.remove(callback)
+
+    def on_notification(self, data):
+        """
+            Apply to self.property the changes notified by the bulb, then call the subscribers
+
+            :param data: decoded notification
+            :type data: dict
+        """
+        notification = YeelightNotification(data)
+        if not notification.is_props():
+            return
+        changes = {}
+        for name, value in notification.get_properties().items():
+            if name in self.property:
+                changes[name] = self.state_store.decode(name, value)
+        self.update_property(changes)
+        if self.notified is not None:
+            self.notified.set()
+        for callback in list(self.subscribers):
+            callback(self, changes)
+
+    def on_connection_closed(self):
+        """
+            Mark every property as never read when the connection is closed : the changes made meanwhile (e.g. with
+            the remote) are not notified, so the next read asks the bulb and opens the connection again
+        """
+        self.property.expire()
+
+    def refresh_property(self, property_names=None):
+        """
+            Read properties from the bulb with one get_prop command
+
+            :param property_names: names of the properties to read, all the properties if None
+            :type property_names: list of str
+        """
         # Generate a list of str where each str is a property name
-        prop_list = []
-        for prop in self.property.keys():
-            prop_list.append(prop)
+        if property_names is None:
+            prop_list = list(self.property.keys())
+        else:
+            prop_list = list(property_names)
         # Send command to the bulb
-        self.api_call.operate_on_bulb("get_prop", prop_list)
+        result = self.call_command("get_prop", prop_list)
         # Affect each result to the right property dict keys
-        for i in range(len(prop_list)):
-            self.property[prop_list[i]] = self.api_call.get_response()[i]
+        self.update_property(dict(zip(prop_list, result)))
 
     def set_color_temperature(self, temperature, effect=EFFECT_SUDDEN, transition_time=MIN_TRANSITION_TIME):
         """
@@ -81,24 +425,22 @@ class YeelightBulb:
             :param temperature: color temperature to set. It can be between 1700 and 6500 K
             :param effect: if the change is made suddenly or smoothly
             :param transition_time: in case the change is made smoothly, time in ms that change last
+            :return: the result of the command, a Future when the bulb has a rate limiter (see send_command)
 
             :type temperature: int
             :type effect: str
             :type transition_time : int
         """
-        # Check bulb state
-        if self.is_off():
-            raise Exception("set_color_temperature can't be used if the bulb is off. Turn it on first")
+        # Check the bulb can run the command
+        self.check_command("set_ct_abx")
         # Input validation
-        schema = Schema({'temperature': All(int, Range(min=1700, max=6500)),
-                         'effect': Any(self.EFFECT_SUDDEN, self.EFFECT_SMOOTH),
-                         'transition_time': All(int, Range(min=30))})
-        schema({'temperature': temperature, 'effect': effect, 'transition_time': transition_time})
+        self.validate("set_ct_abx", {'temperature': temperature, 'effect': effect, 'transition_time': transition_time})
         # Send command
         params = [temperature, effect, transition_time]
-        self.api_call.operate_on_bulb("set_ct_abx", params)
+        result = self.send_command("set_ct_abx", params)
         # Update property
-        self.property[self.PROPERTY_NAME_COLOR_TEMPERATURE] = temperature
+        self.update_property({self.PROPERTY_NAME_COLOR_TEMPERATURE: temperature})
+        return result
 
     def set_rgb_color(self, red, green, blue, effect=EFFECT_SUDDEN, transition_time=MIN_TRANSITION_TIME):
         """
@@ -109,6 +451,7 @@ class YeelightBulb:
             :param blue: Blue component of the color between 0 and 255
             :param effect: if the change is made suddenly or smoothly
             :param transition_time: in case the change is made smoothly, time in ms that change last
+            :return: the result of the command, a Future when the bulb has a rate limiter (see send_command)
 
             :type red: int
             :type green: int
@@ -116,22 +459,18 @@ class YeelightBulb:
             :type effect: str
             :type transition_time : int
         """
-        # Check bulb state
-        if self.is_off():
-            raise Exception("set_rgb_color can't be used if the bulb is off. Turn it on first")
+        # Check the bulb can run the command
+        self.check_command("set_rgb")
         # Input validation
-        schema = Schema({'red': All(int, Range(min=0, max=255)),
-                         'green': All(int, Range(min=0, max=255)),
-                         'blue': All(int, Range(min=0, max=255)),
-                         'effect': Any(self.EFFECT_SUDDEN, self.EFFECT_SMOOTH),
-                         'transition_time': All(int, Range(min=30))})
-        schema({'red': red, 'green': green, 'blue': blue,  'effect': effect, 'transition_time': transition_time})
+        self.validate("set_rgb", {'red': red, 'green': green, 'blue': blue, 'effect': effect,
+                                  'transition_time': transition_time})
         # Send command
-        rgb = (red*65536) + (green*256) + blue
+        rgb = yeelightColor.rgb_to_int(red, green, blue)
         params = [rgb, effect, transition_time]
-        self.api_call.operate_on_bulb("set_rgb", params)
+        result = self.send_command("set_rgb", params)
         # Update property
-        self.property[self.PROPERTY_NAME_RGB_COLOR] = rgb
+        self.update_property({self.PROPERTY_NAME_RGB_COLOR: rgb})
+        return result
 
     def set_hsv_color(self, hue, saturation, effect=EFFECT_SUDDEN, transition_time=MIN_TRANSITION_TIME):
         """
@@ -142,27 +481,24 @@ class YeelightBulb:
             :param saturation: Saturation component of the color between 0 and 100
             :param effect: if the change is made suddenly or smoothly
             :param transition_time: in case the change is made smoothly, time in ms that change last
+            :return: the result of the command, a Future when the bulb has a rate limiter (see send_command)
 
             :type hue: int
             :type saturation: int
             :type effect: str
             :type transition_time : int
         """
-        # Check bulb state
-        if self.is_off():
-            raise Exception("set_hsv_color can't be used if the bulb is off. Turn it on first")
+        # Check the bulb can run the command
+        self.check_command("set_hsv")
         # Input validation
-        schema = Schema({'hue': All(int, Range(min=0, max=359)),
-                         'saturation': All(int, Range(min=0, max=100)),
-                         'effect': Any(self.EFFECT_SUDDEN, self.EFFECT_SMOOTH),
-                         'transition_time': All(int, Range(min=30))})
-        schema({'hue': hue, 'saturation': saturation, 'effect': effect, 'transition_time': transition_time})
+        self.validate("set_hsv", {'hue': hue, 'saturation': saturation, 'effect': effect,
+                                  'transition_time': transition_time})
         # Send command
         params = [hue, saturation, effect, transition_time]
-        self.api_call.operate_on_bulb("set_hsv", params)
+        result = self.send_command("set_hsv", params)
         # Update property
-        self.property[self.PROPERTY_NAME_HUE] = hue
-        self.property[self.PROPERTY_NAME_SATURATION] = saturation
+        self.update_property({self.PROPERTY_NAME_HUE: hue, self.PROPERTY_NAME_SATURATION: saturation})
+        return result
 
     def set_brightness(self, brightness, effect=EFFECT_SUDDEN, transition_time=MIN_TRANSITION_TIME):
         """
@@ -173,24 +509,22 @@ class YeelightBulb:
                                while 1 means the minimum brightness.
             :param effect: if the change is made suddenly or smoothly
             :param transition_time: in case the change is made smoothly, time in ms that change last
+            :return: the result of the command, a Future when the bulb has a rate limiter (see send_command)
 
             :type brightness: int
             :type effect: str
             :type transition_time : int
         """
-        # Check bulb state
-        if self.is_off():
-            raise Exception("set_brightness can't be used if the bulb is off. Turn it on first")
+        # Check the bulb can run the command
+        self.check_command("set_bright")
         # Input validation
-        schema = Schema({'brightness': All(int, Range(min=1, max=100)),
-                         'effect': Any(self.EFFECT_SUDDEN, self.EFFECT_SMOOTH),
-                         'transition_time': All(int, Range(min=30))})
-        schema({'brightness': brightness, 'effect': effect, 'transition_time': transition_time})
+        self.validate("set_bright", {'brightness': brightness, 'effect': effect, 'transition_time': transition_time})
         # Send command
         params = [brightness, effect, transition_time]
-        self.api_call.operate_on_bulb("set_bright", params)
+        result = self.send_command("set_bright", params)
         # Update property
-        self.property[self.PROPERTY_NAME_BRIGHTNESS] = brightness
+        self.update_property({self.PROPERTY_NAME_BRIGHTNESS: brightness})
+        return result
 
     def turn_on(self, effect=EFFECT_SUDDEN, transition_time=MIN_TRANSITION_TIME):
         """
@@ -198,6 +532,7 @@ class YeelightBulb:
 
             :param effect: if the change is made suddenly or smoothly
             :param transition_time: in case the change is made smoothly, time in ms that change last
+            :return: the result of the command, a Future when the bulb has a rate limiter (see send_command)
 
             :type effect: str
             :type transition_time : int
@@ -206,15 +541,15 @@ class YeelightBulb:
         if self.is_on():
             return
         else:
+            self.check_command("set_power")
             # Input validation
-            schema = Schema(
-                {'effect': Any(self.EFFECT_SUDDEN, self.EFFECT_SMOOTH), 'transition_time': All(int, Range(min=30))})
-            schema({'effect': effect, 'transition_time': transition_time})
+            self.validate("set_power", {'effect': effect, 'transition_time': transition_time})
             # Send command
             params = ["on", effect, transition_time]
-            self.api_call.operate_on_bulb("set_power", params)
+            result = self.send_command("set_power", params)
             # Update property
-            self.property[self.PROPERTY_NAME_POWER] = self.POWER_ON
+            self.update_property({self.PROPERTY_NAME_POWER: self.POWER_ON})
+            return result
 
     def turn_off(self, effect=EFFECT_SUDDEN, transition_time=MIN_TRANSITION_TIME):
         """
@@ -222,6 +557,7 @@ class YeelightBulb:
 
             :param effect: if the change is made suddenly or smoothly
             :param transition_time: in case the change is made smoothly, time in ms that change last
+            :return: the result of the command, a Future when the bulb has a rate limiter (see send_command)
 
             :type effect: str
             :type transition_time : int
@@ -230,29 +566,99 @@ class YeelightBulb:
         if self.is_off():
             return
         else:
+            self.check_command("set_power")
             # Input validation
-            schema = Schema(
-                {'effect': Any(self.EFFECT_SUDDEN, self.EFFECT_SMOOTH), 'transition_time': All(int, Range(min=30))})
-            schema({'effect': effect, 'transition_time': transition_time})
+            self.validate("set_power", {'effect': effect, 'transition_time': transition_time})
             # Send command
             params = ["off", effect, transition_time]
-            self.api_call.operate_on_bulb("set_power", params)
+            result = self.send_command("set_power", params)
             # Update property
-            self.property[self.PROPERTY_NAME_POWER] = self.POWER_OFF
+            self.update_property({self.PROPERTY_NAME_POWER: self.POWER_OFF})
+            return result
 
     def toggle(self):
         """
             This method is used to toggle the smart LED (software managed off).
             This method is defined because sometimes user may just want to flip the state without knowing the
             current state
+            :return: the result of the command, a Future when the bulb has a rate limiter (see send_command)
         """
+        self.check_command("toggle")
+        # Read before sending, the notification of the bulb can update the power before send_command returns
+        power = self.get_toggled_power()
         # Send command
-        self.api_call.operate_on_bulb("toggle")
+        result = self.send_command("toggle")
         # Update property
+        if power is not None:
+            self.update_property({self.PROPERTY_NAME_POWER: power})
+        return result
+
+    def get_toggled_power(self):
+        """
+            :return: the power after a toggle, None if the current power is unknown
+            :rtype: str
+        """
         if self.is_on():
-            self.property[self.PROPERTY_NAME_POWER] = self.POWER_OFF
-        elif self.is_off():
-            self.property[self.PROPERTY_NAME_POWER] = self.POWER_ON
+            return self.POWER_OFF
+        if self.is_off():
+            return self.POWER_ON
+        return None
+
+    def check_scene(self, scene):
+        """
+            Raise YeelightCommandRefused if the bulb can't apply the scene : set_scene works while the bulb is off,
+            but a color scene needs a color bulb
+        """
+        capabilities = self.get_capabilities()
+        capabilities.check("set_scene")
+        required = scene.get_required_method()
+        if required is not None and not capabilities.supports(required):
+            raise YeelightCommandRefused("set_scene", "the bulb doesn't support {} scenes".format(scene.scene_type))
+
+    def set_scene(self, scene):
+        """
+            Apply a scene with one command : power, color and brightness change together. The bulb is switched on
+            if it is off, so the cached power state doesn't need to be checked.
+
+            :param scene: scene to apply
+            :type scene: YeelightScene
+            :return: the result of the command, a Future when the bulb has a rate limiter (see send_command)
+        """
+        self.check_scene(scene)
+        # Send command
+        result = self.send_command("set_scene", scene.get_params())
+        # Update property
+        self.update_property(scene.get_properties())
+        return result
+
+    def start_flow(self, flow):
+        """
+            Start a color flow : the bulb runs the whole sequence by itself after this one command
+
+            :param flow: flow to run
+            :return: the result of the command, a Future when the bulb has a rate limiter (see send_command)
+            :type flow: YeelightFlow
+        """
+        self.check_command("start_cf")
+        # Send command
+        params = flow.get_params()
+        result = self.send_command("start_cf", params)
+        # Update property
+        self.update_property({self.PROPERTY_NAME_FLOW: 1, self.PROPERTY_NAME_FLOW_PARAMETERS: params[2]})
+        return result
+
+    def stop_flow(self):
+        """
+            Stop the running color flow
+
+            :return: the result of the command, a Future when the bulb has a rate limiter (see send_command)
+        """
+        self.check_command("stop_cf")
+        # Send command
+        result = self.send_command("stop_cf")
+        # Update property
+        self.update_property({self.PROPERTY_NAME_FLOW: 0})
+        return result
 
     def save_state(self):
         """
@@ -264,11 +670,10 @@ class YeelightBulb:
 
             Only accepted if the smart LED is currently in "on" state.
         """
-        # Check bulb state
-        if self.is_off():
-            raise Exception("save_state can't be used if the bulb is off. Turn it on first")
+        # Check the bulb can run the command
+        self.check_command("set_default")
         # Send command
-        self.api_call.operate_on_bulb("set_default")
+        self.call_command("set_default")
 
     def adjust(self, action, prop):
         """
@@ -290,16 +695,17 @@ class YeelightBulb:
             :type prop: str
         """
         # Input validation
-        schema = Schema(
-            {'action': Any(self.ADJUST_ACTION_CIRCLE, self.ADJUST_ACTION_DECREASE, self.ADJUST_ACTION_INCREASE),
-             'prop': Any(self.ADJUST_PROPERTY_BRIGHTNESS, self.ADJUST_PROPERTY_COLOR,
-                         self.ADJUST_PROPERTY_COLOR_TEMPERATURE)})
-        schema({'action': action, 'prop': prop})
+        self.validate("set_adjust", {'action': action, 'prop': prop})
+        self.check_command("set_adjust")
         # Send command
         params = [action, prop]
-        self.api_call.operate_on_bulb("set_adjust", params)
-        # Update property
-        self.refresh_property()  # TODO : do more test to handle property change without sending another command
+        if self.notified is None:
+            self.notified = threading.Event()
+        self.notified.clear()
+        self.call_command("set_adjust", params)
+        # Update property : the bulb notifies the new value, read it only if the notification doesn't come
+        if not self.notified.wait(self.ADJUST_NOTIFICATION_TIMEOUT):
+            self.refresh_property()
 
     # WARNING : This method is in the API documentation but after some test the method is not supported by Bulbs
     # def set_name(self, name):
@@ -321,3 +727,21 @@ class YeelightBulb:
     #     self.api_call.operate_on_bulb("set_name", [name])
     #     # Update property
     #     #self.property[self.PROPERTY_NAME_BRIGHTNESS] = brightness
+
+
+from .yeelightGroup import YeelightGroup, YeelightGroupResult
+from .yeelightDiscovery import YeelightDiscovery, YeelightRegistry, YeelightDevice
+
+# Classes imported the first time they are used : asyncio and multiprocessing are slow to import and most scripts
+# only need YeelightBulb
+LAZY_IMPORTS = {"AsyncYeelightAPICall": "yeelightAsync", "AsyncYeelightBulb": "yeelightAsync",
+                "YeelightFleet": "yeelightFleet", "YeelightFleetError": "yeelightFleet"}
+
+
+def __getattr__(name):
+    module_name = LAZY_IMPORTS.get(name)
+    if module_name is None:
+        raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+    value = getattr(importlib.import_module("." + module_name, __name__), name)
+    globals()[name] = value
+    return value
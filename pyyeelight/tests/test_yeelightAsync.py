@@ -0,0 +1,69 @@
+import asyncio
+import socket
+import threading
+import time
+import pytest
+from pyyeelight.yeelightAsync import AsyncYeelightAPICall, AsyncYeelightBulb
+from pyyeelight.yeelightCapability import YeelightCommandRefused
+from pyyeelight.yeelightConnection import YeelightConnectionPool
+from pyyeelight.tests.yeelightFakeBulb import YeelightFakeBulb
+
+
+@pytest.fixture
+def silent_bulb():
+    """
+        Server accepting the connections and never answering, like a bulb gone without closing them
+    """
+    server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server_socket.bind(("127.0.0.1", 0))
+    server_socket.listen(8)
+    clients = []
+
+    def accept_loop():
+        while True:
+            try:
+                clients.append(server_socket.accept()[0])
+            except OSError:
+                return
+
+    acceptor = threading.Thread(target=accept_loop, daemon=True)
+    acceptor.start()
+    yield server_socket.getsockname()
+    server_socket.close()
+    for client in clients:
+        client.close()
+
+
+def test_silent_bulb_times_out(silent_bulb):
+    async def main():
+        pool = YeelightConnectionPool(read_timeout=0.2)
+        api_call = AsyncYeelightAPICall(*silent_bulb, connection_pool=pool)
+        started_at = time.monotonic()
+        with pytest.raises(socket.timeout):
+            await api_call.operate_on_bulb("toggle")
+        # toggle is not idempotent, it is not retried
+        assert time.monotonic() - started_at < 0.4
+        assert not api_call.pending
+        assert not api_call.is_connected()
+        with pytest.raises(socket.timeout):
+            await api_call.operate_on_bulb_pipeline([("get_prop", ["power"])])
+        # One failure per command or pipeline, like the sync API call
+        assert api_call.get_circuit_breaker().get_stats()["failures"] == 2
+
+    asyncio.run(main())
+
+
+def test_async_bulb_inherited_methods():
+    async def main(fake):
+        bulb = AsyncYeelightBulb(*fake.get_address())
+        assert not bulb.is_music_mode()
+        assert bulb.get_circuit_state()["state"] == "closed"
+        assert await bulb.get_property("power") == "on"
+        assert await bulb.send_command("set_bright", [20, "sudden", 30]) == ["ok"]
+        assert await bulb.get_property("bright", max_age=0) == 20
+        with pytest.raises(YeelightCommandRefused):
+            bulb.start_music_mode()
+        await bulb.close()
+
+    with YeelightFakeBulb() as fake:
+        asyncio.run(main(fake))
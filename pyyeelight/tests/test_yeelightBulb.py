@@ -0,0 +1,91 @@
+import threading
+import time
+import pytest
+from pyyeelight import YeelightBulb
+from pyyeelight.yeelightFlow import YeelightFlow
+from pyyeelight.yeelightRateLimiter import YeelightRateLimiter
+from pyyeelight.tests.yeelightFakeBulb import YeelightFakeBulb
+
+
+@pytest.fixture
+def fake():
+    with YeelightFakeBulb() as fake:
+        yield fake
+
+
+@pytest.fixture
+def bulb(fake):
+    bulb = YeelightBulb(*fake.get_address())
+    yield bulb
+    bulb.api_call.close()
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def test_toggle_keeps_cache_and_bulb_in_sync(fake, bulb):
+    for _ in range(5):
+        bulb.toggle()
+        # The notification of the bulb may come before or after the toggle returns
+        assert wait_for(lambda: bulb.property["power"] == fake.properties["power"])
+    assert bulb.get_property("power") == "off"
+
+
+def test_properties_expire_with_the_connection(fake, bulb):
+    assert bulb.get_property_age("power") is not None
+    closed = threading.Event()
+    bulb.api_call.add_close_listener(closed.set)
+    # The bulb closes the idle connection, the notifications stop
+    for client in list(fake.clients):
+        fake.close_client(client)
+    assert closed.wait(2)
+    assert bulb.get_property_age("power") is None
+    # The value is kept, but the next read asks the bulb and opens the connection again
+    assert bulb.property["power"] == "on"
+    fake.reset_stats()
+    assert bulb.get_property("power") == "on"
+    assert fake.get_stats()["commands"] == {"get_prop": 1}
+    bulb.api_call.remove_close_listener(closed.set)
+
+
+def test_listeners_added_while_notifying(fake, bulb):
+    connection = bulb.api_call.get_connection()
+    received = []
+    stop = threading.Event()
+
+    def add_listeners():
+        while not stop.is_set():
+            callback = received.append
+            connection.add_listener(callback)
+            connection.remove_listener(callback)
+
+    thread = threading.Thread(target=add_listeners)
+    thread.start()
+    try:
+        for brightness in range(1, 50):
+            bulb.set_brightness(brightness)
+    finally:
+        stop.set()
+        thread.join()
+    # The listener of the bulb is never lost by the concurrent changes of the list
+    assert wait_for(lambda: bulb.property["bright"] == 49)
+    assert len(connection.listeners) == 1
+
+
+def test_flow_commands_return_the_future(fake):
+    bulb = YeelightBulb(*fake.get_address(), lazy=True, rate_limiter=YeelightRateLimiter(burst=1))
+    try:
+        started = bulb.start_flow(YeelightFlow().rgb(255, 0, 0, 500))
+        # Queued behind start_cf, the error of the command would be lost without the future
+        stopped = bulb.stop_flow()
+        assert started.result(2) == ["ok"]
+        assert stopped.result(2) == ["ok"]
+        assert fake.properties["flowing"] == "0"
+    finally:
+        bulb.api_call.close()
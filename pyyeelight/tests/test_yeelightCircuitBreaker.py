@@ -0,0 +1,86 @@
+import asyncio
+import socket
+import pytest
+from pyyeelight.yeelightAPICall import YeelightAPICall
+from pyyeelight.yeelightAsync import AsyncYeelightAPICall
+from pyyeelight.yeelightCircuitBreaker import YeelightCircuitBreaker, YeelightCircuitOpen, YeelightRetryPolicy
+from pyyeelight.yeelightConnection import YeelightConnectionPool
+from pyyeelight.tests.yeelightFakeBulb import YeelightFakeBulb
+
+
+@pytest.fixture
+def closed_port():
+    """
+        Address nothing listens on, connecting is refused right away
+    """
+    probe_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    probe_socket.bind(("127.0.0.1", 0))
+    address = probe_socket.getsockname()
+    probe_socket.close()
+    return address
+
+
+@pytest.fixture
+def retry_policy():
+    return YeelightRetryPolicy(attempts=3, base_delay=0.001)
+
+
+def test_breaker_states():
+    breaker = YeelightCircuitBreaker("127.0.0.1:55443", failure_threshold=2, cooldown=0.0)
+    changes = []
+    breaker.add_listener(lambda breaker, previous, state: changes.append(state))
+    breaker.record_failure()
+    assert breaker.get_state() == breaker.STATE_CLOSED
+    breaker.record_failure()
+    assert breaker.get_state() == breaker.STATE_OPEN
+    # The cooldown is over, one trial command is let through
+    breaker.before_call()
+    assert breaker.get_state() == breaker.STATE_HALF_OPEN
+    breaker.record_success()
+    assert changes == [breaker.STATE_OPEN, breaker.STATE_HALF_OPEN, breaker.STATE_CLOSED]
+    assert breaker.get_stats()["failures"] == 0
+
+
+def test_retries_count_as_one_failure(closed_port, retry_policy):
+    api_call = YeelightAPICall(*closed_port, connection_pool=YeelightConnectionPool(), retry_policy=retry_policy)
+    with pytest.raises(ConnectionRefusedError):
+        api_call.operate_on_bulb("get_prop", ["power"])
+    stats = api_call.get_circuit_breaker().get_stats()
+    assert (stats["state"], stats["failures"]) == (YeelightCircuitBreaker.STATE_CLOSED, 1)
+    # A single failed command doesn't black the bulb out, the next one is sent
+    with pytest.raises(ConnectionRefusedError):
+        api_call.operate_on_bulb("get_prop", ["power"])
+    with pytest.raises(ConnectionRefusedError):
+        api_call.operate_on_bulb("get_prop", ["power"])
+    # Opened after failure_threshold commands failed in a row
+    with pytest.raises(YeelightCircuitOpen):
+        api_call.operate_on_bulb("get_prop", ["power"])
+
+
+def test_success_resets_failures(retry_policy):
+    with YeelightFakeBulb() as fake:
+        api_call = YeelightAPICall(*fake.get_address(), connection_pool=YeelightConnectionPool(),
+                                   retry_policy=retry_policy)
+        breaker = api_call.get_circuit_breaker()
+        breaker.record_failure()
+        assert api_call.operate_on_bulb("get_prop", ["power"]) == ["on"]
+        assert breaker.get_stats()["failures"] == 0
+        api_call.close()
+
+
+def test_async_retries_count_as_one_failure(closed_port, retry_policy):
+    async def main():
+        api_call = AsyncYeelightAPICall(*closed_port, connection_pool=YeelightConnectionPool())
+        api_call.retry_policy = retry_policy
+        with pytest.raises(ConnectionRefusedError):
+            await api_call.operate_on_bulb("get_prop", ["power"])
+        assert api_call.get_circuit_breaker().get_stats()["failures"] == 1
+        with pytest.raises(ConnectionRefusedError):
+            await api_call.operate_on_bulb_pipeline([("get_prop", ["power"])])
+        with pytest.raises(ConnectionRefusedError):
+            await api_call.operate_on_bulb("get_prop", ["power"])
+        # The pipeline goes through the breaker too
+        with pytest.raises(YeelightCircuitOpen):
+            await api_call.operate_on_bulb_pipeline([("get_prop", ["power"])])
+
+    asyncio.run(main())
@@ -0,0 +1,52 @@
+import random
+import pytest
+from pyyeelight import yeelightColor
+
+np = pytest.importorskip("numpy")
+
+
+def random_colors(count, seed=0):
+    generator = random.Random(seed)
+    colors = [(generator.randrange(256), generator.randrange(256), generator.randrange(256)) for _ in range(count)]
+    return colors + [(0, 0, 0), (255, 255, 255), (128, 128, 128), (255, 0, 0), (0, 255, 0), (0, 0, 255)]
+
+
+def assert_same(function, values):
+    """
+        The NumPy version of a conversion gives the same result as the pure Python one
+    """
+    expected = np.asarray(function(values, use_numpy=False))
+    result = function(values, use_numpy=True)
+    assert isinstance(result, np.ndarray)
+    mismatches = np.flatnonzero((result != expected).reshape(len(values), -1).any(axis=1))
+    assert not len(mismatches), [(values[index], result[index], expected[index]) for index in mismatches[:5]]
+
+
+def test_hsv_to_rgb_array_matches_scalar():
+    assert_same(yeelightColor.hsv_to_rgb_array,
+                [(hue, saturation) for hue in range(360) for saturation in range(101)])
+
+
+def test_rgb_to_hsv_array_matches_scalar():
+    assert_same(yeelightColor.rgb_to_hsv_array, random_colors(100000))
+
+
+def test_rgb_to_int_array_matches_scalar():
+    colors = random_colors(1000)
+    assert_same(yeelightColor.rgb_to_int_array, colors)
+    assert_same(yeelightColor.int_to_rgb_array, [yeelightColor.rgb_to_int(*color) for color in colors])
+
+
+def test_ct_to_rgb_array_matches_scalar():
+    assert_same(yeelightColor.ct_to_rgb_array, list(range(1000, 7001)))
+
+
+def test_rgb_to_ct_array_matches_scalar():
+    assert_same(yeelightColor.rgb_to_ct_array, random_colors(20000))
+
+
+def test_round_trip():
+    for hue in range(0, 360, 15):
+        red, green, blue = yeelightColor.hsv_to_rgb(hue, 100)
+        assert yeelightColor.rgb_to_hsv(red, green, blue) == (hue, 100)
+        assert yeelightColor.int_to_rgb(yeelightColor.rgb_to_int(red, green, blue)) == (red, green, blue)
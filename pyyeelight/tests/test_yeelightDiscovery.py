@@ -0,0 +1,162 @@
+import socket
+import threading
+import time
+import pytest
+from pyyeelight import YeelightBulb
+from pyyeelight.yeelightCapability import YeelightCapabilities
+from pyyeelight.yeelightDiscovery import YeelightDevice, YeelightDiscovery, YeelightRegistry
+from pyyeelight.tests.yeelightFakeBulb import YeelightFakeBulb
+from pyyeelight.tests.yeelightFakeDiscovery import YeelightFakeDiscovery
+
+FOREIGN_REPLY = (b"HTTP/1.1 200 OK\r\nCACHE-CONTROL: max-age=1800\r\nLOCATION: http://192.168.1.1:49152/rootDesc.xml\r\n"
+                 b"ST: upnp:rootdevice\r\nUSN: uuid:router::upnp:rootdevice\r\n")
+
+
+def get_message(location, device_id="0x01"):
+    return "HTTP/1.1 200 OK\r\nLocation: {}\r\nid: {}\r\nmodel: color\r\n".format(location, device_id).encode()
+
+
+def test_from_message():
+    server = YeelightFakeDiscovery()
+    device = YeelightDevice.from_message(server.get_message(
+        server.SEARCH_RESPONSE_START, "0x0000000002dfb19a", "192.168.1.239", 55443, max_age=60,
+        properties={"power": "on", "bright": "100", "name": "salon"}))
+    assert (device.device_id, device.ip, device.port) == ("0x0000000002dfb19a", "192.168.1.239", 55443)
+    assert device.model == "color"
+    assert device.firmware == "18"
+    assert "set_bright" in device.support
+    assert device.properties == {"power": "on", "bright": "100", "name": "salon"}
+    assert not device.is_expired()
+
+
+def test_from_message_default_port():
+    assert YeelightDevice.from_message(get_message("yeelight://192.168.1.239")).port == YeelightDevice.DEFAULT_PORT
+
+
+@pytest.mark.parametrize("location", ["yeelight://192.168.1.239:port", "yeelight://192.168.1.239:99999",
+                                      "yeelight://192.168.1.239:-1", "yeelight://:55443"])
+def test_from_message_invalid_location(location):
+    assert YeelightDevice.from_message(get_message(location)) is None
+
+
+def test_from_message_foreign_device():
+    assert YeelightDevice.from_message(FOREIGN_REPLY) is None
+    assert YeelightDevice.from_message(b"\x00\xff garbage") is None
+
+
+def test_registry_listeners():
+    registry = YeelightRegistry()
+    added = []
+    registry.add_listener(added.append)
+    registry.update(YeelightDevice("0x01", "192.168.1.10", 55443))
+    registry.update(YeelightDevice("0x01", "192.168.1.10", 55443))
+    # Moved bulb
+    registry.update(YeelightDevice("0x01", "192.168.1.11", 55443))
+    registry.update(YeelightDevice("0x02", "192.168.1.12", 55443, max_age=-1))
+    assert [device.ip for device in added] == ["192.168.1.10", "192.168.1.11", "192.168.1.12"]
+    assert registry.find("192.168.1.11").device_id == "0x01"
+    assert registry.get("0x02") is None
+    assert len(registry) == 1
+    registry.purge()
+    assert list(registry.devices) == ["0x01"]
+
+
+@pytest.fixture
+def server():
+    with YeelightFakeDiscovery() as server:
+        yield server
+
+
+def test_search_skips_invalid_replies(server):
+    server.add_reply(FOREIGN_REPLY)
+    server.add_reply(get_message("yeelight://127.0.0.1:not_a_port", "0xbad"))
+    server.add_bulb("0x01", "127.0.0.1", 55443)
+    server.add_bulb("0x02", "127.0.0.2", 55444)
+    discovery = YeelightDiscovery(multicast_address="127.0.0.1", multicast_port=server.port)
+    devices = discovery.search(timeout=0.5)
+    assert sorted((device.device_id, device.ip, device.port) for device in devices) == \
+        [("0x01", "127.0.0.1", 55443), ("0x02", "127.0.0.2", 55444)]
+    assert len(discovery.registry) == 2
+    assert server.searches == 1
+
+
+def test_probe(server):
+    server.add_bulb("0x01", "127.0.0.1", 55443)
+    discovery = YeelightDiscovery(multicast_port=server.port)
+    assert discovery.probe("127.0.0.1", timeout=0.5).device_id == "0x01"
+
+
+def test_probe_without_answer():
+    with YeelightFakeDiscovery() as server:
+        discovery = YeelightDiscovery(multicast_port=server.port)
+        assert discovery.probe("127.0.0.1", timeout=0.2) is None
+
+
+def test_bulb_from_discovered_device(server):
+    with YeelightFakeBulb(properties={"bright": "42"}) as fake:
+        server.add_bulb("0x01", *fake.get_address(), properties={"power": "on", "bright": "42"})
+        discovery = YeelightDiscovery(multicast_address="127.0.0.1", multicast_port=server.port)
+        device, = discovery.search(timeout=0.5)
+        bulb = YeelightBulb.from_device(device)
+        # The advertised properties are used without asking the bulb
+        assert bulb.get_property("bright") == 42
+        assert fake.get_stats()["commands"] == {}
+        assert bulb.get_property("ct") == 4000
+        assert fake.get_stats()["commands"] == {"get_prop": 1}
+        bulb.api_call.close()
+
+
+def get_free_udp_port():
+    probe_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        probe_socket.bind(("", 0))
+        return probe_socket.getsockname()[1]
+    finally:
+        probe_socket.close()
+
+
+def test_listen_to_advertisements():
+    port = get_free_udp_port()
+    discovery = YeelightDiscovery(multicast_port=port)
+    found = threading.Event()
+    discovery.registry.add_listener(lambda device: found.set())
+    try:
+        discovery.start_listening()
+    except OSError as error:
+        pytest.skip("Multicast is not available : {}".format(error))
+    try:
+        YeelightFakeDiscovery().notify((discovery.multicast_address, port), "0x01", "127.0.0.1", 55443)
+        if not found.wait(2):
+            pytest.skip("Multicast is not routed on this host")
+        assert discovery.registry.get("0x01").ip == "127.0.0.1"
+    finally:
+        discovery.stop_listening()
+
+
+def test_capabilities_cached_per_port():
+    YeelightCapabilities.from_device(YeelightDevice("0x01", "192.168.1.20", 55443, model="mono",
+                                                    support=["get_prop", "set_bright"]))
+    assert YeelightCapabilities.get_cached("192.168.1.20", 55443).model == "mono"
+    assert YeelightCapabilities.get_cached("192.168.1.20", 55444) is None
+
+
+def test_capabilities_expire_with_the_advertisement():
+    YeelightCapabilities.from_device(YeelightDevice("0x01", "192.168.1.21", 55443, model="mono", max_age=0))
+    time.sleep(0.01)
+    # The ip may now belong to another bulb, its support list is not trusted anymore
+    assert YeelightCapabilities.get_cached("192.168.1.21", 55443) is None
+    assert "192.168.1.21:55443" not in YeelightCapabilities.cache
+    bulb = YeelightBulb("192.168.1.21", 55443, lazy=True)
+    assert not bulb.get_capabilities().is_known()
+
+
+def test_probe_failure_is_not_cached():
+    with YeelightFakeDiscovery() as server:
+        discovery = YeelightDiscovery(multicast_port=server.port)
+        assert not YeelightCapabilities.probe("127.0.0.1", 55499, timeout=0.2, discovery=discovery).is_known()
+        assert YeelightCapabilities.get_cached("127.0.0.1", 55499) is None
+        # The bulb is back, the next probe asks it again
+        server.add_bulb("0x01", "127.0.0.1", 55499, model="mono", support=["get_prop", "set_bright"])
+        capabilities = YeelightCapabilities.probe("127.0.0.1", 55499, timeout=0.5, discovery=discovery)
+        assert capabilities.model == "mono"
+        assert YeelightCapabilities.get_cached("127.0.0.1", 55499) is capabilities
@@ -0,0 +1,34 @@
+import contextlib
+import pytest
+from pyyeelight.yeelightFleet import YeelightFleet, get_shard
+from pyyeelight.tests.yeelightFakeBulb import YeelightFakeBulb
+
+
+@pytest.fixture
+def fakes():
+    with contextlib.ExitStack() as stack:
+        yield [stack.enter_context(YeelightFakeBulb()) for _ in range(4)]
+
+
+def test_shard_is_stable():
+    assert get_shard("192.168.1.10", 4) == get_shard("192.168.1.10", 4)
+    assert {get_shard("192.168.1.{}".format(index), 4) for index in range(64)} == {0, 1, 2, 3}
+
+
+@pytest.mark.parametrize("lazy", [True, False])
+def test_fleet_bulb_arguments(fakes, lazy):
+    with YeelightFleet([fake.get_address() for fake in fakes], processes=2, lazy=lazy) as fleet:
+        result = fleet.set_brightness(30)
+        assert result.is_success()
+        for fake in fakes:
+            # A bulb that isn't lazy reads its properties when it is built
+            assert fake.get_stats()["commands"] == dict({"set_bright": 1}, **({} if lazy else {"get_prop": 1}))
+
+
+def test_fleet_replaces_group(fakes):
+    with YeelightFleet([fake.get_address() for fake in fakes], processes=2) as fleet:
+        assert fleet.adjust("increase", "bright").is_success()
+        assert fleet.save_state().is_success()
+        assert {fake.properties["bright"] for fake in fakes} == {"60"}
+        assert {fake.get_stats()["commands"].get("set_default") for fake in fakes} == {1}
+        assert [properties["bright"] for properties in fleet.sync_state().values()] == [60] * len(fakes)
@@ -0,0 +1,67 @@
+import json
+import pytest
+from pyyeelight import YeelightBulb
+from pyyeelight.yeelightJournal import (YeelightJournal, YeelightReplay, read_journal, JOURNAL_VERSION, RECORD_BULB,
+                                        RECORD_COMMAND, RECORD_RESPONSE)
+from pyyeelight.tests.yeelightFakeBulb import YeelightFakeBulb
+
+
+def write_session(journal_file, bulb, commands):
+    """
+        Write a session by hand : header, bulb and (time, id, method, params) of each command
+    """
+    journal_file.write(json.dumps({"journal": JOURNAL_VERSION, "started": 0.0}) + "\n")
+    journal_file.write(json.dumps([RECORD_BULB, 0, bulb]) + "\n")
+    for timestamp, command_id, method, params in commands:
+        journal_file.write(json.dumps([RECORD_COMMAND, timestamp, 0, command_id, method, params]) + "\n")
+
+
+@pytest.fixture
+def fake():
+    with YeelightFakeBulb() as fake:
+        yield fake
+
+
+@pytest.fixture
+def sessions(tmp_path, fake):
+    """
+        Journal of two sessions, the times of both start from 0
+    """
+    path = str(tmp_path / "sessions.journal")
+    bulb = "{}:{}".format(*fake.get_address())
+    with open(path, "w", encoding="utf-8") as journal_file:
+        write_session(journal_file, bulb, [(0.0, 1, "set_bright", [10, "sudden", 30]),
+                                           (0.2, 2, "set_bright", [20, "sudden", 30])])
+        write_session(journal_file, bulb, [(0.0, 1, "set_bright", [30, "sudden", 30]),
+                                           (0.1, 2, "set_bright", [40, "sudden", 30])])
+        # Truncated by a crash
+        journal_file.write('["c",0.3,0,3,"set_bri')
+    return path
+
+
+def test_read_journal_chains_sessions(sessions, fake):
+    records = list(read_journal(sessions))
+    assert [record[1] for record in records] == pytest.approx([0.0, 0.2, 0.2, 0.3])
+    assert [record[5][0] for record in records] == [10, 20, 30, 40]
+    assert {record[2] for record in records} == {"{}:{}".format(*fake.get_address())}
+
+
+def test_replay_sessions_one_after_the_other(sessions, fake):
+    stats = YeelightReplay(read_journal(sessions)).run()
+    assert stats["commands"] == 4
+    assert stats["errors"] == 0
+    # Replayed over each other, the sessions would last 0.2s
+    assert stats["duration"] >= 0.3
+    assert fake.properties["bright"] == "40"
+
+
+def test_journal_records_commands_and_responses(tmp_path, fake):
+    path = str(tmp_path / "traffic.journal")
+    with YeelightJournal(path) as journal:
+        bulb = YeelightBulb(*fake.get_address(), journal=journal, lazy=True)
+        bulb.set_brightness(25)
+        bulb.api_call.close()
+    records = list(read_journal(path))
+    assert [record[0] for record in records] == [RECORD_COMMAND, RECORD_RESPONSE]
+    assert records[0][4:] == ("set_bright", [25, "sudden", 30])
+    assert records[1][3] == {"id": records[0][3], "result": ["ok"]}
@@ -0,0 +1,25 @@
+import json
+import pytest
+from pyyeelight.yeelightMessage import YeelightCommand
+
+
+@pytest.mark.parametrize("method, params", [
+    # Repeated values were once joined without their comma
+    ("set_bright", [30, "smooth", 30]),
+    ("set_scene", ["color", 65280, 70]),
+    ("set_name", ['say "hi"\\ \n']),
+    ("set_name", ["salon é 灯 💡"]),
+    ("start_cf", [4, 0, "1000,2,2700,100,500,1,255,10"]),
+    ("set_adjust", ("increase", "bright")),
+    ("toggle", None),
+])
+def test_message_round_trip(method, params):
+    command = YeelightCommand(7, method, params)
+    message = command.get_message()
+    assert message.endswith("\r\n")
+    assert json.loads(message) == {"id": 7, "method": method, "params": list(params) if params is not None else []}
+    assert json.loads(command.get_message_bytes().decode()) == json.loads(message)
+
+
+def test_single_param():
+    assert json.loads(YeelightCommand(1, "set_power", "on").get_message())["params"] == ["on"]
@@ -0,0 +1,65 @@
+import socket
+import time
+import pytest
+from pyyeelight import YeelightBulb
+from pyyeelight.yeelightCapability import YeelightCapabilities, YeelightCommandRefused
+from pyyeelight.yeelightMusic import YeelightMusicMode
+from pyyeelight.tests.yeelightFakeBulb import YeelightFakeBulb
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+@pytest.fixture
+def fake():
+    with YeelightFakeBulb() as fake:
+        yield fake
+
+
+@pytest.fixture
+def bulb(fake):
+    bulb = YeelightBulb(*fake.get_address(), lazy=True)
+    yield bulb
+    bulb.stop_music_mode()
+    bulb.api_call.close()
+
+
+def test_commands_streamed_without_response(fake, bulb):
+    bulb.start_music_mode(host="127.0.0.1")
+    assert bulb.is_music_mode()
+    assert fake.properties["music_on"] == "1"
+    assert bulb.set_brightness(20) is None
+    bulb.toggle()
+    # The frames are applied by the bulb, only set_music went through the API connection
+    assert wait_for(lambda: fake.properties["power"] == "off")
+    assert fake.properties["bright"] == "20"
+    assert fake.get_stats()["commands"] == {"set_music": 1, "set_bright": 1, "toggle": 1}
+    bulb.stop_music_mode()
+    assert not bulb.is_music_mode()
+    assert fake.properties["music_on"] == "0"
+
+
+def test_bulb_not_connecting_back(monkeypatch):
+    with YeelightFakeBulb(music_connect=False) as fake:
+        bulb = YeelightBulb(*fake.get_address(), lazy=True)
+        monkeypatch.setattr(YeelightMusicMode, "ACCEPT_TIMEOUT", 0.2)
+        with pytest.raises(socket.timeout):
+            bulb.start_music_mode(host="127.0.0.1")
+        assert not bulb.is_music_mode()
+        # The bulb is not left waiting in music mode
+        assert fake.get_stats()["commands"] == {"set_music": 2}
+        assert fake.properties["music_on"] == "0"
+        bulb.api_call.close()
+
+
+def test_music_mode_refused_locally(fake, bulb):
+    bulb.capabilities = YeelightCapabilities(["get_prop", "set_bright"], "mono")
+    with pytest.raises(YeelightCommandRefused):
+        bulb.start_music_mode(host="127.0.0.1")
+    assert fake.get_stats()["commands"] == {}
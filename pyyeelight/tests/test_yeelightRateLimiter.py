@@ -0,0 +1,69 @@
+import threading
+import pytest
+from pyyeelight.yeelightRateLimiter import YeelightRateLimiter, YeelightCommandDropped
+
+
+class RecordingSender:
+    """
+        Stand-in for YeelightAPICall.operate_on_bulb, records the commands in the order they are sent
+    """
+
+    def __init__(self):
+        self.sent = []
+        self.lock = threading.Lock()
+
+    def __call__(self, method, params):
+        with self.lock:
+            self.sent.append((method, params))
+        return ["ok"]
+
+
+@pytest.fixture
+def send():
+    return RecordingSender()
+
+
+@pytest.fixture
+def limiter():
+    # One command right away, then one every 50ms
+    return YeelightRateLimiter(quota=20, period=1.0, burst=1, max_pending=3)
+
+
+def test_coalesces_absolute_commands(send, limiter):
+    futures = [limiter.submit(send, "set_bright", [brightness, "sudden", 30]) for brightness in (10, 20, 30, 40)]
+    assert [future.result(2) for future in futures] == [["ok"]] * 4
+    # The first one is sent right away, the waiting ones are replaced by the latest
+    assert send.sent == [("set_bright", [10, "sudden", 30]), ("set_bright", [40, "sudden", 30])]
+    assert limiter.get_stats()["coalesced"] == 2
+
+
+def test_relative_commands_sent_in_order(send, limiter):
+    futures = [limiter.submit(send, "set_bright", [10, "sudden", 30]),
+               limiter.submit(send, "toggle"),
+               limiter.submit(send, "set_adjust", ["increase", "bright"]),
+               limiter.submit(send, "toggle")]
+    for future in futures:
+        future.result(2)
+    assert [method for method, _ in send.sent] == ["set_bright", "toggle", "set_adjust", "toggle"]
+    assert limiter.get_stats()["coalesced"] == 0
+
+
+def test_drops_the_oldest_command(send, limiter):
+    futures = [limiter.submit(send, "set_bright", [10, "sudden", 30])]
+    futures += [limiter.submit(send, "toggle") for _ in range(4)]
+    with pytest.raises(YeelightCommandDropped):
+        futures[1].result(2)
+    for future in futures[2:]:
+        assert future.result(2) == ["ok"]
+    assert [method for method, _ in send.sent] == ["set_bright", "toggle", "toggle", "toggle"]
+    assert limiter.get_stats()["dropped"] == 1
+
+
+def test_run_waits_behind_the_queue(send, limiter):
+    limiter.submit(send, "set_bright", [10, "sudden", 30])
+    queued = limiter.submit(send, "set_bright", [20, "sudden", 30])
+    # A get_prop sent first would read the brightness before the change
+    assert limiter.run(send, "get_prop", ["bright"]) == ["ok"]
+    assert queued.done()
+    assert send.sent == [("set_bright", [10, "sudden", 30]), ("set_bright", [20, "sudden", 30]),
+                         ("get_prop", ["bright"])]
@@ -0,0 +1,78 @@
+import gc
+import pytest
+from pyyeelight.yeelightState import YeelightStateStore
+
+
+class Owner:
+    """
+        Stand-in for a bulb, only its lifetime matters to the store
+    """
+
+
+@pytest.fixture
+def store():
+    return YeelightStateStore()
+
+
+def test_released_slot_has_no_stale_values(store):
+    owner = Owner()
+    state = store.allocate(owner, "192.168.1.10:55443")
+    state.set_values({"power": "on", "bright": "80", "name": "salon", "flow_params": "1000,1,255,100"}, 1.0)
+    slot = state.slot
+    del owner, state
+    gc.collect()
+    assert len(store) == 0
+    new_owner = Owner()
+    new_state = store.allocate(new_owner, "192.168.1.11:55443")
+    # The slot of the collected bulb is reused, none of its values leak to the new bulb
+    assert new_state.slot == slot
+    assert dict(new_state) == {name: None for name in store.PROPERTIES}
+    assert new_state.get_timestamp("bright") is None
+    assert store.find_keys(power=True) == []
+    assert store.get_changes(store.NEVER) == {}
+
+
+def test_released_slot_is_out_of_the_queries(store):
+    owners = [Owner(), Owner()]
+    for index, owner in enumerate(owners):
+        store.allocate(owner, "192.168.1.{}:55443".format(index)).set_values({"power": "on", "bright": "50"}, 1.0)
+    del owner
+    owners.pop()
+    gc.collect()
+    assert store.count_on() == 1
+    assert store.find_keys(min_brightness=10) == ["192.168.1.0:55443"]
+    assert list(store.get_changes(store.NEVER)) == ["192.168.1.0:55443"]
+    assert len(store.find_bulbs()) == 1
+
+
+def test_unknown_values_match_no_criteria(store):
+    owners = [Owner() for _ in range(3)]
+    states = [store.allocate(owner, "192.168.1.{}:55443".format(index)) for index, owner in enumerate(owners)]
+    states[0].set_values({"power": "on", "bright": "100", "color_mode": "2"}, 1.0)
+    states[1].set_values({"power": "off", "bright": "", "color_mode": "1"}, 1.0)
+    # states[2] is never read : power and brightness are unknown
+    assert states[1]["bright"] is None
+    assert store.count_on() == 1
+    assert store.count_off() == 1
+    assert store.find_slots() == [0, 1, 2]
+    assert store.find_slots(power=True) == [0]
+    assert store.find_slots(power=False) == [1]
+    assert store.find_slots(max_brightness=100) == [0]
+    assert store.find_slots(min_brightness=0) == [0]
+    assert store.find_slots(color_mode=1) == [1]
+
+
+def test_get_changes(store):
+    owners = [Owner(), Owner()]
+    first, second = (store.allocate(owner, "192.168.1.{}:55443".format(index)) for index, owner in enumerate(owners))
+    first.set_values({"power": "on", "bright": "10"}, 1.0)
+    second.set_values({"bright": "20"}, 2.0)
+    first.set_values({"bright": "30"}, 3.0)
+    assert store.get_changes(1.5) == {"192.168.1.0:55443": {"bright": 30}, "192.168.1.1:55443": {"bright": 20}}
+    assert store.get_changes(2.5) == {"192.168.1.0:55443": {"bright": 30}}
+    assert store.get_changes(3.0) == {}
+    assert store.get_changes(store.NEVER)["192.168.1.0:55443"] == {"power": "on", "bright": 30}
+    # Expired values are kept but not reported as changes anymore
+    first.expire()
+    assert first["bright"] == 30
+    assert list(store.get_changes(store.NEVER)) == ["192.168.1.1:55443"]
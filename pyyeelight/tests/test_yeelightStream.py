@@ -0,0 +1,121 @@
+import json
+import threading
+import pytest
+from pyyeelight.yeelightConnection import YeelightConnection
+from pyyeelight.yeelightMessage import YeelightCommand, YeelightStreamReader
+from pyyeelight.tests.yeelightFakeBulb import YeelightFakeBulb
+
+# Multi-byte UTF-8 characters, split by the one byte writes of the fragment mode
+NAME = "Lumière du salon ☀"
+
+MESSAGES = [{"id": 1, "result": ["ok"]},
+            {"method": "props", "params": {"name": NAME}},
+            {"id": 2, "result": ["on", NAME]},
+            {"method": "props", "params": {"power": "off", "bright": "10"}}]
+
+
+def encode(messages):
+    return b"".join(json.dumps(message, ensure_ascii=False).encode() + b"\r\n" for message in messages)
+
+
+def test_stream_reader_one_byte_per_read():
+    reader = YeelightStreamReader()
+    data = encode(MESSAGES)
+    messages = []
+    for index in range(len(data)):
+        messages += reader.feed(data[index:index + 1])
+    assert messages == MESSAGES
+    assert not reader.buffer
+
+
+def test_stream_reader_split_inside_character():
+    reader = YeelightStreamReader()
+    data = encode(MESSAGES[1:2])
+    split = data.index("è".encode()) + 1
+    assert reader.feed(data[:split]) == []
+    assert reader.feed(data[split:]) == MESSAGES[1:2]
+
+
+def test_stream_reader_several_messages_per_read():
+    reader = YeelightStreamReader()
+    data = encode(MESSAGES)
+    # The last message is cut, it comes with the next read
+    assert reader.feed(data[:-5]) == MESSAGES[:-1]
+    assert reader.feed(data[-5:] + encode(MESSAGES[:1])) == MESSAGES[-1:] + MESSAGES[:1]
+
+
+def test_stream_reader_skips_invalid_lines():
+    reader = YeelightStreamReader()
+    assert reader.feed(b"\r\nnot json\r\n[1, 2]\r\n" + encode(MESSAGES[:1])) == MESSAGES[:1]
+
+
+@pytest.fixture(params=[YeelightFakeBulb.WRITE_FRAGMENT, YeelightFakeBulb.WRITE_BATCH])
+def fake(request):
+    with YeelightFakeBulb(write_mode=request.param) as fake:
+        yield fake
+
+
+@pytest.fixture
+def connection(fake):
+    connection = YeelightConnection(*fake.get_address())
+    yield connection
+    with connection.lock:
+        connection.close()
+
+
+def submit_all(connection, calls):
+    """
+        Write every command back to back, then wait for all the responses
+        :return: the response of each command
+    """
+    futures = []
+    for command_id, (method, params) in enumerate(calls, 1):
+        message = YeelightCommand(command_id, method, params).get_message_bytes()
+        futures.append((command_id, connection.submit(message, command_id)))
+    return [(command_id, connection.wait_response(future, command_id)) for command_id, future in futures]
+
+
+def test_connection_matches_each_response(connection):
+    calls = []
+    for bright in range(1, 21):
+        calls.append(("set_bright", [bright, "sudden", 30]))
+        calls.append(("get_prop", ["bright", "name"]))
+    calls.append(("set_name", [NAME]))
+    calls.append(("get_prop", ["name", "power"]))
+    responses = submit_all(connection, calls)
+    for (command_id, data), (method, params) in zip(responses, calls):
+        assert data["id"] == command_id
+        if method == "get_prop" and params[0] == "bright":
+            # The commands of a connection are handled in order, the previous set_bright is applied
+            assert data["result"] == [str(calls[command_id - 2][1][0]), ""]
+        elif method == "get_prop":
+            assert data["result"] == [NAME, "on"]
+        else:
+            assert data["result"] == ["ok"]
+
+
+def test_connection_notifies_every_change(connection):
+    notifications = []
+    done = threading.Event()
+
+    def on_notification(data):
+        notifications.append(data)
+        if len(notifications) == 21:
+            done.set()
+
+    connection.add_listener(on_notification)
+    calls = [("set_bright", [bright, "sudden", 30]) for bright in range(1, 21)] + [("set_name", [NAME])]
+    submit_all(connection, calls)
+    assert done.wait(5)
+    assert [data["params"] for data in notifications] == \
+        [{"bright": str(bright)} for bright in range(1, 21)] + [{"name": NAME}]
+
+
+def test_command_ids_skip_pending_commands():
+    connection = YeelightConnection("127.0.0.1", 55443)
+    connection.pending = {1: None, 2: None}
+    assert connection.next_command_id() == 3
+    connection.command_id = YeelightConnection.MAX_COMMAND_ID - 1
+    assert connection.next_command_id() == YeelightConnection.MAX_COMMAND_ID
+    # Wraps around to the first id that is not waiting for its response
+    assert connection.next_command_id() == 3
@@ -0,0 +1,467 @@
+import json
+import random
+import socket
+import threading
+import time
+
+
+class YeelightFakeBulb:
+    """
+        Local server speaking the bulb JSON-line protocol, used by the benchmarks and to try the library without
+        a bulb. It keeps the bulb state, answers get_prop, applies the set commands and notifies every connected
+        client of the changed properties like a real bulb.
+
+        Latency, the command quota and errors can be configured to reproduce a slow or overloaded bulb :
+
+        >>> with YeelightFakeBulb(latency=0.005, quota=60, error_rate=0.01) as fake:
+        ...     bulb = YeelightBulb(*fake.get_address())
+
+        The write mode changes how the messages are cut into socket writes, to check the stream parsing of the
+        clients : WRITE_FRAGMENT writes one byte at a time (multi-byte UTF-8 characters are split), WRITE_BATCH
+        writes every response and notification produced by one read of the client in a single write.
+
+        set_music makes the fake bulb connect back to the given address and apply the commands streamed on that
+        connection without answering them, unless music_connect is False (a bulb that can't reach the host).
+    """
+
+    WRITE_MESSAGE = "message"
+    WRITE_FRAGMENT = "fragment"
+    WRITE_BATCH = "batch"
+
+    ERROR_UNSUPPORTED = "method not supported"
+    ERROR_QUOTA = "client quota exceeded"
+    ERROR_INJECTED = "general error"
+    ERROR_INVALID = "invalid params"
+
+    OK = ["ok"]
+
+    DEFAULT_PROPERTIES = {"power": "on", "bright": "50", "ct": "4000", "rgb": "16711680", "hue": "0", "sat": "100",
+                          "color_mode": "2", "flowing": "0", "delayoff": "0", "flow_params": "", "music_on": "0",
+                          "name": ""}
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, jitter=0.0, quota=None, period=60.0, error_rate=0.0,
+                 disconnect_rate=0.0, seed=None, properties=None, write_mode=WRITE_MESSAGE, music_connect=True):
+        """
+            :param host: address the server listens on
+            :param port: port the server listens on, 0 picks a free one (see get_address)
+            :param latency: time in seconds before each response is sent
+            :param jitter: random time in seconds between 0 and jitter added to the latency
+            :param quota: number of commands accepted per period and per connection, unlimited if None. The
+                          commands above the quota are rejected with the "client quota exceeded" error
+            :param period: length of the quota period in seconds
+            :param error_rate: probability for a command to be answered with an error
+            :param disconnect_rate: probability for a command to make the server close the connection without
+                                    answering
+            :param seed: seed of the random generator, to replay the same errors
+            :param properties: initial properties of the bulb, merged with the default ones
+            :param write_mode: WRITE_MESSAGE to write each message at once, WRITE_FRAGMENT or WRITE_BATCH
+            :param music_connect: if False, set_music is answered but the bulb never connects back
+
+            :type latency: float
+            :type quota: int
+            :type error_rate: float
+            :type properties: dict
+            :type write_mode: str
+            :type music_connect: bool
+        """
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.jitter = jitter
+        self.quota = quota
+        self.period = period
+        self.error_rate = error_rate
+        self.disconnect_rate = disconnect_rate
+        self.write_mode = write_mode
+        self.music_connect = music_connect
+        self.random = random.Random(seed)
+        self.properties = dict(self.DEFAULT_PROPERTIES)
+        if properties is not None:
+            self.properties.update(properties)
+        self.server_socket = None
+        self.acceptor = None
+        self.clients = []
+        # Client socket -> lock held while writing to it, the responses and the notifications sent by other
+        # client threads must not interleave
+        self.send_locks = {}
+        # Client socket -> messages waiting for the next flush in WRITE_BATCH mode
+        self.batches = {}
+        # Music mode connections opened by the bulb to the clients
+        self.music_sockets = []
+        self.lock = threading.Lock()
+        self.commands = {}
+        self.errors = 0
+        self.disconnects = 0
+        self.handlers = {"get_prop": self.get_prop,
+                         "set_power": self.set_power,
+                         "toggle": self.toggle,
+                         "set_bright": self.set_bright,
+                         "set_ct_abx": self.set_ct_abx,
+                         "set_rgb": self.set_rgb,
+                         "set_hsv": self.set_hsv,
+                         "set_adjust": self.set_adjust,
+                         "set_scene": self.set_scene,
+                         "start_cf": self.start_cf,
+                         "stop_cf": self.stop_cf,
+                         "set_default": self.set_default,
+                         "set_name": self.set_name,
+                         "set_music": self.set_music,
+                         "cron_add": self.cron_add}
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def get_address(self):
+        """
+            :return: (ip, port) the server listens on
+            :rtype: tuple
+        """
+        return self.host, self.port
+
+    def start(self):
+        """
+            Listen and accept the clients in a background thread
+        """
+        server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        server_socket.bind((self.host, self.port))
+        server_socket.listen(64)
+        self.port = server_socket.getsockname()[1]
+        self.server_socket = server_socket
+        self.acceptor = threading.Thread(target=self.accept_loop, args=(server_socket,),
+                                         name="yeelight-fake-{}".format(self.port), daemon=True)
+        self.acceptor.start()
+
+    def stop(self):
+        """
+            Close the server and every client connection
+        """
+        if self.server_socket is not None:
+            try:
+                self.server_socket.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            self.server_socket.close()
+            self.server_socket = None
+        with self.lock:
+            clients = list(self.clients)
+        for client in clients:
+            self.close_client(client)
+        self.close_music()
+        if self.acceptor is not None:
+            self.acceptor.join()
+            self.acceptor = None
+
+    def accept_loop(self, server_socket):
+        while True:
+            try:
+                client, _ = server_socket.accept()
+            except OSError:
+                return
+            client.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            with self.lock:
+                self.clients.append(client)
+                self.send_locks[client] = threading.Lock()
+                self.batches[client] = bytearray()
+            threading.Thread(target=self.client_loop, args=(client,), daemon=True).start()
+
+    def close_client(self, client):
+        with self.lock:
+            if client in self.clients:
+                self.clients.remove(client)
+            self.send_locks.pop(client, None)
+            self.batches.pop(client, None)
+        try:
+            client.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        client.close()
+
+    def client_loop(self, client):
+        """
+            Handle the commands of one client in order, like the bulb does
+        """
+        buffer = b""
+        # Start time of the commands in the current quota period
+        accepted = []
+        try:
+            while True:
+                data = client.recv(4096)
+                if not data:
+                    break
+                buffer += data
+                while b"\r\n" in buffer:
+                    line, buffer = buffer.split(b"\r\n", 1)
+                    if not line.strip():
+                        continue
+                    if not self.handle_line(client, line, accepted):
+                        return
+                if self.write_mode == self.WRITE_BATCH:
+                    self.flush()
+        except OSError:
+            pass
+        finally:
+            self.close_client(client)
+
+    def music_loop(self, music_socket):
+        """
+            Apply the commands streamed on a music mode connection, they are never answered
+        """
+        buffer = b""
+        try:
+            while True:
+                data = music_socket.recv(4096)
+                if not data:
+                    break
+                buffer += data
+                while b"\r\n" in buffer:
+                    line, buffer = buffer.split(b"\r\n", 1)
+                    try:
+                        command = json.loads(line.decode())
+                        method = command["method"]
+                        with self.lock:
+                            self.commands[method] = self.commands.get(method, 0) + 1
+                        _, changes = self.handlers[method](command.get("params", []))
+                    except (ValueError, KeyError, TypeError, IndexError):
+                        continue
+                    if changes:
+                        with self.lock:
+                            self.properties.update(changes)
+                            clients = list(self.clients)
+                        for client in clients:
+                            self.send(client, {"method": "props", "params": changes})
+        except OSError:
+            pass
+        finally:
+            with self.lock:
+                if music_socket in self.music_sockets:
+                    self.music_sockets.remove(music_socket)
+            music_socket.close()
+
+    def close_music(self):
+        with self.lock:
+            music_sockets = list(self.music_sockets)
+        for music_socket in music_sockets:
+            try:
+                music_socket.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def handle_line(self, client, line, accepted):
+        """
+            Answer one command
+            :return: False if the connection must be closed
+            :rtype: bool
+        """
+        try:
+            command = json.loads(line.decode())
+            command_id = command["id"]
+            method = command["method"]
+            params = command.get("params", [])
+        except (ValueError, KeyError, TypeError):
+            self.send(client, {"id": -1, "error": {"code": -1, "message": self.ERROR_INVALID}})
+            return True
+        with self.lock:
+            self.commands[method] = self.commands.get(method, 0) + 1
+        delay = self.latency + (self.random.uniform(0, self.jitter) if self.jitter else 0.0)
+        if delay > 0:
+            time.sleep(delay)
+        if self.disconnect_rate and self.random.random() < self.disconnect_rate:
+            with self.lock:
+                self.disconnects += 1
+            return False
+        error = None
+        if self.quota is not None:
+            now = time.monotonic()
+            while accepted and accepted[0] <= now - self.period:
+                accepted.pop(0)
+            if len(accepted) >= self.quota:
+                error = self.ERROR_QUOTA
+            else:
+                accepted.append(now)
+        if error is None and self.error_rate and self.random.random() < self.error_rate:
+            error = self.ERROR_INJECTED
+        handler = self.handlers.get(method)
+        if error is None and handler is None:
+            error = self.ERROR_UNSUPPORTED
+        changes = None
+        if error is None:
+            try:
+                result, changes = handler(params)
+            except (ValueError, KeyError, TypeError, IndexError):
+                error = self.ERROR_INVALID
+        if error is not None:
+            with self.lock:
+                self.errors += 1
+            self.send(client, {"id": command_id, "error": {"code": -1, "message": error}})
+            return True
+        # Applied before answering like the bulb, a client reading the state after the response sees the change
+        clients = []
+        if changes:
+            with self.lock:
+                self.properties.update(changes)
+                clients = list(self.clients)
+        self.send(client, {"id": command_id, "result": result})
+        for other in clients:
+            self.send(other, {"method": "props", "params": changes})
+        return True
+
+    def send(self, client, message):
+        with self.lock:
+            send_lock = self.send_locks.get(client)
+            batch = self.batches.get(client)
+        if send_lock is None:
+            return
+        # Names are sent as UTF-8 like the bulb does, not as \u escapes
+        data = json.dumps(message, separators=(",", ":"), ensure_ascii=False).encode() + b"\r\n"
+        with send_lock:
+            try:
+                if self.write_mode == self.WRITE_BATCH:
+                    batch += data
+                elif self.write_mode == self.WRITE_FRAGMENT:
+                    for index in range(len(data)):
+                        client.sendall(data[index:index + 1])
+                else:
+                    client.sendall(data)
+            except OSError:
+                pass
+
+    def flush(self):
+        """
+            Write the messages waiting for each client in WRITE_BATCH mode, one write per client
+        """
+        with self.lock:
+            pending = [(client, self.send_locks[client], self.batches[client]) for client in self.clients]
+        for client, send_lock, batch in pending:
+            with send_lock:
+                if not batch:
+                    continue
+                try:
+                    client.sendall(batch)
+                except OSError:
+                    pass
+                batch.clear()
+
+    def get_stats(self):
+        """
+            :return: commands received per method, errors sent and connections closed by error injection
+            :rtype: dict
+        """
+        with self.lock:
+            return {"commands": dict(self.commands), "errors": self.errors, "disconnects": self.disconnects,
+                    "clients": len(self.clients)}
+
+    def reset_stats(self):
+        with self.lock:
+            self.commands = {}
+            self.errors = 0
+            self.disconnects = 0
+
+    # Handlers of the methods : they take the params and return the result with the changed properties
+
+    def get_prop(self, params):
+        with self.lock:
+            return [self.properties.get(name, "") for name in params], None
+
+    def check_on(self):
+        if self.properties["power"] != "on":
+            raise ValueError("The bulb is off")
+
+    def set_power(self, params):
+        if params[0] not in ("on", "off"):
+            raise ValueError(params[0])
+        return self.OK, {"power": params[0]}
+
+    def toggle(self, params):
+        return self.OK, {"power": "off" if self.properties["power"] == "on" else "on"}
+
+    def set_bright(self, params):
+        self.check_on()
+        return self.OK, {"bright": str(int(params[0]))}
+
+    def set_ct_abx(self, params):
+        self.check_on()
+        return self.OK, {"ct": str(int(params[0])), "color_mode": "2"}
+
+    def set_rgb(self, params):
+        self.check_on()
+        return self.OK, {"rgb": str(int(params[0])), "color_mode": "1"}
+
+    def set_hsv(self, params):
+        self.check_on()
+        return self.OK, {"hue": str(int(params[0])), "sat": str(int(params[1])), "color_mode": "3"}
+
+    def set_adjust(self, params):
+        self.check_on()
+        action, prop = params
+        if prop == "bright":
+            step = {"increase": 10, "decrease": -10, "circle": 10}[action]
+            bright = int(self.properties["bright"]) + step
+            if action == "circle" and bright > 100:
+                bright = 1
+            return self.OK, {"bright": str(min(100, max(1, bright)))}
+        if prop == "ct":
+            step = {"increase": 500, "decrease": -500, "circle": 500}[action]
+            ct = int(self.properties["ct"]) + step
+            if action == "circle" and ct > 6500:
+                ct = 1700
+            return self.OK, {"ct": str(min(6500, max(1700, ct)))}
+        if prop == "color":
+            return self.OK, {"rgb": str((int(self.properties["rgb"]) + 0x100000) & 0xFFFFFF), "color_mode": "1"}
+        raise ValueError(prop)
+
+    def set_scene(self, params):
+        scene_type = params[0]
+        changes = {"power": "on"}
+        if scene_type == "color":
+            changes.update({"rgb": str(int(params[1])), "bright": str(int(params[2])), "color_mode": "1"})
+        elif scene_type == "hsv":
+            changes.update({"hue": str(int(params[1])), "sat": str(int(params[2])), "bright": str(int(params[3])),
+                            "color_mode": "3"})
+        elif scene_type == "ct":
+            changes.update({"ct": str(int(params[1])), "bright": str(int(params[2])), "color_mode": "2"})
+        elif scene_type == "cf":
+            changes.update({"flowing": "1", "flow_params": str(params[3])})
+        elif scene_type == "auto_delay_off":
+            changes.update({"bright": str(int(params[1])), "delayoff": str(int(params[2]))})
+        else:
+            raise ValueError(scene_type)
+        return self.OK, changes
+
+    def start_cf(self, params):
+        self.check_on()
+        return self.OK, {"flowing": "1", "flow_params": str(params[2])}
+
+    def stop_cf(self, params):
+        return self.OK, {"flowing": "0"}
+
+    def set_default(self, params):
+        return self.OK, None
+
+    def set_name(self, params):
+        return self.OK, {"name": str(params[0])}
+
+    def set_music(self, params):
+        if params[0] == 0:
+            self.close_music()
+            return self.OK, {"music_on": "0"}
+        if params[0] != 1:
+            raise ValueError(params[0])
+        if self.music_connect:
+            try:
+                music_socket = socket.create_connection((params[1], int(params[2])), timeout=2)
+            except OSError:
+                # Like the bulb, the command was accepted even if the host can't be reached
+                return self.OK, {"music_on": "1"}
+            music_socket.settimeout(None)
+            with self.lock:
+                self.music_sockets.append(music_socket)
+            threading.Thread(target=self.music_loop, args=(music_socket,), daemon=True).start()
+        return self.OK, {"music_on": "1"}
+
+    def cron_add(self, params):
+        return self.OK, {"delayoff": str(int(params[1]))}
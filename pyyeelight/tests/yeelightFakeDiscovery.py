@@ -0,0 +1,142 @@
+import select
+import socket
+import struct
+import threading
+
+
+class YeelightFakeDiscovery:
+    """
+        Local stand-in of the discovery side of the bulbs, used to run YeelightDiscovery without a bulb or a
+        network. It answers every M-SEARCH with one search response per advertised bulb, and sends NOTIFY
+        advertisements on request. Raw replies can be added to reproduce foreign or malformed SSDP devices.
+
+        >>> with YeelightFakeBulb() as fake, YeelightFakeDiscovery() as discovery_server:
+        ...     discovery_server.add_bulb("0x01", *fake.get_address(), properties=fake.properties)
+        ...     discovery = YeelightDiscovery(multicast_address="127.0.0.1", multicast_port=discovery_server.port)
+        ...     devices = discovery.search()
+
+        Bound to 127.0.0.1 the M-SEARCH is sent to it directly, with a multicast group it joins the group like
+        a bulb does (the host must route multicast).
+    """
+
+    SEARCH_RESPONSE_START = "HTTP/1.1 200 OK"
+    NOTIFY_START = "NOTIFY * HTTP/1.1"
+
+    def __init__(self, host="127.0.0.1", port=0, multicast_address=None):
+        """
+            :param host: address the server listens on
+            :param port: port the server listens on, 0 picks a free one
+            :param multicast_address: multicast group joined by the server, None to only listen on host
+
+            :type host: str
+            :type port: int
+            :type multicast_address: str
+        """
+        self.host = host
+        self.port = port
+        self.multicast_address = multicast_address
+        # Replies sent to every M-SEARCH, in order
+        self.replies = []
+        self.searches = 0
+        self.server_socket = None
+        self.responder = None
+        self.lock = threading.Lock()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def get_message(self, start_line, device_id, ip, port, model="color", firmware="18", support=None,
+                    properties=None, max_age=3600):
+        """
+            :return: the discovery message of a bulb, headers like the ones of a real bulb
+            :rtype: bytes
+        """
+        lines = [start_line,
+                 "Cache-Control: max-age={}".format(max_age),
+                 "Location: yeelight://{}:{}".format(ip, port),
+                 "Server: POSIX UPnP/1.0 YGLC/1",
+                 "id: {}".format(device_id),
+                 "model: {}".format(model),
+                 "fw_ver: {}".format(firmware),
+                 "support: {}".format(" ".join(support or ["get_prop", "set_power", "toggle", "set_bright"]))]
+        for name, value in (properties or {}).items():
+            lines.append("{}: {}".format(name, value))
+        return ("\r\n".join(lines) + "\r\n").encode()
+
+    def add_bulb(self, device_id, ip, port, **kwargs):
+        """
+            Answer the searches with a bulb, see get_message for the other arguments
+        """
+        self.add_reply(self.get_message(self.SEARCH_RESPONSE_START, device_id, ip, port, **kwargs))
+
+    def add_reply(self, raw_message):
+        """
+            Answer the searches with a raw message, e.g. a foreign SSDP device
+            :type raw_message: bytes
+        """
+        with self.lock:
+            self.replies.append(raw_message)
+
+    def notify(self, address, device_id, ip, port, **kwargs):
+        """
+            Send a NOTIFY advertisement of a bulb, see get_message for the other arguments
+
+            :param address: (ip, port) the advertisement is sent to, usually the multicast group
+        """
+        notify_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+        try:
+            notify_socket.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, 2)
+            notify_socket.sendto(self.get_message(self.NOTIFY_START, device_id, ip, port, **kwargs), address)
+        finally:
+            notify_socket.close()
+
+    def start(self):
+        """
+            Listen and answer the searches in a background thread
+        """
+        server_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+        if self.multicast_address is not None:
+            server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            server_socket.bind(("", self.port))
+            membership = struct.pack("4sl", socket.inet_aton(self.multicast_address), socket.INADDR_ANY)
+            server_socket.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, membership)
+        else:
+            server_socket.bind((self.host, self.port))
+        self.port = server_socket.getsockname()[1]
+        self.server_socket = server_socket
+        self.responder = threading.Thread(target=self.respond_loop, args=(server_socket,),
+                                          name="yeelight-fake-discovery-{}".format(self.port), daemon=True)
+        self.responder.start()
+
+    def stop(self):
+        if self.server_socket is not None:
+            self.server_socket.close()
+            self.server_socket = None
+        if self.responder is not None:
+            self.responder.join()
+            self.responder = None
+
+    def respond_loop(self, server_socket):
+        while True:
+            try:
+                # The timeout lets the thread see the socket closed by stop
+                readable, _, _ = select.select([server_socket], [], [], 0.1)
+                if not readable:
+                    continue
+                data, address = server_socket.recvfrom(4096)
+            except (OSError, ValueError):
+                return
+            if not data.startswith(b"M-SEARCH"):
+                continue
+            with self.lock:
+                self.searches += 1
+                replies = list(self.replies)
+            for reply in replies:
+                try:
+                    server_socket.sendto(reply, address)
+                except OSError:
+                    pass
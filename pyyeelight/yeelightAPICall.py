@@ -1,6 +1,7 @@
-import socket
-import uuid
-from .yeelightMessage import YeelightCommand, YeelightResponse
+import time
+from .yeelightCircuitBreaker import YeelightRetryPolicy
+from .yeelightConnection import YeelightConnectionPool
+from .yeelightMessage import YeelightCommand, YeelightResponse, YeelightError
 
 
 class YeelightAPICall:
@@ -10,54 +11,312 @@ class YeelightAPICall:
 
     DEFAULT_PORT = 55443
 
-    def __init__(self, ip, port=DEFAULT_PORT):
+    # Connections are shared by every API call to the same bulb
+    connection_pool = YeelightConnectionPool()
+
+    # Metrics recorded by every API call, nothing is measured while it is None
+    metrics = None
+
+    # Retries of the commands failing on a transport error
+    retry_policy = YeelightRetryPolicy()
+
+    # Journal recording every command and response, see YeelightJournal. Nothing is recorded while it is None
+    journal = None
+
+    # Keep the last command and response objects for debugging, otherwise only the last result is kept
+    keep_messages = False
+
+    def __init__(self, ip, port=DEFAULT_PORT, connection_pool=None, metrics=None, retry_policy=None, journal=None):
         """
             Build the API Call
 
             :param ip: ip of the bulb you want to manipulate
             :param port: port used to send and receive messages (should be the default port)
+            :param connection_pool: pool used to get the connection to the bulb, the class pool is used if None.
+                                    The pool holds the timeouts and circuit breaker settings
+            :param metrics: metrics recording the commands of this API call, the class metrics are used if None
+            :param retry_policy: retries of the failed commands, the class policy is used if None
+            :param journal: journal recording the commands of this API call, the class journal is used if None
 
+            :type metrics: YeelightMetrics
+            :type retry_policy: YeelightRetryPolicy
+            :type journal: YeelightJournal
         """
         self.ip = ip
         self.port = port
+        if connection_pool is not None:
+            self.connection_pool = connection_pool
+        if metrics is not None:
+            self.metrics = metrics
+        if retry_policy is not None:
+            self.retry_policy = retry_policy
+        if journal is not None:
+            self.journal = journal
         self.command_id = 0
         self.command = None
         self.response = None
+        self.result = None
 
     def get_response(self):
-        return self.response.result
+        return self.result
 
     def get_command(self):
+        """
+            :return: the last command sent, None unless keep_messages is set
+            :rtype: YeelightCommand
+        """
         return self.command
 
+    def keep_result(self, command, response):
+        """
+            Store the result of the last command, the message objects are only kept if keep_messages is set
+            :return: the result
+        """
+        self.result = response.result
+        if self.keep_messages:
+            self.command = command
+            self.response = response
+        return self.result
+
     def next_cmd_id(self):
         """
-            Each command should be run with an unique id, uuid generate this id
-            This id is converted to an 16 bit int that can be sent to the bulb
+            Each command should be run with an unique id, a 16 bit int that can be sent to the bulb
             Test with 32 and 64bits length int failed
+            The ids are given by the connection, shared by every API call to the bulb
             :return: Unique id
             :rtype: int
         """
-        self.command_id = uuid.uuid4().int & (1 << 16) - 1
+        self.command_id = self.get_connection().next_command_id()
         return self.command_id
 
+    def get_connection(self):
+        """
+            :return: the persistent connection to the bulb
+            :rtype: YeelightConnection
+        """
+        return self.connection_pool.get_connection(self.ip, self.port)
+
+    def close(self):
+        """
+            Close the connection to the bulb, it will be reopened by the next command
+        """
+        self.connection_pool.close(self.ip, self.port)
+
+    def add_notification_listener(self, callback):
+        """
+            Register a callback called with every notification the bulb sends on the connection
+
+            :param callback: function taking the decoded notification dict
+        """
+        self.get_connection().add_listener(callback)
+
+    def remove_notification_listener(self, callback):
+        self.get_connection().remove_listener(callback)
+
+    def add_close_listener(self, callback):
+        """
+            Register a callback called when the connection to the bulb is closed, the notifications stop until the
+            next command opens it again
+
+            :param callback: function without argument
+        """
+        self.get_connection().add_close_listener(callback)
+
+    def remove_close_listener(self, callback):
+        self.get_connection().remove_close_listener(callback)
+
+    def get_circuit_breaker(self):
+        """
+            :return: the circuit breaker of the bulb, shared by every API call to it
+            :rtype: YeelightCircuitBreaker
+        """
+        return self.get_connection().breaker
+
     def operate_on_bulb(self, method, params=None):
         """
-            Build socket and send command to the bulb through it
+            Send command to the bulb through the persistent connection and wait for its response
+
+            A command failing on a transport error (bulb unreachable, no response within the read timeout) is
+            retried according to the retry policy, and counts as one failure of the circuit breaker once its
+            retries are used up. While the circuit breaker of the bulb is open, the command fails right away with
+            YeelightCircuitOpen.
 
             :param method: method you want to use
             :param params: parameters needed for this method (can be a string if ony one parameter is needed)
 
             :type method: str
             :type params: list of str
+            :return: the result of the command
+            :rtype: list
         """
+        breaker = self.get_circuit_breaker()
+        breaker.before_call()
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                result = self.operate_on_bulb_once(method, params)
+            except OSError as error:
+                # Other commands may have opened the circuit meanwhile, no need to insist
+                if self.retry_policy.should_retry(method, attempt, error) and \
+                        breaker.get_state() != breaker.STATE_OPEN:
+                    time.sleep(self.retry_policy.get_delay(attempt))
+                    continue
+                breaker.record_failure()
+                raise
+            except YeelightError:
+                # The bulb answered, it is alive
+                breaker.record_success()
+                raise
+            breaker.record_success()
+            return result
+
+    def operate_on_bulb_once(self, method, params=None):
+        """
+            Send the command once, without retry
+        """
+        if self.metrics is not None:
+            return self.operate_on_bulb_measured(method, params)
         # Get the message
-        self.command = YeelightCommand(self.next_cmd_id(), method, params)
-        # Send with socket
-        tcp_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        tcp_socket.connect((self.ip, int(self.port)))
-        tcp_socket.send(self.command.get_message().encode())
-        data = tcp_socket.recv(4096)
-        tcp_socket.close()
+        command = YeelightCommand(self.next_cmd_id(), method, params)
+        if self.journal is not None:
+            return self.keep_result(command, YeelightResponse(self.send_journaled(command), command))
+        # Send through the connection shared with other commands to this bulb
+        data = self.get_connection().send_and_receive(command.get_message_bytes(), command.get_command_id())
         # Process the response
-        self.response = YeelightResponse(data.decode(), self.command)
+        return self.keep_result(command, YeelightResponse(data, command))
+
+    def operate_on_bulb_measured(self, method, params=None):
+        """
+            Same as operate_on_bulb, with the time of each phase and the error recorded in the metrics
+        """
+        timings = {}
+        error = None
+        started_at = time.perf_counter()
+        try:
+            command = YeelightCommand(self.next_cmd_id(), method, params)
+            message = command.get_message_bytes()
+            timings["encode"] = time.perf_counter() - started_at
+            if self.journal is not None:
+                data = self.send_journaled(command, timings)
+            else:
+                data = self.get_connection().send_and_receive(message, command.get_command_id(), timings)
+            decode_started_at = time.perf_counter()
+            try:
+                response = YeelightResponse(data, command)
+            finally:
+                timings["decode"] = time.perf_counter() - decode_started_at
+            return self.keep_result(command, response)
+        except Exception as exception:
+            error = exception
+            raise
+        finally:
+            timings["total"] = time.perf_counter() - started_at
+            self.metrics.record("{}:{}".format(self.ip, self.port), method, timings, error)
+
+    def send_journaled(self, command, timings=None):
+        """
+            Send the command and wait for its response like YeelightConnection.send_and_receive, recording both in
+            the journal
+            :return: the decoded response
+            :rtype: dict
+        """
+        bulb = "{}:{}".format(self.ip, self.port)
+        self.journal.record_command(bulb, command)
+        try:
+            data = self.get_connection().send_and_receive(command.get_message_bytes(), command.get_command_id(),
+                                                          timings)
+        except OSError as error:
+            self.journal.record_error(bulb, command.get_command_id(), error)
+            raise
+        self.journal.record_response(bulb, data)
+        return data
+
+    def operate_on_bulb_pipeline(self, calls, raise_on_error=True):
+        """
+            Send several commands back to back without waiting for each response, then wait for all of them.
+            Responses are matched to their command by id, so they can come back in any order.
+
+            :param calls: list of (method, params) tuples
+            :param raise_on_error: if False, a failed command gives its YeelightError in the result list
+                                   instead of raising it
+            :return: the result of each command, in the order of calls
+            :rtype: list
+
+            :type calls: list of tuple
+            :type raise_on_error: bool
+        """
+        connection = self.get_connection()
+        connection.breaker.before_call()
+        try:
+            results = self.run_pipeline(connection, calls, raise_on_error)
+        except OSError:
+            connection.breaker.record_failure()
+            raise
+        except YeelightError:
+            connection.breaker.record_success()
+            raise
+        connection.breaker.record_success()
+        return results
+
+    def run_pipeline(self, connection, calls, raise_on_error):
+        """
+            Body of operate_on_bulb_pipeline, without retry
+        """
+        metrics = self.metrics
+        journal = self.journal
+        bulb = "{}:{}".format(self.ip, self.port)
+        commands = []
+        futures = []
+        # Timings of each command, only measured when metrics are set
+        measures = []
+        for method, params in calls:
+            command_id = connection.next_command_id()
+            command = YeelightCommand(command_id, method, params)
+            commands.append(command)
+            if journal is not None:
+                journal.record_command(bulb, command)
+            if metrics is None:
+                futures.append(connection.submit(command.get_message_bytes(), command_id))
+                continue
+            timings = {}
+            started_at = time.perf_counter()
+            try:
+                futures.append(connection.submit(command.get_message_bytes(), command_id, timings))
+            except Exception as exception:
+                timings["total"] = time.perf_counter() - started_at
+                metrics.record(bulb, method, timings, exception)
+                raise
+            measures.append((timings, started_at))
+        results = []
+        for index, (command, future) in enumerate(zip(commands, futures)):
+            error = None
+            if metrics is not None:
+                timings, started_at = measures[index]
+                wait_started_at = time.perf_counter()
+            try:
+                try:
+                    data = connection.wait_response(future, command.get_command_id())
+                except OSError as exception:
+                    if journal is not None:
+                        journal.record_error(bulb, command.get_command_id(), exception)
+                    raise
+                if journal is not None:
+                    journal.record_response(bulb, data)
+                if metrics is not None:
+                    decode_started_at = time.perf_counter()
+                    timings["wait"] = decode_started_at - wait_started_at
+                results.append(self.keep_result(command, YeelightResponse(data, command)))
+            except Exception as exception:
+                error = exception
+                if raise_on_error or not isinstance(exception, YeelightError):
+                    raise
+                results.append(exception)
+            finally:
+                if metrics is not None:
+                    now = time.perf_counter()
+                    if "wait" in timings:
+                        timings["decode"] = now - decode_started_at
+                    timings["total"] = now - started_at
+                    metrics.record(bulb, command.method, timings, error)
+        return results
@@ -0,0 +1,536 @@
+import asyncio
+import logging
+import random
+import socket
+from . import YeelightBulb
+from . import yeelightColor
+from .yeelightAPICall import YeelightAPICall
+from .yeelightCapability import YeelightCapabilities, YeelightCommandRefused
+from .yeelightMessage import YeelightCommand, YeelightResponse, YeelightError, YeelightStreamReader
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class AsyncYeelightAPICall:
+    """
+        asyncio version of YeelightAPICall, commands are sent through a persistent asyncio stream.
+        A reader task matches each response to its command by id, so several commands can be in flight at once.
+        The connect and read timeouts and the circuit breaker of the bulb come from the connection pool, like the
+        sync API calls.
+    """
+
+    DEFAULT_PORT = YeelightAPICall.DEFAULT_PORT
+
+    # See YeelightAPICall.retry_policy
+    retry_policy = YeelightAPICall.retry_policy
+
+    # See YeelightAPICall.keep_messages
+    keep_messages = False
+
+    def __init__(self, ip, port=DEFAULT_PORT, connection_pool=None):
+        """
+            Build the API Call, the connection is opened by the first command
+
+            :param ip: ip of the bulb you want to manipulate
+            :param port: port used to send and receive messages (should be the default port)
+            :param connection_pool: pool holding the timeouts and the circuit breaker of the bulb, shared with the
+                                    sync API calls. The YeelightAPICall class pool is used if None
+
+            :type connection_pool: YeelightConnectionPool
+        """
+        self.ip = ip
+        self.port = port
+        self.connection_pool = connection_pool if connection_pool is not None else YeelightAPICall.connection_pool
+        self.command_id = 0
+        self.command = None
+        self.response = None
+        self.result = None
+        self.writer = None
+        self.reader_task = None
+        self.pending = {}
+        self.listeners = []
+        self.close_listeners = []
+        self.lock = None
+
+    def get_response(self):
+        return self.result
+
+    keep_result = YeelightAPICall.keep_result
+
+    def get_command(self):
+        return self.command
+
+    def next_cmd_id(self):
+        """
+            See YeelightAPICall.next_cmd_id
+            :rtype: int
+        """
+        self.command_id = random.getrandbits(16)
+        while self.command_id in self.pending:
+            self.command_id = random.getrandbits(16)
+        return self.command_id
+
+    def is_connected(self):
+        return self.writer is not None and not self.writer.is_closing()
+
+    def get_circuit_breaker(self):
+        """
+            :return: the circuit breaker of the bulb, shared with the sync API calls to it
+            :rtype: YeelightCircuitBreaker
+        """
+        return self.connection_pool.get_connection(self.ip, self.port).breaker
+
+    def add_notification_listener(self, callback):
+        """
+            Register a callback called with every notification sent by the bulb
+
+            :param callback: function taking the decoded notification dict
+        """
+        self.listeners.append(callback)
+
+    def remove_notification_listener(self, callback):
+        if callback in self.listeners:
+            self.listeners.remove(callback)
+
+    def add_close_listener(self, callback):
+        """
+            See YeelightAPICall.add_close_listener, the callback is called by the reader task
+        """
+        self.close_listeners.append(callback)
+
+    def remove_close_listener(self, callback):
+        if callback in self.close_listeners:
+            self.close_listeners.remove(callback)
+
+    async def connect(self):
+        """
+            Open the stream to the bulb and start the task reading it
+        """
+        connect_timeout = self.connection_pool.connect_timeout
+        try:
+            reader, self.writer = await asyncio.wait_for(asyncio.open_connection(self.ip, int(self.port)),
+                                                         connect_timeout)
+        except asyncio.TimeoutError:
+            raise socket.timeout("The Yeelight bulb {}:{} didn't accept the connection within {}s".format(
+                self.ip, self.port, connect_timeout))
+        # Each stream has its own pending table, so a dead stream only fails its own commands
+        self.pending = {}
+        self.reader_task = asyncio.ensure_future(self.read_loop(reader, self.writer, self.pending))
+
+    async def close(self):
+        """
+            Close the stream, the next command will open a new one
+        """
+        writer = self.writer
+        self.writer = None
+        if writer is not None:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except OSError:
+                pass
+
+    async def submit(self, command):
+        """
+            Send a command without waiting for its response
+
+            :param command: command to send
+            :type command: YeelightCommand
+            :return: future resolved with the decoded response
+            :rtype: asyncio.Future
+        """
+        # The lock is created here to be bound to the running loop
+        if self.lock is None:
+            self.lock = asyncio.Lock()
+        async with self.lock:
+            if not self.is_connected():
+                await self.connect()
+            future = asyncio.get_running_loop().create_future()
+            self.pending[command.get_command_id()] = future
+            self.writer.write(command.get_message_bytes())
+        try:
+            await self.writer.drain()
+        except OSError:
+            self.pending.pop(command.get_command_id(), None)
+            await self.close()
+            raise
+        return future
+
+    async def wait_response(self, future, command_id):
+        """
+            Wait for the response of a submitted command within the read timeout of the pool. On timeout, the
+            stream is closed (the bulb may be gone without closing it) and socket.timeout is raised.
+
+            :param future: future returned by submit
+            :param command_id: id of the command
+            :return: the decoded response
+            :rtype: dict
+        """
+        read_timeout = self.connection_pool.read_timeout
+        try:
+            return await asyncio.wait_for(future, read_timeout)
+        except asyncio.TimeoutError:
+            if self.pending.get(command_id) is future:
+                del self.pending[command_id]
+                await self.close()
+            raise socket.timeout("The Yeelight bulb {}:{} didn't answer within {}s".format(self.ip, self.port,
+                                                                                           read_timeout))
+
+    async def operate_on_bulb(self, method, params=None):
+        """
+            Send command to the bulb and wait for its response without blocking the event loop
+
+            Retries and circuit breaker work like YeelightAPICall.operate_on_bulb.
+
+            :param method: method you want to use
+            :param params: parameters needed for this method (can be a string if ony one parameter is needed)
+
+            :type method: str
+            :type params: list of str
+            :return: the result of the command
+            :rtype: list
+        """
+        breaker = self.get_circuit_breaker()
+        breaker.before_call()
+        attempt = 0
+        while True:
+            attempt += 1
+            command = YeelightCommand(self.next_cmd_id(), method, params)
+            try:
+                data = await self.wait_response(await self.submit(command), command.get_command_id())
+            except OSError as error:
+                if self.retry_policy.should_retry(method, attempt, error) and \
+                        breaker.get_state() != breaker.STATE_OPEN:
+                    await asyncio.sleep(self.retry_policy.get_delay(attempt))
+                    continue
+                breaker.record_failure()
+                raise
+            # Even an error response shows the bulb is alive
+            breaker.record_success()
+            return self.keep_result(command, YeelightResponse(data, command))
+
+    async def operate_on_bulb_pipeline(self, calls, raise_on_error=True):
+        """
+            See YeelightAPICall.operate_on_bulb_pipeline
+
+            :param calls: list of (method, params) tuples
+            :param raise_on_error: if False, a failed command gives its YeelightError in the result list
+            :return: the result of each command, in the order of calls
+            :rtype: list
+        """
+        breaker = self.get_circuit_breaker()
+        breaker.before_call()
+        try:
+            results = await self.run_pipeline(calls, raise_on_error)
+        except OSError:
+            breaker.record_failure()
+            raise
+        except YeelightError:
+            breaker.record_success()
+            raise
+        breaker.record_success()
+        return results
+
+    async def run_pipeline(self, calls, raise_on_error):
+        """
+            Body of operate_on_bulb_pipeline, without retry
+        """
+        commands = []
+        futures = []
+        for method, params in calls:
+            command = YeelightCommand(self.next_cmd_id(), method, params)
+            commands.append(command)
+            futures.append(await self.submit(command))
+        results = []
+        for command, future in zip(commands, futures):
+            try:
+                data = await self.wait_response(future, command.get_command_id())
+                results.append(self.keep_result(command, YeelightResponse(data, command)))
+            except YeelightError as error:
+                if raise_on_error:
+                    raise
+                results.append(error)
+        return results
+
+    def dispatch(self, data, pending):
+        """
+            Resolve the future waiting for a response, or give a notification to the listeners
+
+            :param data: decoded message
+            :param pending: pending table of the stream the message comes from
+        """
+        if "id" in data:
+            future = pending.pop(data["id"], None)
+            if future is not None and not future.done():
+                future.set_result(data)
+            return
+        for listener in list(self.listeners):
+            try:
+                listener(data)
+            except Exception:
+                _LOGGER.exception("Notification listener of %s:%s failed", self.ip, self.port)
+
+    async def read_loop(self, reader, writer, pending):
+        """
+            Body of the reader task, runs until the stream is closed
+
+            :param reader: stream to read
+            :param writer: writer of the same stream
+            :param pending: pending table of this stream
+        """
+        stream_reader = YeelightStreamReader()
+        try:
+            while True:
+                data = await reader.read(YeelightStreamReader.DEFAULT_CHUNK_SIZE)
+                if not data:
+                    break
+                for message in stream_reader.feed(data):
+                    self.dispatch(message, pending)
+        except (OSError, ValueError):
+            pass
+        finally:
+            if self.writer is writer:
+                self.writer = None
+                writer.close()
+            error = ConnectionResetError("The Yeelight bulb {}:{} closed the connection".format(self.ip, self.port))
+            for future in pending.values():
+                if not future.done():
+                    future.set_exception(error)
+            pending.clear()
+            for listener in list(self.close_listeners):
+                try:
+                    listener()
+                except Exception:
+                    _LOGGER.exception("Close listener of %s:%s failed", self.ip, self.port)
+
+
+class AsyncYeelightBulb(YeelightBulb):
+    """
+        asyncio version of YeelightBulb.
+        Building the bulb doesn't touch the network, await refresh_property() to load the properties.
+        Every method reading from or writing to the bulb is a coroutine, e.g. await bulb.get_property("power").
+        Rate limiting and music mode are only available with YeelightBulb.
+    """
+
+    def __init__(self, ip, port=AsyncYeelightAPICall.DEFAULT_PORT, lazy=True, property_ttl=None,
+                 validation_mode=None):
+        """
+            See YeelightBulb.__init__
+
+            :param lazy: must be True, the properties can't be loaded without awaiting refresh_property
+        """
+        if not lazy:
+            raise ValueError("AsyncYeelightBulb can't load its properties in its constructor, use create()")
+        self.setup(AsyncYeelightAPICall(ip, port), property_ttl, validation_mode)
+        self.notified = asyncio.Event()
+
+    @classmethod
+    async def create(cls, ip, port=AsyncYeelightAPICall.DEFAULT_PORT):
+        """
+            Build the bulb and load its properties
+            :rtype: AsyncYeelightBulb
+        """
+        bulb = cls(ip, port)
+        await bulb.refresh_property()
+        return bulb
+
+    async def close(self):
+        await self.api_call.close()
+
+    async def send_command(self, method, params=None):
+        """
+            See YeelightBulb.send_command
+        """
+        return await self.api_call.operate_on_bulb(method, params)
+
+    async def call_command(self, method, params=None):
+        """
+            See YeelightBulb.call_command
+        """
+        return await self.api_call.operate_on_bulb(method, params)
+
+    def start_music_mode(self, host=None, port=0, queue_size=None):
+        """
+            Music mode streams the commands from a thread, it is refused without any network I/O
+        """
+        raise YeelightCommandRefused("set_music", "music mode is only available with YeelightBulb")
+
+    async def refresh_property(self, property_names=None):
+        """
+            See YeelightBulb.refresh_property
+        """
+        if property_names is None:
+            prop_list = list(self.property.keys())
+        else:
+            prop_list = list(property_names)
+        result = await self.api_call.operate_on_bulb("get_prop", prop_list)
+        self.update_property(dict(zip(prop_list, result)))
+
+    async def get_property(self, property_name, max_age=None):
+        """
+            Coroutine version of YeelightBulb.get_property, a stale value is read again from the bulb
+        """
+        if property_name not in self.property:
+            print("This property '{}' is not available".format(property_name))
+            return None
+        stale = self.get_stale_properties([property_name], max_age)
+        if stale:
+            await self.refresh_property(stale)
+        return self.property[property_name]
+
+    async def get_properties(self, property_names=None, max_age=None):
+        """
+            Coroutine version of YeelightBulb.get_properties
+        """
+        if property_names is None:
+            property_names = list(self.property)
+        stale = self.get_stale_properties(property_names, max_age)
+        if stale:
+            await self.refresh_property(stale)
+        return {name: self.property[name] for name in property_names}
+
+    async def get_rgb_color(self, max_age=None):
+        """
+            Coroutine version of YeelightBulb.get_rgb_color
+        """
+        rgb = await self.get_property(self.PROPERTY_NAME_RGB_COLOR, max_age)
+        return yeelightColor.int_to_rgb(rgb) if rgb is not None else None
+
+    async def probe_capabilities(self, timeout=1.0):
+        """
+            See YeelightBulb.probe_capabilities, the probe runs in the default executor
+        """
+        loop = asyncio.get_running_loop()
+        self.capabilities = await loop.run_in_executor(None, YeelightCapabilities.probe, self.api_call.ip,
+                                                       self.api_call.port, timeout)
+        return self.capabilities
+
+    async def set_color_temperature(self, temperature, effect=YeelightBulb.EFFECT_SUDDEN,
+                                    transition_time=YeelightBulb.MIN_TRANSITION_TIME):
+        """
+            See YeelightBulb.set_color_temperature
+        """
+        self.check_command("set_ct_abx")
+        self.validate("set_ct_abx", {'temperature': temperature, 'effect': effect, 'transition_time': transition_time})
+        result = await self.api_call.operate_on_bulb("set_ct_abx", [temperature, effect, transition_time])
+        self.update_property({self.PROPERTY_NAME_COLOR_TEMPERATURE: temperature})
+        return result
+
+    async def set_rgb_color(self, red, green, blue, effect=YeelightBulb.EFFECT_SUDDEN,
+                            transition_time=YeelightBulb.MIN_TRANSITION_TIME):
+        """
+            See YeelightBulb.set_rgb_color
+        """
+        self.check_command("set_rgb")
+        self.validate("set_rgb", {'red': red, 'green': green, 'blue': blue, 'effect': effect,
+                                  'transition_time': transition_time})
+        rgb = yeelightColor.rgb_to_int(red, green, blue)
+        result = await self.api_call.operate_on_bulb("set_rgb", [rgb, effect, transition_time])
+        self.update_property({self.PROPERTY_NAME_RGB_COLOR: rgb})
+        return result
+
+    async def set_hsv_color(self, hue, saturation, effect=YeelightBulb.EFFECT_SUDDEN,
+                            transition_time=YeelightBulb.MIN_TRANSITION_TIME):
+        """
+            See YeelightBulb.set_hsv_color
+        """
+        self.check_command("set_hsv")
+        self.validate("set_hsv", {'hue': hue, 'saturation': saturation, 'effect': effect,
+                                  'transition_time': transition_time})
+        result = await self.api_call.operate_on_bulb("set_hsv", [hue, saturation, effect, transition_time])
+        self.update_property({self.PROPERTY_NAME_HUE: hue, self.PROPERTY_NAME_SATURATION: saturation})
+        return result
+
+    async def set_brightness(self, brightness, effect=YeelightBulb.EFFECT_SUDDEN,
+                             transition_time=YeelightBulb.MIN_TRANSITION_TIME):
+        """
+            See YeelightBulb.set_brightness
+        """
+        self.check_command("set_bright")
+        self.validate("set_bright", {'brightness': brightness, 'effect': effect, 'transition_time': transition_time})
+        result = await self.api_call.operate_on_bulb("set_bright", [brightness, effect, transition_time])
+        self.update_property({self.PROPERTY_NAME_BRIGHTNESS: brightness})
+        return result
+
+    async def turn_on(self, effect=YeelightBulb.EFFECT_SUDDEN, transition_time=YeelightBulb.MIN_TRANSITION_TIME):
+        """
+            See YeelightBulb.turn_on
+        """
+        if self.is_on():
+            return
+        self.check_command("set_power")
+        self.validate("set_power", {'effect': effect, 'transition_time': transition_time})
+        result = await self.api_call.operate_on_bulb("set_power", ["on", effect, transition_time])
+        self.update_property({self.PROPERTY_NAME_POWER: self.POWER_ON})
+        return result
+
+    async def turn_off(self, effect=YeelightBulb.EFFECT_SUDDEN, transition_time=YeelightBulb.MIN_TRANSITION_TIME):
+        """
+            See YeelightBulb.turn_off
+        """
+        if self.is_off():
+            return
+        self.check_command("set_power")
+        self.validate("set_power", {'effect': effect, 'transition_time': transition_time})
+        result = await self.api_call.operate_on_bulb("set_power", ["off", effect, transition_time])
+        self.update_property({self.PROPERTY_NAME_POWER: self.POWER_OFF})
+        return result
+
+    async def toggle(self):
+        """
+            See YeelightBulb.toggle
+        """
+        self.check_command("toggle")
+        power = self.get_toggled_power()
+        result = await self.api_call.operate_on_bulb("toggle")
+        if power is not None:
+            self.update_property({self.PROPERTY_NAME_POWER: power})
+        return result
+
+    async def set_scene(self, scene):
+        """
+            See YeelightBulb.set_scene
+        """
+        self.check_scene(scene)
+        result = await self.api_call.operate_on_bulb("set_scene", scene.get_params())
+        self.update_property(scene.get_properties())
+        return result
+
+    async def start_flow(self, flow):
+        """
+            See YeelightBulb.start_flow
+        """
+        self.check_command("start_cf")
+        params = flow.get_params()
+        result = await self.api_call.operate_on_bulb("start_cf", params)
+        self.update_property({self.PROPERTY_NAME_FLOW: 1, self.PROPERTY_NAME_FLOW_PARAMETERS: params[2]})
+        return result
+
+    async def stop_flow(self):
+        """
+            See YeelightBulb.stop_flow
+        """
+        self.check_command("stop_cf")
+        result = await self.api_call.operate_on_bulb("stop_cf")
+        self.update_property({self.PROPERTY_NAME_FLOW: 0})
+        return result
+
+    async def save_state(self):
+        """
+            See YeelightBulb.save_state
+        """
+        self.check_command("set_default")
+        await self.api_call.operate_on_bulb("set_default")
+
+    async def adjust(self, action, prop):
+        """
+            See YeelightBulb.adjust
+        """
+        self.validate("set_adjust", {'action': action, 'prop': prop})
+        self.check_command("set_adjust")
+        self.notified.clear()
+        await self.api_call.operate_on_bulb("set_adjust", [action, prop])
+        try:
+            await asyncio.wait_for(self.notified.wait(), self.ADJUST_NOTIFICATION_TIMEOUT)
+        except asyncio.TimeoutError:
+            await self.refresh_property()
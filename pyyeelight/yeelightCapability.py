@@ -0,0 +1,142 @@
+import threading
+import time
+from .yeelightDiscovery import YeelightDiscovery
+
+
+class YeelightCommandRefused(Exception):
+    """
+        Raised without any network I/O for a command the bulb can't run : not supported by its model, or not
+        accepted while it is off
+    """
+
+    def __init__(self, method, reason):
+        self.method = method
+        self.reason = reason
+        Exception.__init__(self, "{} can't be used : {}".format(method, reason))
+
+
+class YeelightCapabilities:
+    """
+        Methods a bulb model supports, as listed in the "support" header of its discovery messages.
+
+        Capabilities are cached per ip and port : filled when a bulb is discovered or answers a unicast probe, and
+        kept as long as its advertisement is valid (the max-age of the discovery message, like the registry
+        entries). A bulb that doesn't answer the probe is not cached, it is probed again the next time. While
+        they are unknown every method is allowed and only the power state rules apply.
+    """
+
+    # Methods the bulb rejects while it is off
+    OFF_DISALLOWED = frozenset(("set_ct_abx", "set_rgb", "set_hsv", "set_bright", "set_default"))
+
+    # Methods every bulb answers, even if its support list doesn't name them
+    ALWAYS_SUPPORTED = frozenset(("get_prop",))
+
+    # Capabilities of each "ip:port", shared by every bulb object
+    cache = {}
+    cache_lock = threading.Lock()
+
+    def __init__(self, methods=None, model=None, expires_at=None):
+        """
+            :param methods: methods supported by the bulb, None if they are unknown
+            :param model: model name of the bulb
+            :param expires_at: time.monotonic() time the capabilities stop being valid, None if they never expire
+
+            :type methods: list of str
+            :type model: str
+            :type expires_at: float
+        """
+        self.methods = frozenset(methods) if methods is not None else None
+        self.model = model
+        self.expires_at = expires_at
+
+    @staticmethod
+    def get_key(ip, port):
+        return "{}:{}".format(ip, port)
+
+    @classmethod
+    def from_device(cls, device):
+        """
+            :param device: device found by YeelightDiscovery
+            :type device: YeelightDevice
+            :rtype: YeelightCapabilities
+        """
+        capabilities = cls(device.support if device.support else None, device.model, device.expires_at)
+        with cls.cache_lock:
+            cls.cache[cls.get_key(device.ip, device.port)] = capabilities
+        return capabilities
+
+    @classmethod
+    def get_cached(cls, ip, port):
+        """
+            :return: the capabilities known for this bulb, None if it was never discovered nor probed or if its
+                     advertisement expired
+            :rtype: YeelightCapabilities
+        """
+        key = cls.get_key(ip, port)
+        with cls.cache_lock:
+            capabilities = cls.cache.get(key)
+            if capabilities is not None and capabilities.is_expired():
+                del cls.cache[key]
+                return None
+            return capabilities
+
+    @classmethod
+    def probe(cls, ip, port, timeout=1.0, discovery=None):
+        """
+            Ask the bulb for its capabilities with a unicast search, unless they are cached.
+            A bulb that doesn't answer gets unknown capabilities, they are not cached : it is probed again the next
+            time.
+
+            :param ip: ip of the bulb
+            :param port: port of the bulb API
+            :param timeout: time in seconds to wait for the answer
+            :param discovery: discovery used to send the search, a new one if None
+            :rtype: YeelightCapabilities
+        """
+        capabilities = cls.get_cached(ip, port)
+        if capabilities is not None:
+            return capabilities
+        if discovery is None:
+            discovery = YeelightDiscovery()
+        device = discovery.probe(ip, timeout)
+        if device is not None:
+            return cls.from_device(device)
+        return cls()
+
+    def is_known(self):
+        return self.methods is not None
+
+    def is_expired(self):
+        return self.expires_at is not None and time.monotonic() > self.expires_at
+
+    def supports(self, method):
+        """
+            :return: False only if the bulb is known not to support the method
+            :rtype: bool
+        """
+        return self.methods is None or method in self.methods or method in self.ALWAYS_SUPPORTED
+
+    def get_refusal(self, method, power=None):
+        """
+            :param method: method of the command
+            :param power: power property of the bulb, None to ignore the power state
+            :return: why the bulb can't run the command, None if it can
+            :rtype: str
+        """
+        if not self.supports(method):
+            return "the bulb{} doesn't support it".format(" " + self.model if self.model else "")
+        if power == "off" and method in self.OFF_DISALLOWED:
+            return "the bulb is off. Turn it on first"
+        return None
+
+    def check(self, method, power=None):
+        """
+            Raise YeelightCommandRefused if the bulb can't run the command, see get_refusal
+        """
+        reason = self.get_refusal(method, power)
+        if reason is not None:
+            raise YeelightCommandRefused(method, reason)
+
+    def __str__(self):
+        methods = "unknown" if self.methods is None else " ".join(sorted(self.methods))
+        return 'Capabilities : "{}"\nMethods : {}'.format(self.model, methods)
@@ -0,0 +1,191 @@
+import random
+import threading
+import time
+
+
+class YeelightCircuitOpen(ConnectionError):
+    """
+        Raised instead of sending a command to a bulb whose circuit breaker is open
+    """
+
+    def __init__(self, bulb, retry_in):
+        """
+            :param bulb: "ip:port" of the bulb
+            :param retry_in: time in seconds before a command is tried again
+        """
+        self.bulb = bulb
+        self.retry_in = retry_in
+        ConnectionError.__init__(self, "The Yeelight bulb {} is unreachable, next try in {:.1f}s".format(bulb,
+                                                                                                      retry_in))
+
+
+class YeelightCircuitBreaker:
+    """
+        Circuit breaker of one bulb : after repeated connection failures the bulb is considered dead and its
+        commands fail fast until a cooldown has elapsed, so one unplugged bulb doesn't stall the commands sent to
+        the whole fleet. After the cooldown one command is let through : the circuit closes again if it succeeds,
+        and opens for another cooldown if it fails.
+
+        Only transport errors count as failures, an error answered by the bulb proves it is alive.
+    """
+
+    STATE_CLOSED = "closed"
+    STATE_OPEN = "open"
+    STATE_HALF_OPEN = "half_open"
+
+    DEFAULT_FAILURE_THRESHOLD = 3
+    DEFAULT_COOLDOWN = 30.0
+
+    def __init__(self, bulb, failure_threshold=DEFAULT_FAILURE_THRESHOLD, cooldown=DEFAULT_COOLDOWN):
+        """
+            :param bulb: "ip:port" of the bulb
+            :param failure_threshold: number of failures in a row that opens the circuit
+            :param cooldown: time in seconds the circuit stays open
+
+            :type failure_threshold: int
+            :type cooldown: float
+        """
+        self.bulb = bulb
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.state = self.STATE_CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.rejected = 0
+        self.listeners = []
+        self.lock = threading.Lock()
+
+    def add_listener(self, callback):
+        """
+            :param callback: function called with the breaker, the previous state and the new state on each change
+        """
+        self.listeners.append(callback)
+
+    def remove_listener(self, callback):
+        if callback in self.listeners:
+            self.listeners.remove(callback)
+
+    def set_state(self, state):
+        """
+            Must be called with the lock held.
+            :return: the previous state
+        """
+        previous = self.state
+        self.state = state
+        if state == self.STATE_OPEN:
+            self.opened_at = time.monotonic()
+        return previous
+
+    def notify(self, previous, state):
+        if previous != state:
+            for listener in list(self.listeners):
+                listener(self, previous, state)
+
+    def before_call(self):
+        """
+            Raise YeelightCircuitOpen if the command must not be sent
+        """
+        with self.lock:
+            if self.state == self.STATE_CLOSED:
+                return
+            retry_in = self.opened_at + self.cooldown - time.monotonic()
+            if self.state == self.STATE_OPEN and retry_in <= 0:
+                # This command is the trial, the others keep failing fast until it is answered
+                previous = self.set_state(self.STATE_HALF_OPEN)
+            else:
+                self.rejected += 1
+                raise YeelightCircuitOpen(self.bulb, max(0.0, retry_in))
+        self.notify(previous, self.STATE_HALF_OPEN)
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            previous = self.set_state(self.STATE_CLOSED)
+        self.notify(previous, self.STATE_CLOSED)
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            previous = self.state
+            if self.state == self.STATE_HALF_OPEN or self.failures >= self.failure_threshold:
+                self.set_state(self.STATE_OPEN)
+            state = self.state
+        self.notify(previous, state)
+
+    def reset(self):
+        """
+            Close the circuit, e.g. when the bulb is seen again by the discovery
+        """
+        self.record_success()
+
+    def get_state(self):
+        """
+            :return: STATE_CLOSED, STATE_OPEN or STATE_HALF_OPEN
+            :rtype: str
+        """
+        return self.state
+
+    def is_open(self):
+        return self.state != self.STATE_CLOSED
+
+    def get_stats(self):
+        """
+            :return: state of the circuit, failures in a row, commands rejected and time before the next try
+            :rtype: dict
+        """
+        with self.lock:
+            retry_in = 0.0
+            if self.state == self.STATE_OPEN:
+                retry_in = max(0.0, self.opened_at + self.cooldown - time.monotonic())
+            return {"state": self.state, "failures": self.failures, "rejected": self.rejected,
+                    "retry_in": retry_in}
+
+
+class YeelightRetryPolicy:
+    """
+        Bounded retries of the commands that failed on a transport error, with an exponential backoff and full
+        jitter : the delay before the attempt n is random between 0 and min(max_delay, base_delay * 2 ** n), so
+        clients failing together don't retry together.
+
+        Commands that are not idempotent are not retried, the bulb may have applied them before the failure.
+    """
+
+    DEFAULT_ATTEMPTS = 3
+    DEFAULT_BASE_DELAY = 0.1
+    DEFAULT_MAX_DELAY = 2.0
+
+    # Applying these commands twice gives another state than applying them once
+    NOT_IDEMPOTENT = ("toggle", "set_adjust", "adjust_bright", "adjust_ct", "adjust_color")
+
+    def __init__(self, attempts=DEFAULT_ATTEMPTS, base_delay=DEFAULT_BASE_DELAY, max_delay=DEFAULT_MAX_DELAY):
+        """
+            :param attempts: maximum number of times a command is sent, 1 disables the retries
+            :param base_delay: delay in seconds before the first retry, doubled on each retry
+            :param max_delay: maximum delay in seconds between two attempts
+
+            :type attempts: int
+            :type base_delay: float
+            :type max_delay: float
+        """
+        self.attempts = attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def should_retry(self, method, attempt, error):
+        """
+            :param method: method of the failed command
+            :param attempt: number of attempts already made
+            :param error: exception raised by the last attempt
+            :rtype: bool
+        """
+        if attempt >= self.attempts or method in self.NOT_IDEMPOTENT:
+            return False
+        return isinstance(error, OSError) and not isinstance(error, YeelightCircuitOpen)
+
+    def get_delay(self, attempt):
+        """
+            :param attempt: number of attempts already made
+            :return: time in seconds to wait before the next attempt
+            :rtype: float
+        """
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
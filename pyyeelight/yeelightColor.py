@@ -0,0 +1,249 @@
+"""
+    Color conversions between the bulb formats : rgb packed in one int, hue (0-359) and saturation (0-100),
+    color temperature in Kelvin.
+
+    The *_array functions convert a whole sequence of colors at once. They use NumPy when it is installed and
+    return NumPy arrays then, plain lists otherwise. NumPy is imported on the first batched call only.
+"""
+import colorsys
+import math
+
+MIN_TEMPERATURE = 1700
+MAX_TEMPERATURE = 6500
+
+# False until the first import attempt, then the numpy module or None if it is not installed
+_numpy = False
+
+
+def get_numpy():
+    """
+        :return: the numpy module, None if it is not installed
+    """
+    global _numpy
+    if _numpy is False:
+        try:
+            import numpy
+        except ImportError:
+            numpy = None
+        _numpy = numpy
+    return _numpy
+
+
+def select_numpy(use):
+    """
+        :param use: True to require numpy, False to avoid it, None to use it when installed
+        :return: the numpy module to use, None for the pure Python version
+    """
+    if use is False:
+        return None
+    numpy = get_numpy()
+    if numpy is None and use:
+        raise ImportError("numpy is needed for this conversion")
+    return numpy
+
+
+def rgb_to_int(red, green, blue):
+    """
+        :return: the color packed as the bulb expects it : 0xRRGGBB
+        :rtype: int
+    """
+    return (red << 16) | (green << 8) | blue
+
+
+def int_to_rgb(value):
+    """
+        :param value: color packed as 0xRRGGBB, as read from the rgb property
+        :return: (red, green, blue)
+        :rtype: tuple
+    """
+    return (value >> 16) & 0xFF, (value >> 8) & 0xFF, value & 0xFF
+
+
+def hsv_to_rgb(hue, saturation):
+    """
+        Color the bulb shows for a hue and saturation, at full value
+
+        :param hue: between 0 and 359
+        :param saturation: between 0 and 100
+        :return: (red, green, blue)
+        :rtype: tuple
+    """
+    red, green, blue = colorsys.hsv_to_rgb(hue / 360.0, saturation / 100.0, 1.0)
+    return int(round(red * 255)), int(round(green * 255)), int(round(blue * 255))
+
+
+def rgb_to_hsv(red, green, blue):
+    """
+        :return: (hue, saturation) of the color, its value is dropped since the bulb brightness is separate
+        :rtype: tuple
+    """
+    hue, saturation, _ = colorsys.rgb_to_hsv(red / 255.0, green / 255.0, blue / 255.0)
+    return int(round(hue * 360)) % 360, int(round(saturation * 100))
+
+
+def ct_to_rgb(temperature):
+    """
+        Approximate color of a black body at this temperature (Tanner Helland fit)
+
+        :param temperature: color temperature in Kelvin
+        :return: (red, green, blue)
+        :rtype: tuple
+    """
+    temperature = temperature / 100.0
+    if temperature <= 66:
+        red = 255.0
+        green = 99.4708025861 * math.log(temperature) - 161.1195681661
+    else:
+        red = 329.698727446 * (temperature - 60) ** -0.1332047592
+        green = 288.1221695283 * (temperature - 60) ** -0.0755148492
+    if temperature >= 66:
+        blue = 255.0
+    elif temperature <= 19:
+        blue = 0.0
+    else:
+        blue = 138.5177312231 * math.log(temperature - 10) - 305.0447927307
+    return tuple(int(round(min(255.0, max(0.0, component)))) for component in (red, green, blue))
+
+
+def _linear(component):
+    component /= 255.0
+    return component / 12.92 if component <= 0.04045 else ((component + 0.055) / 1.055) ** 2.4
+
+
+def rgb_to_ct(red, green, blue):
+    """
+        Approximate color temperature of a color (McCamy formula on its CIE chromaticity), within the bulb range
+
+        :return: color temperature in Kelvin between 1700 and 6500
+        :rtype: int
+    """
+    red, green, blue = _linear(red), _linear(green), _linear(blue)
+    x = 0.4124 * red + 0.3576 * green + 0.1805 * blue
+    y = 0.2126 * red + 0.7152 * green + 0.0722 * blue
+    z = 0.0193 * red + 0.1192 * green + 0.9505 * blue
+    total = x + y + z
+    if total == 0:
+        return MIN_TEMPERATURE
+    n = (x / total - 0.3320) / (0.1858 - y / total)
+    temperature = 449 * n ** 3 + 3525 * n ** 2 + 6823.3 * n + 5520.33
+    return int(round(min(MAX_TEMPERATURE, max(MIN_TEMPERATURE, temperature))))
+
+
+def rgb_to_int_array(colors, use_numpy=None):
+    """
+        :param colors: (red, green, blue) of each color, or a numpy array of shape (n, 3)
+        :param use_numpy: True to require numpy, False to avoid it, None to use it when installed
+        :return: the packed colors
+    """
+    np = select_numpy(use_numpy)
+    if np is None:
+        return [(red << 16) | (green << 8) | blue for red, green, blue in colors]
+    colors = np.asarray(colors, dtype=np.int32).reshape(-1, 3)
+    return (colors[:, 0] << 16) | (colors[:, 1] << 8) | colors[:, 2]
+
+
+def int_to_rgb_array(values, use_numpy=None):
+    """
+        :param values: packed colors
+        :param use_numpy: True to require numpy, False to avoid it, None to use it when installed
+        :return: (red, green, blue) of each color, an array of shape (n, 3) with numpy
+    """
+    np = select_numpy(use_numpy)
+    if np is None:
+        return [((value >> 16) & 0xFF, (value >> 8) & 0xFF, value & 0xFF) for value in values]
+    values = np.asarray(values, dtype=np.int32)
+    return np.stack(((values >> 16) & 0xFF, (values >> 8) & 0xFF, values & 0xFF), axis=-1)
+
+
+def hsv_to_rgb_array(colors, use_numpy=None):
+    """
+        :param colors: (hue, saturation) of each color, or a numpy array of shape (n, 2)
+        :param use_numpy: True to require numpy, False to avoid it, None to use it when installed
+        :return: (red, green, blue) of each color, an array of shape (n, 3) with numpy
+    """
+    np = select_numpy(use_numpy)
+    if np is None:
+        return [hsv_to_rgb(hue, saturation) for hue, saturation in colors]
+    colors = np.asarray(colors, dtype=np.float64).reshape(-1, 2)
+    # Same operations as colorsys.hsv_to_rgb, so both versions round the same values
+    sector = (colors[:, 0] / 360.0) * 6.0
+    whole = np.trunc(sector)
+    index = whole.astype(np.int64) % 6
+    fraction = sector - whole
+    saturation = colors[:, 1] / 100.0
+    full = np.ones_like(saturation)
+    low = 1.0 - saturation
+    falling = 1.0 - saturation * fraction
+    rising = 1.0 - saturation * (1.0 - fraction)
+    red = np.choose(index, (full, falling, low, low, rising, full))
+    green = np.choose(index, (rising, full, full, falling, low, low))
+    blue = np.choose(index, (low, low, rising, full, full, falling))
+    return np.rint(np.stack((red, green, blue), axis=-1) * 255).astype(np.int32)
+
+
+def rgb_to_hsv_array(colors, use_numpy=None):
+    """
+        :param colors: (red, green, blue) of each color, or a numpy array of shape (n, 3)
+        :param use_numpy: True to require numpy, False to avoid it, None to use it when installed
+        :return: (hue, saturation) of each color, an array of shape (n, 2) with numpy
+    """
+    np = select_numpy(use_numpy)
+    if np is None:
+        return [rgb_to_hsv(red, green, blue) for red, green, blue in colors]
+    colors = np.asarray(colors, dtype=np.float64).reshape(-1, 3) / 255.0
+    # Same operations as colorsys.rgb_to_hsv, so both versions round the same values
+    red, green, blue = colors[:, 0], colors[:, 1], colors[:, 2]
+    high = colors.max(axis=1)
+    delta = high - colors.min(axis=1)
+    gray = delta == 0
+    safe_delta = np.where(gray, 1.0, delta)
+    red_distance = (high - red) / safe_delta
+    green_distance = (high - green) / safe_delta
+    blue_distance = (high - blue) / safe_delta
+    hue = np.where(red == high, blue_distance - green_distance,
+                   np.where(green == high, 2.0 + red_distance - blue_distance, 4.0 + green_distance - red_distance))
+    hue = np.where(gray, 0.0, (hue / 6.0) % 1.0)
+    saturation = np.where(gray, 0.0, delta / np.where(gray, 1.0, high))
+    # np.rint rounds half to even like round
+    return np.stack((np.rint(hue * 360) % 360, np.rint(saturation * 100)), axis=-1).astype(np.int32)
+
+
+def ct_to_rgb_array(temperatures, use_numpy=None):
+    """
+        :param temperatures: color temperatures in Kelvin
+        :param use_numpy: True to require numpy, False to avoid it, None to use it when installed
+        :return: (red, green, blue) of each temperature, an array of shape (n, 3) with numpy
+    """
+    np = select_numpy(use_numpy)
+    if np is None:
+        return [ct_to_rgb(temperature) for temperature in temperatures]
+    temperature = np.asarray(temperatures, dtype=np.float64) / 100.0
+    # Clipped so the branches not selected by where stay finite
+    above = np.maximum(temperature - 60, 1.0)
+    red = np.where(temperature <= 66, 255.0, 329.698727446 * above ** -0.1332047592)
+    green = np.where(temperature <= 66, 99.4708025861 * np.log(np.maximum(temperature, 1.0)) - 161.1195681661,
+                     288.1221695283 * above ** -0.0755148492)
+    blue = np.where(temperature >= 66, 255.0,
+                    np.where(temperature <= 19, 0.0,
+                             138.5177312231 * np.log(np.maximum(temperature - 10, 1.0)) - 305.0447927307))
+    return np.rint(np.clip(np.stack((red, green, blue), axis=-1), 0, 255)).astype(np.int32)
+
+
+def rgb_to_ct_array(colors, use_numpy=None):
+    """
+        :param colors: (red, green, blue) of each color, or a numpy array of shape (n, 3)
+        :param use_numpy: True to require numpy, False to avoid it, None to use it when installed
+        :return: approximate color temperature of each color, see rgb_to_ct
+    """
+    np = select_numpy(use_numpy)
+    if np is None:
+        return [rgb_to_ct(red, green, blue) for red, green, blue in colors]
+    colors = np.asarray(colors, dtype=np.float64).reshape(-1, 3) / 255.0
+    linear = np.where(colors <= 0.04045, colors / 12.92, ((colors + 0.055) / 1.055) ** 2.4)
+    xyz = linear @ np.array(((0.4124, 0.2126, 0.0193), (0.3576, 0.7152, 0.1192), (0.1805, 0.0722, 0.9505)))
+    total = xyz.sum(axis=1)
+    safe_total = np.where(total == 0, 1.0, total)
+    n = (xyz[:, 0] / safe_total - 0.3320) / (0.1858 - xyz[:, 1] / safe_total)
+    temperature = 449 * n ** 3 + 3525 * n ** 2 + 6823.3 * n + 5520.33
+    temperature = np.where(total == 0, MIN_TEMPERATURE, temperature)
+    return np.rint(np.clip(temperature, MIN_TEMPERATURE, MAX_TEMPERATURE)).astype(np.int32)
@@ -0,0 +1,355 @@
+import logging
+import socket
+import threading
+import time
+import types
+import weakref
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from .yeelightCircuitBreaker import YeelightCircuitBreaker
+from .yeelightMessage import YeelightStreamReader
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class YeelightConnection:
+    """
+        Long-lived TCP connection to a bulb.
+        The socket is opened on first use and reopened automatically when the bulb has dropped it.
+
+        Commands are written back to back without waiting for the previous response. A reader thread matches
+        each response to its command by id through the table of pending futures and hands the notifications
+        pushed by the bulb to the listeners. The close listeners are called when the socket is closed, as the bulb
+        doesn't notify anything until the next command opens a new one.
+    """
+
+    DEFAULT_CONNECT_TIMEOUT = 5.0
+    DEFAULT_READ_TIMEOUT = 5.0
+
+    # The bulb only accepts 16 bit ids
+    MAX_COMMAND_ID = 0xFFFF
+
+    def __init__(self, ip, port, connect_timeout=DEFAULT_CONNECT_TIMEOUT, read_timeout=DEFAULT_READ_TIMEOUT,
+                 breaker=None):
+        """
+            Build the connection, no socket is opened until the first command is sent
+
+            :param ip: ip of the bulb
+            :param port: port of the bulb
+            :param connect_timeout: time in seconds to wait for the bulb to accept the connection, None waits for
+                                    the OS timeout
+            :param read_timeout: time in seconds to wait for the response to a command, None waits forever
+            :param breaker: circuit breaker of the bulb, a default one if None
+
+            :type ip: str
+            :type port: int
+            :type connect_timeout: float
+            :type read_timeout: float
+            :type breaker: YeelightCircuitBreaker
+        """
+        self.ip = ip
+        self.port = int(port)
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.breaker = breaker if breaker is not None else YeelightCircuitBreaker("{}:{}".format(ip, self.port))
+        self.socket = None
+        self.pending = {}
+        # Last id given by next_command_id
+        self.command_id = 0
+        self.listeners = []
+        self.close_listeners = []
+        self.lock = threading.Lock()
+        # Protects the listener lists, changed by the user threads while the reader thread calls them
+        self.listener_lock = threading.Lock()
+
+    def is_connected(self):
+        return self.socket is not None
+
+    def connect(self):
+        """
+            Open the TCP socket to the bulb and start the thread reading it.
+            Must be called with the lock held.
+        """
+        self.socket = socket.create_connection((self.ip, self.port), self.connect_timeout)
+        # The timeout only applies to the connection, the reader thread blocks until the bulb sends something
+        self.socket.settimeout(None)
+        self.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        # Each socket has its own pending table, so a dead socket only fails its own commands
+        self.pending = {}
+        reader = threading.Thread(target=self.read_loop, args=(self.socket, self.pending),
+                                  name="yeelight-{}:{}".format(self.ip, self.port), daemon=True)
+        reader.start()
+
+    def close(self):
+        """
+            Close the socket, the next command will open a new one.
+            Must be called with the lock held.
+        """
+        if self.socket is not None:
+            try:
+                self.socket.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            self.socket.close()
+            self.socket = None
+
+    @staticmethod
+    def get_reference(callback):
+        """
+            Bound methods are held through a weak reference, listening doesn't keep their object alive
+            :return: function returning the callback, None once its object is gone
+        """
+        if isinstance(callback, types.MethodType):
+            return weakref.WeakMethod(callback)
+        return lambda: callback
+
+    def add_listener(self, callback):
+        """
+            Register a callback called by the reader thread with every notification sent by the bulb
+
+            :param callback: function taking the decoded notification dict
+        """
+        with self.listener_lock:
+            self.listeners.append(self.get_reference(callback))
+
+    def remove_listener(self, callback):
+        with self.listener_lock:
+            self.listeners = [listener for listener in self.listeners if listener() not in (None, callback)]
+
+    def add_close_listener(self, callback):
+        """
+            Register a callback called by the reader thread when the socket is closed, by the bulb or on error
+
+            :param callback: function without argument
+        """
+        with self.listener_lock:
+            self.close_listeners.append(self.get_reference(callback))
+
+    def remove_close_listener(self, callback):
+        with self.listener_lock:
+            self.close_listeners = [listener for listener in self.close_listeners
+                                    if listener() not in (None, callback)]
+
+    def call_listeners(self, name, *args):
+        """
+            Call every live callback of a listener list, the callbacks whose object is gone are removed
+
+            :param name: "listeners" or "close_listeners"
+            :param args: arguments of the callbacks
+        """
+        with self.listener_lock:
+            listeners = list(getattr(self, name))
+        dead = False
+        for listener in listeners:
+            callback = listener()
+            if callback is None:
+                dead = True
+                continue
+            try:
+                callback(*args)
+            except Exception:
+                _LOGGER.exception("Listener of %s:%s failed", self.ip, self.port)
+        if dead:
+            with self.listener_lock:
+                setattr(self, name, [listener for listener in getattr(self, name) if listener() is not None])
+
+    def next_command_id(self):
+        """
+            Ids are counted per connection, so the threads sharing it never pick the id of a command still waiting
+            for its response
+            :return: an id between 1 and MAX_COMMAND_ID
+            :rtype: int
+        """
+        with self.lock:
+            command_id = self.command_id % self.MAX_COMMAND_ID + 1
+            while command_id in self.pending:
+                command_id = command_id % self.MAX_COMMAND_ID + 1
+            self.command_id = command_id
+            return command_id
+
+    def submit(self, message, command_id, timings=None):
+        """
+            Send a message without waiting for its response
+
+            :param message: encoded message to send
+            :param command_id: id of the command, used to match its response
+            :param timings: if given, filled with the time in seconds spent to "connect" and "send"
+            :return: future resolved with the decoded response
+            :rtype: Future
+
+            :type timings: dict
+        """
+        future = Future()
+        with self.lock:
+            if not self.is_connected():
+                started_at = time.perf_counter()
+                self.connect()
+                if timings is not None:
+                    timings["connect"] = timings.get("connect", 0.0) + time.perf_counter() - started_at
+            if command_id in self.pending:
+                raise ValueError("A command with the id {} is already waiting for its response".format(command_id))
+            self.pending[command_id] = future
+            started_at = time.perf_counter()
+            try:
+                self.socket.sendall(message)
+            except OSError:
+                self.pending.pop(command_id, None)
+                self.close()
+                raise
+            if timings is not None:
+                timings["send"] = time.perf_counter() - started_at
+        return future
+
+    def send_and_receive(self, message, command_id, timings=None):
+        """
+            Send a message through the connection and wait for its response
+
+            A failed command is not sent again, YeelightAPICall.operate_on_bulb decides with its retry policy, as
+            the bulb may have applied it. If the response doesn't come within the read timeout, the socket is closed
+            (the bulb may be gone without closing it) and socket.timeout is raised.
+
+            :param message: encoded message to send
+            :param command_id: id of the command, used to match its response
+            :param timings: if given, filled with the time in seconds spent to "connect", "send" and "wait" for
+                            the response
+            :return: the decoded response
+            :rtype: dict
+
+            :type timings: dict
+        """
+        future = self.submit(message, command_id, timings)
+        if timings is None:
+            return self.wait_response(future, command_id)
+        started_at = time.perf_counter()
+        data = self.wait_response(future, command_id)
+        timings["wait"] = time.perf_counter() - started_at
+        return data
+
+    def wait_response(self, future, command_id):
+        """
+            Wait for the response of a submitted command within the read timeout
+
+            :param future: future returned by submit
+            :param command_id: id of the command
+            :return: the decoded response
+            :rtype: dict
+        """
+        try:
+            return future.result(self.read_timeout)
+        except FutureTimeoutError:
+            with self.lock:
+                if self.pending.get(command_id) is future:
+                    del self.pending[command_id]
+                    self.close()
+            raise socket.timeout("The Yeelight bulb {}:{} didn't answer within {}s".format(self.ip, self.port,
+                                                                                           self.read_timeout))
+
+    def read_loop(self, tcp_socket, pending):
+        """
+            Body of the reader thread, runs until the socket is closed
+
+            :param tcp_socket: socket to read
+            :param pending: pending table of this socket
+        """
+        reader = YeelightStreamReader()
+        try:
+            while True:
+                messages = reader.read_from(tcp_socket)
+                if messages is None:
+                    break
+                for data in messages:
+                    self.dispatch(data, pending)
+        except (OSError, ValueError):
+            pass
+        finally:
+            with self.lock:
+                if self.socket is tcp_socket:
+                    self.close()
+            error = ConnectionResetError("The Yeelight bulb {}:{} closed the connection".format(self.ip, self.port))
+            for future in list(pending.values()):
+                future.set_exception(error)
+            pending.clear()
+            self.call_listeners("close_listeners")
+
+    def dispatch(self, data, pending):
+        """
+            Resolve the future waiting for a response, or give a notification to the listeners
+
+            :param data: decoded message
+            :param pending: pending table of the socket the message comes from
+        """
+        if "id" in data:
+            future = pending.pop(data["id"], None)
+            if future is not None:
+                future.set_result(data)
+            return
+        self.call_listeners("listeners", data)
+
+
+class YeelightConnectionPool:
+    """
+        Keep one connection per bulb, shared by every object talking to the same ip:port
+    """
+
+    def __init__(self, connect_timeout=YeelightConnection.DEFAULT_CONNECT_TIMEOUT,
+                 read_timeout=YeelightConnection.DEFAULT_READ_TIMEOUT,
+                 failure_threshold=YeelightCircuitBreaker.DEFAULT_FAILURE_THRESHOLD,
+                 cooldown=YeelightCircuitBreaker.DEFAULT_COOLDOWN):
+        """
+            :param connect_timeout: connect timeout in seconds of the connections, see YeelightConnection
+            :param read_timeout: read timeout in seconds of the connections, see YeelightConnection
+            :param failure_threshold: failures in a row that open the circuit breaker of a bulb
+            :param cooldown: time in seconds the circuit breaker of a bulb stays open
+        """
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.connections = {}
+        self.lock = threading.Lock()
+
+    def get_connection(self, ip, port):
+        """
+            Return the connection to the bulb, creating it the first time
+
+            :param ip: ip of the bulb
+            :param port: port of the bulb
+            :rtype: YeelightConnection
+        """
+        key = "{}:{}".format(ip, port)
+        with self.lock:
+            connection = self.connections.get(key)
+            if connection is None:
+                breaker = YeelightCircuitBreaker(key, self.failure_threshold, self.cooldown)
+                connection = YeelightConnection(ip, port, self.connect_timeout, self.read_timeout, breaker)
+                self.connections[key] = connection
+            return connection
+
+    def close(self, ip, port):
+        """
+            Close the socket to one bulb, the connection and its listeners are kept for the next command
+        """
+        with self.lock:
+            connection = self.connections.get("{}:{}".format(ip, port))
+        if connection is not None:
+            with connection.lock:
+                connection.close()
+
+    def get_breaker_states(self):
+        """
+            :return: state of the circuit breaker of each bulb, keyed by "ip:port"
+            :rtype: dict
+        """
+        with self.lock:
+            connections = list(self.connections.items())
+        return {key: connection.breaker.get_state() for key, connection in connections}
+
+    def close_all(self):
+        """
+            Close every connection of the pool
+        """
+        with self.lock:
+            connections = list(self.connections.values())
+            self.connections.clear()
+        for connection in connections:
+            with connection.lock:
+                connection.close()
@@ -0,0 +1,329 @@
+import logging
+import select
+import socket
+import struct
+import threading
+import time
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class YeelightDevice:
+    """
+        A bulb as advertised by its discovery messages (search response or NOTIFY advertisement)
+    """
+
+    HEADER_LOCATION = "location"
+    HEADER_CACHE_CONTROL = "cache-control"
+    HEADER_ID = "id"
+    HEADER_MODEL = "model"
+    HEADER_FIRMWARE = "fw_ver"
+    HEADER_SUPPORT = "support"
+
+    LOCATION_SCHEME = "yeelight://"
+
+    # Headers holding bulb properties, with the same name as the get_prop properties
+    PROPERTY_HEADERS = ("power", "bright", "color_mode", "ct", "rgb", "hue", "sat", "name")
+
+    DEFAULT_MAX_AGE = 3600
+    # Port of the bulb API when the location doesn't give one
+    DEFAULT_PORT = 55443
+
+    def __init__(self, device_id, ip, port, model=None, firmware=None, support=None, properties=None,
+                 max_age=DEFAULT_MAX_AGE):
+        """
+            :param device_id: unique id of the bulb
+            :param ip: ip of the bulb
+            :param port: port of the bulb API
+            :param model: model name
+            :param firmware: firmware version
+            :param support: methods supported by the bulb
+            :param properties: properties advertised by the bulb
+            :param max_age: time in seconds the advertisement is valid
+
+            :type device_id: str
+            :type ip: str
+            :type port: int
+            :type support: list of str
+            :type properties: dict
+        """
+        self.device_id = device_id
+        self.ip = ip
+        self.port = port
+        self.model = model
+        self.firmware = firmware
+        self.support = support if support is not None else []
+        self.properties = properties if properties is not None else {}
+        self.seen_at = time.monotonic()
+        self.expires_at = self.seen_at + max_age
+
+    @classmethod
+    def from_message(cls, raw_message):
+        """
+            Build the device from a discovery message
+
+            :param raw_message: Not decoded message, HTTP like start line and headers
+            :type raw_message: bytes
+            :return: the device, None if the message doesn't come from a Yeelight bulb or its location is invalid
+            :rtype: YeelightDevice
+        """
+        headers = cls.parse_headers(raw_message)
+        location = headers.get(cls.HEADER_LOCATION, "")
+        if not location.startswith(cls.LOCATION_SCHEME) or cls.HEADER_ID not in headers:
+            return None
+        ip, _, port = location[len(cls.LOCATION_SCHEME):].partition(":")
+        try:
+            port = int(port) if port else cls.DEFAULT_PORT
+        except ValueError:
+            return None
+        if not ip or not 0 < port < 65536:
+            return None
+        max_age = cls.DEFAULT_MAX_AGE
+        cache_control = headers.get(cls.HEADER_CACHE_CONTROL, "")
+        if "max-age=" in cache_control:
+            try:
+                max_age = int(cache_control.split("max-age=")[1].split(",")[0])
+            except ValueError:
+                pass
+        properties = {}
+        for name in cls.PROPERTY_HEADERS:
+            if name in headers:
+                properties[name] = headers[name]
+        return cls(headers[cls.HEADER_ID], ip, port,
+                   model=headers.get(cls.HEADER_MODEL), firmware=headers.get(cls.HEADER_FIRMWARE),
+                   support=headers.get(cls.HEADER_SUPPORT, "").split(), properties=properties, max_age=max_age)
+
+    @staticmethod
+    def parse_headers(raw_message):
+        """
+            :param raw_message: Not decoded message
+            :return: headers with lower case names
+            :rtype: dict
+        """
+        headers = {}
+        for line in raw_message.decode(errors="replace").split("\r\n")[1:]:
+            name, separator, value = line.partition(":")
+            if separator:
+                headers[name.strip().lower()] = value.strip()
+        return headers
+
+    def is_expired(self):
+        return time.monotonic() > self.expires_at
+
+    def __str__(self):
+        return 'Device : "{}"\nModel : "{}"\nLocation : {}:{}'.format(self.device_id, self.model, self.ip, self.port)
+
+
+class YeelightRegistry:
+    """
+        In-memory registry of the discovered bulbs, keyed by bulb id.
+        An entry expires when its advertisement is older than the max-age sent by the bulb.
+    """
+
+    def __init__(self):
+        self.devices = {}
+        self.listeners = []
+        self.lock = threading.Lock()
+
+    def update(self, device):
+        """
+            Add or refresh a device, the listeners are called when the device is new or has moved
+
+            :param device: device built from a discovery message
+            :type device: YeelightDevice
+        """
+        with self.lock:
+            previous = self.devices.get(device.device_id)
+            self.devices[device.device_id] = device
+        if previous is None or previous.is_expired() or (previous.ip, previous.port) != (device.ip, device.port):
+            for listener in list(self.listeners):
+                listener(device)
+
+    def add_listener(self, callback):
+        """
+            :param callback: function called with each new YeelightDevice
+        """
+        self.listeners.append(callback)
+
+    def get(self, device_id):
+        """
+            :return: the device, None if it is unknown or expired
+            :rtype: YeelightDevice
+        """
+        with self.lock:
+            device = self.devices.get(device_id)
+        if device is None or device.is_expired():
+            return None
+        return device
+
+    def find(self, ip):
+        """
+            :return: the device with this ip, None if there is none
+            :rtype: YeelightDevice
+        """
+        for device in self.get_devices():
+            if device.ip == ip:
+                return device
+        return None
+
+    def get_devices(self):
+        """
+            :return: the devices that are not expired
+            :rtype: list of YeelightDevice
+        """
+        with self.lock:
+            devices = list(self.devices.values())
+        return [device for device in devices if not device.is_expired()]
+
+    def purge(self):
+        """
+            Remove the expired devices
+        """
+        with self.lock:
+            for device_id in [key for key, device in self.devices.items() if device.is_expired()]:
+                del self.devices[device_id]
+
+    def __len__(self):
+        return len(self.get_devices())
+
+
+class YeelightDiscovery:
+    """
+        SSDP like discovery of the bulbs : an M-SEARCH sent to the multicast group is answered by every bulb, and
+        the bulbs advertise themselves to the group with NOTIFY messages when they come online.
+    """
+
+    MULTICAST_ADDRESS = "239.255.255.250"
+    MULTICAST_PORT = 1982
+
+    SEARCH_MESSAGE = 'M-SEARCH * HTTP/1.1\r\nHOST: {}:{}\r\nMAN: "ssdp:discover"\r\nST: wifi_bulb\r\n'
+
+    def __init__(self, registry=None, multicast_address=MULTICAST_ADDRESS, multicast_port=MULTICAST_PORT):
+        """
+            :param registry: registry filled with the discovered bulbs, a new one if None
+            :param multicast_address: multicast group of the bulbs
+            :param multicast_port: discovery port of the bulbs
+
+            :type registry: YeelightRegistry
+        """
+        self.registry = registry if registry is not None else YeelightRegistry()
+        self.multicast_address = multicast_address
+        self.multicast_port = multicast_port
+        self.listener_socket = None
+        self.listener = None
+
+    def search(self, timeout=1.0):
+        """
+            Send an M-SEARCH and collect the answers until the timeout
+
+            :param timeout: time in seconds to wait for the answers
+            :return: the devices that answered
+            :rtype: list of YeelightDevice
+        """
+        search_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+        search_socket.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, 2)
+        search_socket.setblocking(False)
+        found = {}
+        try:
+            message = self.SEARCH_MESSAGE.format(self.multicast_address, self.multicast_port).encode()
+            search_socket.sendto(message, (self.multicast_address, self.multicast_port))
+            deadline = time.monotonic() + timeout
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                readable, _, _ = select.select([search_socket], [], [], remaining)
+                if not readable:
+                    break
+                data, _ = search_socket.recvfrom(4096)
+                device = self.handle_message(data)
+                if device is not None:
+                    found[device.device_id] = device
+        finally:
+            search_socket.close()
+        return list(found.values())
+
+    def probe(self, ip, timeout=1.0):
+        """
+            Send an M-SEARCH to one bulb only and wait for its answer
+
+            :param ip: ip of the bulb
+            :param timeout: time in seconds to wait for the answer
+            :return: the device, None if the bulb didn't answer
+            :rtype: YeelightDevice
+        """
+        probe_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+        probe_socket.setblocking(False)
+        try:
+            message = self.SEARCH_MESSAGE.format(self.multicast_address, self.multicast_port).encode()
+            probe_socket.sendto(message, (ip, self.multicast_port))
+            deadline = time.monotonic() + timeout
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                readable, _, _ = select.select([probe_socket], [], [], remaining)
+                if not readable:
+                    return None
+                data, _ = probe_socket.recvfrom(4096)
+                device = self.handle_message(data)
+                if device is not None and device.ip == ip:
+                    return device
+        except OSError:
+            return None
+        finally:
+            probe_socket.close()
+
+    def handle_message(self, data):
+        """
+            Put in the registry the device described by a discovery message
+
+            :param data: Not decoded message
+            :rtype: YeelightDevice
+        """
+        device = YeelightDevice.from_message(data)
+        if device is not None:
+            self.registry.update(device)
+        return device
+
+    def start_listening(self):
+        """
+            Join the multicast group and handle the advertisements in a background thread
+        """
+        if self.listener is not None:
+            return
+        listener_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+        listener_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if hasattr(socket, "SO_REUSEPORT"):
+            listener_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        listener_socket.bind(("", self.multicast_port))
+        membership = struct.pack("4sl", socket.inet_aton(self.multicast_address), socket.INADDR_ANY)
+        listener_socket.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, membership)
+        self.listener_socket = listener_socket
+        self.listener = threading.Thread(target=self.listen_loop, args=(listener_socket,),
+                                         name="yeelight-discovery", daemon=True)
+        self.listener.start()
+
+    def stop_listening(self):
+        if self.listener_socket is not None:
+            self.listener_socket.close()
+            self.listener_socket = None
+        if self.listener is not None:
+            self.listener.join()
+            self.listener = None
+
+    def listen_loop(self, listener_socket):
+        """
+            Body of the listening thread, runs until the socket is closed
+        """
+        while True:
+            try:
+                # The timeout lets the thread see the socket closed by stop_listening
+                readable, _, _ = select.select([listener_socket], [], [], 0.5)
+                if readable:
+                    data, _ = listener_socket.recvfrom(4096)
+                    self.handle_message(data)
+            except (OSError, ValueError):
+                if listener_socket.fileno() == -1:
+                    return
+                _LOGGER.exception("Discovery listener failed")
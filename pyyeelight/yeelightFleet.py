@@ -0,0 +1,366 @@
+import multiprocessing
+import os
+import time
+import zlib
+from multiprocessing.connection import wait
+from . import YeelightBulb
+from .yeelightAPICall import YeelightAPICall
+from .yeelightConnection import YeelightConnectionPool
+from .yeelightGroup import YeelightGroup, YeelightGroupResult
+from .yeelightState import YeelightStateStore
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# Messages between the fleet and its workers : (op, payload) sent to a worker, (reply, payload, changes) back
+OP_RUN = "run"
+OP_STATE = "state"
+OP_STOP = "stop"
+REPLY_OK = "ok"
+REPLY_ERROR = "error"
+
+
+def get_shard(ip, shards):
+    """
+        Shard of a bulb : stable across runs and processes, unlike hash()
+
+        :param ip: ip of the bulb
+        :param shards: number of shards
+        :rtype: int
+    """
+    return zlib.crc32(ip.encode()) % shards
+
+
+def raise_file_limit():
+    """
+        Raise the soft limit of open files to the hard limit, every bulb keeps a connection open
+    """
+    if resource is None:
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft != hard:
+        try:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+        except (ValueError, OSError):
+            pass
+
+
+def encode_result(result):
+    """
+        Plain tuple of a group result sent back by a worker, the errors are reduced to their type and message
+    """
+    errors = {key: (type(error).__name__, str(error)) for key, error in result.errors.items()}
+    return (result.results, errors, result.skipped, result.completed_at, result.started_at,
+            result.finished_at)
+
+
+def run_worker(connection, addresses, max_workers, bulb_kwargs):
+    """
+        Main loop of a worker process : it owns the connections and the state of its bulbs and runs the commands
+        of the fleet on them with a YeelightGroup. Each reply carries the properties changed since the previous
+        one.
+
+        :param connection: end of the pipe to the fleet
+        :param addresses: (ip, port) of the bulbs of the shard
+        :param max_workers: maximum number of commands in flight in the worker
+        :param bulb_kwargs: other arguments of the bulb constructor
+    """
+    raise_file_limit()
+    # Nothing is shared with the parent, even when the process is forked
+    YeelightBulb.state_store = YeelightStateStore()
+    YeelightAPICall.connection_pool = YeelightConnectionPool()
+    # The properties are read by the first command unless asked otherwise
+    bulb_kwargs.setdefault("lazy", True)
+    bulbs = [YeelightBulb(ip, port, **bulb_kwargs) for ip, port in addresses]
+    group = YeelightGroup(bulbs, max_workers)
+    synced_at = YeelightStateStore.NEVER
+    try:
+        while True:
+            try:
+                op, payload = connection.recv()
+            except EOFError:
+                break
+            if op == OP_STOP:
+                break
+            try:
+                if op == OP_RUN:
+                    method, args, kwargs = payload
+                    reply = encode_result(group.run(method, *args, **kwargs))
+                elif op == OP_STATE:
+                    reply = None
+                    synced_at = YeelightStateStore.NEVER
+                else:
+                    raise ValueError("Unknown fleet operation {}".format(op))
+            except Exception as error:
+                connection.send((REPLY_ERROR, "{}: {}".format(type(error).__name__, error), None))
+                continue
+            now = time.monotonic()
+            changes = YeelightBulb.state_store.get_changes(synced_at)
+            synced_at = now
+            connection.send((REPLY_OK, reply, changes))
+    finally:
+        group.close()
+        YeelightAPICall.connection_pool.close_all()
+        connection.close()
+
+
+class YeelightFleetError(Exception):
+    """
+        Error raised in a worker process, rebuilt from its type name and message
+    """
+
+    def __init__(self, error_type, message):
+        self.error_type = error_type
+        Exception.__init__(self, "{}: {}".format(error_type, message))
+
+
+class YeelightFleet:
+    """
+        Bulbs of a large installation split by ip across worker processes, each one with its own connections,
+        state and GIL. A command is sent to every worker at once, each worker runs it on its bulbs with a
+        YeelightGroup and replies with the results and the properties that changed, which are merged in
+        self.state.
+
+        >>> with YeelightFleet(["192.168.1.10", "192.168.1.11"], processes=2) as fleet:
+        ...     fleet.turn_on()
+    """
+
+    def __init__(self, addresses, processes=None, max_workers=YeelightGroup.DEFAULT_MAX_WORKERS, context=None,
+                 **bulb_kwargs):
+        """
+            :param addresses: ip or (ip, port) of each bulb
+            :param processes: number of worker processes, the number of cores if None
+            :param max_workers: maximum number of commands in flight in each worker
+            :param context: multiprocessing context used to start the workers, the default one if None
+            :param bulb_kwargs: other arguments of the bulb constructor, e.g. property_ttl. The bulbs are lazy
+                                unless lazy=False is given
+
+            :type addresses: list
+            :type processes: int
+            :type max_workers: int
+        """
+        self.addresses = [(address, YeelightAPICall.DEFAULT_PORT) if isinstance(address, str) else tuple(address)
+                          for address in addresses]
+        self.processes = processes or os.cpu_count() or 1
+        self.max_workers = max_workers
+        self.context = context if context is not None else multiprocessing.get_context()
+        self.bulb_kwargs = bulb_kwargs
+        self.shards = [[] for _ in range(self.processes)]
+        for ip, port in self.addresses:
+            self.shards[get_shard(ip, self.processes)].append((ip, port))
+        self.workers = []
+        self.connections = []
+        # Last known properties of each bulb, keyed by "ip:port"
+        self.state = {}
+
+    def __len__(self):
+        return len(self.addresses)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def is_started(self):
+        return bool(self.workers)
+
+    def start(self):
+        """
+            Start a worker process for each shard that has bulbs
+        """
+        if self.workers:
+            return
+        for shard in self.shards:
+            if not shard:
+                continue
+            connection, worker_connection = self.context.Pipe()
+            worker = self.context.Process(target=run_worker,
+                                          args=(worker_connection, shard, self.max_workers, self.bulb_kwargs),
+                                          name="yeelight-fleet-{}".format(len(self.workers)), daemon=True)
+            worker.start()
+            worker_connection.close()
+            self.workers.append(worker)
+            self.connections.append(connection)
+
+    def stop(self):
+        """
+            Stop the workers, they close the connections to their bulbs
+        """
+        for connection in self.connections:
+            try:
+                connection.send((OP_STOP, None))
+            except (BrokenPipeError, OSError):
+                pass
+        for worker in self.workers:
+            worker.join(5)
+            if worker.is_alive():
+                worker.terminate()
+        for connection in self.connections:
+            connection.close()
+        self.workers = []
+        self.connections = []
+
+    def send(self, op, payload=None):
+        """
+            Send an operation to every worker and gather their replies, the changed properties are merged in
+            self.state
+
+            :return: payload of each reply
+            :rtype: list
+            :raise YeelightFleetError: a worker failed to run the operation
+        """
+        if not self.workers:
+            self.start()
+        for connection in self.connections:
+            connection.send((op, payload))
+        replies = []
+        failures = []
+        waiting = list(self.connections)
+        while waiting:
+            for connection in wait(waiting):
+                waiting.remove(connection)
+                try:
+                    status, reply, changes = connection.recv()
+                except EOFError:
+                    failures.append("EOFError: worker stopped")
+                    continue
+                if status == REPLY_ERROR:
+                    failures.append(reply)
+                    continue
+                for key, properties in changes.items():
+                    self.state.setdefault(key, {}).update(properties)
+                replies.append(reply)
+        if failures:
+            error_type, _, message = failures[0].partition(": ")
+            raise YeelightFleetError(error_type, message)
+        return replies
+
+    def run(self, method, *args, **kwargs):
+        """
+            Call a YeelightBulb method on every bulb of the fleet at the same time
+
+            :param method: name of the YeelightBulb method
+            :param args: positional arguments of the method, they must be picklable
+            :param kwargs: keyword arguments of the method
+            :return: results of every worker merged, see YeelightGroup.run
+            :rtype: YeelightGroupResult
+        """
+        result = YeelightGroupResult(method)
+        for results, errors, skipped, completed_at, started_at, finished_at in self.send(OP_RUN,
+                                                                                          (method, args, kwargs)):
+            result.results.update(results)
+            result.errors.update({key: YeelightFleetError(*error) for key, error in errors.items()})
+            result.skipped.update(skipped)
+            result.completed_at.update(completed_at)
+            result.started_at = started_at if result.started_at is None else min(result.started_at, started_at)
+            result.finished_at = finished_at if result.finished_at is None else max(result.finished_at, finished_at)
+        return result
+
+    def sync_state(self):
+        """
+            Ask every worker for all the known properties of its bulbs, instead of the changes only
+
+            :return: properties of each bulb, keyed by "ip:port"
+            :rtype: dict
+        """
+        self.state = {}
+        self.send(OP_STATE)
+        return self.state
+
+    def get_state(self):
+        """
+            :return: last known properties of each bulb, keyed by "ip:port"
+            :rtype: dict
+        """
+        return self.state
+
+    def refresh_property(self):
+        return self.run("refresh_property")
+
+    def set_color_temperature(self, *args, **kwargs):
+        """
+            See YeelightBulb.set_color_temperature
+            :rtype: YeelightGroupResult
+        """
+        return self.run("set_color_temperature", *args, **kwargs)
+
+    def set_rgb_color(self, *args, **kwargs):
+        """
+            See YeelightBulb.set_rgb_color
+            :rtype: YeelightGroupResult
+        """
+        return self.run("set_rgb_color", *args, **kwargs)
+
+    def set_hsv_color(self, *args, **kwargs):
+        """
+            See YeelightBulb.set_hsv_color
+            :rtype: YeelightGroupResult
+        """
+        return self.run("set_hsv_color", *args, **kwargs)
+
+    def set_brightness(self, *args, **kwargs):
+        """
+            See YeelightBulb.set_brightness
+            :rtype: YeelightGroupResult
+        """
+        return self.run("set_brightness", *args, **kwargs)
+
+    def turn_on(self, *args, **kwargs):
+        """
+            See YeelightBulb.turn_on
+            :rtype: YeelightGroupResult
+        """
+        return self.run("turn_on", *args, **kwargs)
+
+    def turn_off(self, *args, **kwargs):
+        """
+            See YeelightBulb.turn_off
+            :rtype: YeelightGroupResult
+        """
+        return self.run("turn_off", *args, **kwargs)
+
+    def toggle(self):
+        """
+            See YeelightBulb.toggle
+            :rtype: YeelightGroupResult
+        """
+        return self.run("toggle")
+
+    def set_scene(self, scene):
+        """
+            Apply the same scene to every bulb, see YeelightBulb.set_scene
+            :rtype: YeelightGroupResult
+        """
+        return self.run("set_scene", scene)
+
+    def start_flow(self, flow):
+        """
+            See YeelightBulb.start_flow
+            :rtype: YeelightGroupResult
+        """
+        return self.run("start_flow", flow)
+
+    def stop_flow(self):
+        """
+            See YeelightBulb.stop_flow
+            :rtype: YeelightGroupResult
+        """
+        return self.run("stop_flow")
+
+    def save_state(self):
+        """
+            See YeelightBulb.save_state
+            :rtype: YeelightGroupResult
+        """
+        return self.run("save_state")
+
+    def adjust(self, *args, **kwargs):
+        """
+            See YeelightBulb.adjust
+            :rtype: YeelightGroupResult
+        """
+        return self.run("adjust", *args, **kwargs)
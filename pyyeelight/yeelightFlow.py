@@ -0,0 +1,269 @@
+import time
+from . import yeelightValidation
+from . import yeelightColor
+
+
+class YeelightFlow:
+    """
+        Color flow run by the bulb itself : the whole sequence of transitions is sent with one start_cf command.
+        The add methods return the flow, so a flow can be built in one expression :
+
+        >>> flow = YeelightFlow(repeat=3).rgb(255, 0, 0, 500).sleep(1000).rgb(0, 0, 255, 500)
+    """
+
+    ACTION_RECOVER = 0
+    ACTION_STAY = 1
+    ACTION_OFF = 2
+
+    MODE_COLOR = 1
+    MODE_COLOR_TEMPERATURE = 2
+    MODE_SLEEP = 7
+
+    # Brightness of a step that keeps the current brightness
+    BRIGHTNESS_KEEP = -1
+
+    MIN_DURATION = 50
+
+    def __init__(self, repeat=0, action=ACTION_RECOVER):
+        """
+            :param repeat: number of times the sequence is played, 0 plays it until stop_cf
+            :param action: what the bulb does when the flow ends : ACTION_RECOVER to get back to its state before
+                           the flow, ACTION_STAY to stay in the last state, ACTION_OFF to switch off
+
+            :type repeat: int
+            :type action: int
+        """
+        if repeat < 0:
+            raise ValueError("repeat must be positive, got {}".format(repeat))
+        if action not in (self.ACTION_RECOVER, self.ACTION_STAY, self.ACTION_OFF):
+            raise ValueError("Unknown flow action {}".format(action))
+        self.repeat = repeat
+        self.action = action
+        # (duration, mode, value, brightness) of each step
+        self.transitions = []
+
+    def check_brightness(self, brightness):
+        if brightness != self.BRIGHTNESS_KEEP:
+            yeelightValidation.validate("flow_brightness", {'brightness': brightness})
+
+    def rgb(self, red, green, blue, duration, brightness=BRIGHTNESS_KEEP):
+        """
+            Add a transition to a rgb color
+
+            :param red: Red component of the color between 0 and 255
+            :param green: Green component of the color between 0 and 255
+            :param blue: Blue component of the color between 0 and 255
+            :param duration: time in ms of the transition, at least 50
+            :param brightness: brightness at the end of the transition, BRIGHTNESS_KEEP to keep it
+            :rtype: YeelightFlow
+        """
+        yeelightValidation.validate("flow_color", {'red': red, 'green': green, 'blue': blue, 'duration': duration})
+        self.check_brightness(brightness)
+        self.transitions.append((duration, self.MODE_COLOR, yeelightColor.rgb_to_int(red, green, blue), brightness))
+        return self
+
+    def color_temperature(self, temperature, duration, brightness=BRIGHTNESS_KEEP):
+        """
+            Add a transition to a white color temperature
+
+            :param temperature: color temperature between 1700 and 6500 K
+            :param duration: time in ms of the transition, at least 50
+            :param brightness: brightness at the end of the transition, BRIGHTNESS_KEEP to keep it
+            :rtype: YeelightFlow
+        """
+        yeelightValidation.validate("flow_ct", {'temperature': temperature, 'duration': duration})
+        self.check_brightness(brightness)
+        self.transitions.append((duration, self.MODE_COLOR_TEMPERATURE, temperature, brightness))
+        return self
+
+    def sleep(self, duration):
+        """
+            Add a step keeping the current state
+
+            :param duration: time in ms, at least 50
+            :rtype: YeelightFlow
+        """
+        yeelightValidation.validate("flow_sleep", {'duration': duration})
+        self.transitions.append((duration, self.MODE_SLEEP, 0, 0))
+        return self
+
+    def get_expression(self):
+        """
+            :return: the flow expression of start_cf, 4 comma separated values per step
+            :rtype: str
+        """
+        return ",".join(",".join(str(value) for value in transition) for transition in self.transitions)
+
+    def get_count(self):
+        """
+            :return: number of state changes before the flow stops, 0 for an endless flow
+            :rtype: int
+        """
+        return self.repeat * len(self.transitions)
+
+    def get_params(self):
+        """
+            :return: parameters of the start_cf command
+            :rtype: list
+        """
+        if not self.transitions:
+            raise ValueError("A flow needs at least one transition")
+        return [self.get_count(), self.action, self.get_expression()]
+
+    def get_duration(self):
+        """
+            :return: time in ms of one play of the sequence
+            :rtype: int
+        """
+        return sum(transition[0] for transition in self.transitions)
+
+    def __len__(self):
+        return len(self.transitions)
+
+    def __str__(self):
+        return 'Flow : {} transitions, {} ms, repeat {}\nExpression : "{}"'.format(
+            len(self.transitions), self.get_duration(), self.repeat, self.get_expression())
+
+
+class YeelightAnimation:
+    """
+        Client-side animation : a sequence of rgb frames with their duration.
+
+        An animation whose steps all last at least the minimum flow duration can be offloaded to the bulb as one
+        start_cf command. Otherwise it has to be streamed frame by frame, which needs music mode when the frame
+        rate is above the normal mode quota.
+    """
+
+    # Maximum number of steps sent in one flow expression
+    MAX_FLOW_STEPS = 128
+    # Commands per second accepted by a bulb in normal mode
+    NORMAL_MODE_RATE = 1.0
+
+    def __init__(self):
+        # (red, green, blue, brightness, duration) of each frame
+        self.frames = []
+
+    @classmethod
+    def from_frames(cls, colors, fps):
+        """
+            Build an animation from colors computed at a fixed frame rate
+
+            :param colors: (red, green, blue) of each frame
+            :param fps: frames per second
+            :rtype: YeelightAnimation
+        """
+        animation = cls()
+        duration = int(round(1000.0 / fps))
+        for red, green, blue in colors:
+            animation.add_frame(red, green, blue, duration)
+        return animation
+
+    def add_frame(self, red, green, blue, duration, brightness=YeelightFlow.BRIGHTNESS_KEEP):
+        """
+            :param duration: time in ms the frame lasts
+            :rtype: YeelightAnimation
+        """
+        self.frames.append((red, green, blue, brightness, duration))
+        return self
+
+    def get_steps(self):
+        """
+            Merge the consecutive identical frames, a frame that doesn't change the color only extends the step
+            :return: (red, green, blue, brightness, duration) of each step
+            :rtype: list
+        """
+        steps = []
+        for frame in self.frames:
+            if steps and steps[-1][:4] == frame[:4]:
+                steps[-1] = frame[:4] + (steps[-1][4] + frame[4],)
+            else:
+                steps.append(frame)
+        return steps
+
+    def get_duration(self):
+        """
+            :return: time in ms of one play of the animation
+            :rtype: int
+        """
+        return sum(frame[4] for frame in self.frames)
+
+    def get_stream_rate(self):
+        """
+            :return: commands per second needed to stream the animation
+            :rtype: float
+        """
+        duration = self.get_duration()
+        if duration == 0:
+            return 0.0
+        return len(self.get_steps()) * 1000.0 / duration
+
+    def get_offload_report(self):
+        """
+            Tell whether the animation can run on the bulb as a color flow, and what it saves
+
+            :return: "offloadable", the "reasons" it can't be, the number of "steps", the "shortest_step" in ms,
+                     the "stream_rate" in commands per second and the "commands_saved" per play
+            :rtype: dict
+        """
+        steps = self.get_steps()
+        reasons = []
+        shortest = min(step[4] for step in steps) if steps else 0
+        if not steps:
+            reasons.append("the animation is empty")
+        if steps and shortest < YeelightFlow.MIN_DURATION:
+            reasons.append("a step lasts {} ms, the bulb needs at least {} ms".format(shortest,
+                                                                                      YeelightFlow.MIN_DURATION))
+        if len(steps) > self.MAX_FLOW_STEPS:
+            reasons.append("{} steps, a flow holds at most {}".format(len(steps), self.MAX_FLOW_STEPS))
+        return {"offloadable": not reasons,
+                "reasons": reasons,
+                "steps": len(steps),
+                "shortest_step": shortest,
+                "stream_rate": self.get_stream_rate(),
+                "commands_saved": len(steps) - 1 if not reasons else 0}
+
+    def can_offload(self):
+        return self.get_offload_report()["offloadable"]
+
+    def to_flow(self, repeat=1, action=YeelightFlow.ACTION_STAY):
+        """
+            :param repeat: number of times the animation is played, 0 plays it until stop_cf
+            :param action: what the bulb does when the flow ends (see YeelightFlow)
+            :rtype: YeelightFlow
+        """
+        report = self.get_offload_report()
+        if not report["offloadable"]:
+            raise ValueError("The animation can't run as a color flow : {}".format(", ".join(report["reasons"])))
+        flow = YeelightFlow(repeat, action)
+        for red, green, blue, brightness, duration in self.get_steps():
+            flow.rgb(red, green, blue, duration, brightness)
+        return flow
+
+    def play(self, bulb, repeat=1):
+        """
+            Play the animation on a bulb : offloaded as one start_cf command when possible, otherwise streamed
+            with one set_rgb command per step timed on the local clock. Streaming blocks until the end.
+
+            :param bulb: bulb playing the animation
+            :param repeat: number of times the animation is played, 0 (endless) is only possible when offloaded
+            :return: True if the animation was offloaded to the bulb
+            :rtype: bool
+
+            :type bulb: YeelightBulb
+        """
+        if self.can_offload():
+            bulb.start_flow(self.to_flow(repeat))
+            return True
+        if repeat == 0:
+            raise ValueError("An endless animation must be offloaded to the bulb")
+        deadline = time.monotonic()
+        for _ in range(repeat):
+            for red, green, blue, brightness, duration in self.get_steps():
+                bulb.set_rgb_color(red, green, blue)
+                if brightness != YeelightFlow.BRIGHTNESS_KEEP:
+                    bulb.set_brightness(brightness)
+                deadline += duration / 1000.0
+                delay = deadline - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+        return False
@@ -0,0 +1,264 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from .yeelightCapability import YeelightCommandRefused
+
+
+class YeelightGroupResult:
+    """
+        Outcome of a command sent to a whole group.
+        Results and errors are keyed by "ip:port" of each bulb, as well as the reason of the bulbs skipped because
+        they can't run the command.
+    """
+
+    def __init__(self, method):
+        self.method = method
+        self.results = {}
+        self.errors = {}
+        self.skipped = {}
+        self.completed_at = {}
+        self.started_at = None
+        self.finished_at = None
+
+    def is_success(self):
+        return not self.errors
+
+    def get_duration(self):
+        """
+            Time in seconds between the dispatch and the last bulb answer
+            :rtype: float
+        """
+        return self.finished_at - self.started_at
+
+    def get_spread(self):
+        """
+            Time in seconds between the first and the last bulb being updated
+            :rtype: float
+        """
+        if not self.completed_at:
+            return 0.0
+        return max(self.completed_at.values()) - min(self.completed_at.values())
+
+    def get_stats(self):
+        """
+            Timing statistics of the command
+            :rtype: dict
+        """
+        return {"method": self.method,
+                "bulbs": len(self.completed_at),
+                "errors": len(self.errors),
+                "skipped": len(self.skipped),
+                "duration": self.get_duration(),
+                "spread": self.get_spread()}
+
+    def __str__(self):
+        return 'Group command : "{}"\nBulbs : {} ({} errors, {} skipped)\nDuration : {:.3f}s\nSpread : {:.3f}s'.format(
+            self.method, len(self.completed_at), len(self.errors), len(self.skipped), self.get_duration(),
+            self.get_spread())
+
+
+class YeelightGroup:
+    """
+        Several bulbs driven as one, each command is sent to all the bulbs in parallel through a bounded thread pool
+    """
+
+    DEFAULT_MAX_WORKERS = 32
+
+    # Method of the bulb API sent by each YeelightBulb method, to skip the bulbs that can't run it
+    API_METHODS = {"refresh_property": "get_prop", "set_color_temperature": "set_ct_abx", "set_rgb_color": "set_rgb",
+                   "set_hsv_color": "set_hsv", "set_brightness": "set_bright", "turn_on": "set_power",
+                   "turn_off": "set_power", "toggle": "toggle", "set_scene": "set_scene", "start_flow": "start_cf",
+                   "stop_flow": "stop_cf", "save_state": "set_default", "adjust": "set_adjust"}
+
+    def __init__(self, bulbs=None, max_workers=DEFAULT_MAX_WORKERS):
+        """
+            :param bulbs: bulbs of the group
+            :param max_workers: maximum number of commands in flight at the same time
+
+            :type bulbs: list of YeelightBulb
+            :type max_workers: int
+        """
+        self.bulbs = list(bulbs) if bulbs is not None else []
+        self.max_workers = max_workers
+        self.executor = None
+
+    def __len__(self):
+        return len(self.bulbs)
+
+    def __iter__(self):
+        return iter(self.bulbs)
+
+    def add(self, bulb):
+        self.bulbs.append(bulb)
+
+    def remove(self, bulb):
+        self.bulbs.remove(bulb)
+
+    def close(self):
+        """
+            Stop the thread pool, it is created again by the next command
+        """
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @staticmethod
+    def bulb_key(bulb):
+        return "{}:{}".format(bulb.api_call.ip, bulb.api_call.port)
+
+    def get_circuit_states(self):
+        """
+            :return: state of the circuit breaker of each bulb, keyed by "ip:port"
+            :rtype: dict
+        """
+        return {self.bulb_key(bulb): bulb.api_call.get_circuit_breaker().get_state() for bulb in self.bulbs}
+
+    def probe_capabilities(self, timeout=1.0):
+        """
+            Probe the capabilities of every bulb at the same time, see YeelightBulb.probe_capabilities
+
+            :return: capabilities of each bulb, keyed by "ip:port"
+            :rtype: dict
+        """
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="yeelight-group")
+        futures = {self.bulb_key(bulb): self.executor.submit(bulb.probe_capabilities, timeout) for bulb in self.bulbs}
+        return {key: future.result() for key, future in futures.items()}
+
+    def run(self, method, *args, **kwargs):
+        """
+            Call a YeelightBulb method on every bulb of the group at the same time.
+            The bulbs that can't run the command (see YeelightBulb.get_refusal) are skipped without being called.
+
+            :param method: name of the YeelightBulb method
+            :param args: positional arguments of the method
+            :param kwargs: keyword arguments of the method
+            :rtype: YeelightGroupResult
+        """
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="yeelight-group")
+        result = YeelightGroupResult(method)
+
+        def call(bulb):
+            try:
+                value = getattr(bulb, method)(*args, **kwargs)
+                error = None
+            except Exception as exception:
+                value = None
+                error = exception
+            return bulb, value, error, time.perf_counter()
+
+        result.started_at = time.perf_counter()
+        api_method = self.API_METHODS.get(method)
+        futures = []
+        for bulb in self.bulbs:
+            refusal = bulb.get_refusal(api_method) if api_method is not None else None
+            if refusal is None:
+                futures.append(self.executor.submit(call, bulb))
+            else:
+                result.skipped[self.bulb_key(bulb)] = refusal
+        for future in futures:
+            bulb, value, error, completed_at = future.result()
+            key = self.bulb_key(bulb)
+            if isinstance(error, YeelightCommandRefused):
+                result.skipped[key] = error.reason
+                continue
+            result.completed_at[key] = completed_at
+            if error is None:
+                result.results[key] = value
+            else:
+                result.errors[key] = error
+        result.finished_at = time.perf_counter()
+        return result
+
+    def refresh_property(self):
+        return self.run("refresh_property")
+
+    def set_color_temperature(self, *args, **kwargs):
+        """
+            See YeelightBulb.set_color_temperature
+            :rtype: YeelightGroupResult
+        """
+        return self.run("set_color_temperature", *args, **kwargs)
+
+    def set_rgb_color(self, *args, **kwargs):
+        """
+            See YeelightBulb.set_rgb_color
+            :rtype: YeelightGroupResult
+        """
+        return self.run("set_rgb_color", *args, **kwargs)
+
+    def set_hsv_color(self, *args, **kwargs):
+        """
+            See YeelightBulb.set_hsv_color
+            :rtype: YeelightGroupResult
+        """
+        return self.run("set_hsv_color", *args, **kwargs)
+
+    def set_brightness(self, *args, **kwargs):
+        """
+            See YeelightBulb.set_brightness
+            :rtype: YeelightGroupResult
+        """
+        return self.run("set_brightness", *args, **kwargs)
+
+    def turn_on(self, *args, **kwargs):
+        """
+            See YeelightBulb.turn_on
+            :rtype: YeelightGroupResult
+        """
+        return self.run("turn_on", *args, **kwargs)
+
+    def turn_off(self, *args, **kwargs):
+        """
+            See YeelightBulb.turn_off
+            :rtype: YeelightGroupResult
+        """
+        return self.run("turn_off", *args, **kwargs)
+
+    def toggle(self):
+        """
+            See YeelightBulb.toggle
+            :rtype: YeelightGroupResult
+        """
+        return self.run("toggle")
+
+    def set_scene(self, scene):
+        """
+            Apply the same scene to every bulb with one command each, see YeelightBulb.set_scene
+            :rtype: YeelightGroupResult
+        """
+        return self.run("set_scene", scene)
+
+    def start_flow(self, flow):
+        """
+            See YeelightBulb.start_flow
+            :rtype: YeelightGroupResult
+        """
+        return self.run("start_flow", flow)
+
+    def stop_flow(self):
+        """
+            See YeelightBulb.stop_flow
+            :rtype: YeelightGroupResult
+        """
+        return self.run("stop_flow")
+
+    def save_state(self):
+        """
+            See YeelightBulb.save_state
+            :rtype: YeelightGroupResult
+        """
+        return self.run("save_state")
+
+    def adjust(self, *args, **kwargs):
+        """
+            See YeelightBulb.adjust
+            :rtype: YeelightGroupResult
+        """
+        return self.run("adjust", *args, **kwargs)
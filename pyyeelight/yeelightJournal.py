@@ -0,0 +1,240 @@
+import json
+import queue
+import threading
+import time
+from .yeelightConnection import YeelightConnection
+from .yeelightMessage import YeelightCommand
+
+# Record kinds : a bulb address, a command sent, a response received, a command that got no response
+RECORD_BULB = "b"
+RECORD_COMMAND = "c"
+RECORD_RESPONSE = "r"
+RECORD_ERROR = "e"
+
+JOURNAL_VERSION = 1
+
+
+class YeelightJournal:
+    """
+        Append-only record of the commands sent by YeelightAPICall and of the responses of the bulbs, to replay
+        real traffic with YeelightReplay.
+
+        The API calls only put a tuple in a queue, a background thread encodes and writes the records. The file
+        has one compact JSON array per line : a header, then [kind, time, bulb, ...] where time is in seconds since
+        the journal was opened and bulb the index given by the "b" record of its address.
+
+        >>> with YeelightJournal("traffic.journal") as journal:
+        ...     bulb = YeelightBulb("192.168.1.25", journal=journal)
+    """
+
+    def __init__(self, path):
+        """
+            Open the file (appended if it exists) and start the writer thread
+
+            :param path: path of the journal file
+            :type path: str
+        """
+        self.path = path
+        self.file = open(path, "a", encoding="utf-8")
+        self.started_at = time.monotonic()
+        self.queue = queue.SimpleQueue()
+        self.bulbs = {}
+        # Number of records written
+        self.records = 0
+        self.file.write(json.dumps({"journal": JOURNAL_VERSION, "started": time.time()}) + "\n")
+        self.writer = threading.Thread(target=self.write_loop, name="yeelight-journal", daemon=True)
+        self.writer.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """
+            Write the pending records and close the file
+        """
+        if self.writer is None:
+            return
+        self.queue.put(None)
+        self.writer.join()
+        self.writer = None
+        self.file.close()
+
+    def record_command(self, bulb, command):
+        """
+            :param bulb: "ip:port" of the bulb
+            :type command: YeelightCommand
+        """
+        self.queue.put((RECORD_COMMAND, time.monotonic(), bulb, command.command_id, command.method, command.params))
+
+    def record_response(self, bulb, data):
+        """
+            :param bulb: "ip:port" of the bulb
+            :param data: decoded response, with its id and a result or an error
+            :type data: dict
+        """
+        self.queue.put((RECORD_RESPONSE, time.monotonic(), bulb, data))
+
+    def record_error(self, bulb, command_id, error):
+        """
+            Record a command that got no response (connection lost, read timeout)
+
+            :param bulb: "ip:port" of the bulb
+            :type error: Exception
+        """
+        self.queue.put((RECORD_ERROR, time.monotonic(), bulb, command_id,
+                        "{}: {}".format(type(error).__name__, error)))
+
+    def encode(self, record):
+        """
+            :return: the lines of a record, preceded by the address of its bulb the first time it appears
+            :rtype: str
+        """
+        kind, timestamp, bulb = record[:3]
+        lines = ""
+        index = self.bulbs.get(bulb)
+        if index is None:
+            index = self.bulbs[bulb] = len(self.bulbs)
+            lines = json.dumps([RECORD_BULB, index, bulb], separators=(",", ":")) + "\n"
+        return lines + json.dumps([kind, round(timestamp - self.started_at, 6), index] + list(record[3:]),
+                                  separators=(",", ":")) + "\n"
+
+    def write_loop(self):
+        """
+            Body of the writer thread : write every record waiting in the queue, then flush
+        """
+        while True:
+            record = self.queue.get()
+            lines = []
+            while record is not None:
+                lines.append(self.encode(record))
+                self.records += 1
+                if self.queue.empty():
+                    break
+                record = self.queue.get()
+            if lines:
+                self.file.write("".join(lines))
+                self.file.flush()
+            if record is None:
+                return
+
+
+def read_journal(path):
+    """
+        Read the records of a journal, a truncated last line (journal still written or crashed) is skipped
+
+        :param path: path of the journal file
+        :return: generator of (kind, time, "ip:port", ...) tuples. Times are in seconds since the first session
+                 started, each session is shifted to start when the previous one ended so they follow each other
+    """
+    bulbs = {}
+    # Shift of the times of the current session, and time of the last record read
+    offset = 0.0
+    last_time = 0.0
+    with open(path, encoding="utf-8") as journal_file:
+        for line in journal_file:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(record, dict):
+                # Header of a new session, its times restart from 0
+                bulbs = {}
+                offset = last_time
+            elif record[0] == RECORD_BULB:
+                bulbs[record[1]] = record[2]
+            else:
+                record[1] += offset
+                record[2] = bulbs[record[2]]
+                last_time = max(last_time, record[1])
+                yield tuple(record)
+
+
+class YeelightReplay:
+    """
+        Send the commands of a journal again, with their recorded timing, to measure the throughput and latency of
+        a real workload. The commands are written without waiting for the previous response, like the concurrent
+        callers that sent them in the first place.
+    """
+
+    def __init__(self, records, addresses=None, speed=1.0, read_timeout=YeelightConnection.DEFAULT_READ_TIMEOUT):
+        """
+            :param records: records of the journal, see read_journal
+            :param addresses: (ip, port) replacing each recorded "ip:port" (e.g. fake bulbs), the recorded address
+                              is used for the bulbs missing from it
+            :param speed: 1 to replay at the recorded pace, 2 twice as fast, 0 as fast as possible
+            :param read_timeout: time in seconds to wait for each response
+
+            :type addresses: dict
+            :type speed: float
+        """
+        self.commands = [record for record in records if record[0] == RECORD_COMMAND]
+        self.addresses = addresses or {}
+        self.speed = speed
+        self.read_timeout = read_timeout
+
+    def get_connection(self, connections, bulb):
+        connection = connections.get(bulb)
+        if connection is None:
+            ip, port = self.addresses.get(bulb) or bulb.rsplit(":", 1)
+            connection = connections[bulb] = YeelightConnection(ip, port, read_timeout=self.read_timeout)
+        return connection
+
+    def run(self):
+        """
+            Replay every command and wait for the responses
+
+            :return: "commands", "errors", "duration" in seconds, "cmd_per_s", "p50" and "p99" latency in
+                     seconds, "lag" : p99 delay between the scheduled and actual send time
+            :rtype: dict
+        """
+        connections = {}
+        latencies = []
+        lags = []
+        errors = 0
+        futures = []
+        first_time = self.commands[0][1] if self.commands else 0.0
+        started_at = time.perf_counter()
+        try:
+            for command_id, (_, timestamp, bulb, _, method, params) in enumerate(self.commands):
+                if self.speed:
+                    scheduled_at = started_at + (timestamp - first_time) / self.speed
+                    delay = scheduled_at - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+                    lags.append(max(0.0, time.perf_counter() - scheduled_at))
+                connection = self.get_connection(connections, bulb)
+                message = YeelightCommand(command_id, method, params).get_message_bytes()
+                sent_at = time.perf_counter()
+                try:
+                    future = connection.submit(message, command_id)
+                except OSError:
+                    errors += 1
+                    continue
+                future.add_done_callback(
+                    lambda done, sent_at=sent_at: latencies.append(time.perf_counter() - sent_at))
+                futures.append((connection, future, command_id))
+            for connection, future, command_id in futures:
+                try:
+                    data = connection.wait_response(future, command_id)
+                except OSError:
+                    errors += 1
+                    continue
+                if "error" in data:
+                    errors += 1
+        finally:
+            for connection in connections.values():
+                with connection.lock:
+                    connection.close()
+        duration = time.perf_counter() - started_at
+        latencies.sort()
+        lags.sort()
+        return {"commands": len(self.commands),
+                "errors": errors,
+                "duration": duration,
+                "cmd_per_s": len(self.commands) / duration if duration else 0.0,
+                "p50": latencies[len(latencies) // 2] if latencies else 0.0,
+                "p99": latencies[min(len(latencies) - 1, len(latencies) * 99 // 100)] if latencies else 0.0,
+                "lag": lags[min(len(lags) - 1, len(lags) * 99 // 100)] if lags else 0.0}
@@ -1,3 +1,6 @@
+import json
+
+
 class YeelightMessage:
     """
         Generic class for all type of messages sent and received from a Yeelight Bulb
@@ -6,7 +9,10 @@ class YeelightMessage:
     MESSAGE_TYPE_RESPONSE = "response"
     MESSAGE_TYPE_NOTIFICATION = "notification"
 
-    COMMAND_BODY = '{{"id":{},"method":"{}","params":[{}]}}\r\n'
+    # A command is '{"id":<id>,"method":"<method>","params":[<params>]}\r\n'
+    COMMAND_HEAD = '{"id":'
+    COMMAND_METHOD = ',"method":{},"params":'
+    COMMAND_TAIL = '}\r\n'
 
     RESPONSE_ID = "id"
     RESPONSE_RESULT = "result"
@@ -30,6 +36,12 @@ class YeelightCommand(YeelightMessage):
         Class used to handle command message sent to a bulb
     """
 
+    # Strings are escaped by the json encoder
+    encode_string = staticmethod(json.encoder.encode_basestring)
+
+    # Part of the message between the id and the params, encoded once per method
+    method_templates = {}
+
     def __init__(self, unique_id, method, params=None):
         """
             For some methods (stop_cf, toggle ...), params are not necessary (see API doc)
@@ -48,6 +60,7 @@ class YeelightCommand(YeelightMessage):
         self.params = params
         self.command_id = unique_id
         self.message = None
+        self.message_bytes = None
         self.build_message()
 
     def build_message(self):
@@ -55,23 +68,36 @@ class YeelightCommand(YeelightMessage):
             Make the one string message sent to the bulb
         """
         if self.params is None:
-            inline_params = ""
+            params = []
+        elif isinstance(self.params, (list, tuple)):
+            params = self.params
         else:
-            # Put all params in one string
-            inline_params = ""
-            if type(self.params) is list:
-                for x in self.params:
-                    if x != self.params[0]:
-                        inline_params += ", "
-                    if type(x) is int:
-                        inline_params += str(x)
-                    else:
-                        inline_params += '"{}"'.format(x)
-            else:
-                inline_params += '"{}"'.format(self.params)
+            # Only one parameter
+            params = [self.params]
+        template = self.method_templates.get(self.method)
+        if template is None:
+            template = self.COMMAND_METHOD.format(json.dumps(self.method))
+            self.method_templates[self.method] = template
+        # Build message with the cached method part and the encoded params
+        self.message = (self.COMMAND_HEAD + str(self.command_id) + template + self.encode_params(params) +
+                        self.COMMAND_TAIL)
+        self.message_bytes = None
 
-        # Build message with that string
-        self.message = self.COMMAND_BODY.format(str(self.command_id), self.method, inline_params)
+    def encode_params(self, params):
+        """
+            Encode the params list to json without spaces.
+            int and str, the types used by the bulb API, are encoded directly, other types go through json.dumps
+            :rtype: str
+        """
+        items = []
+        for x in params:
+            if type(x) is int:
+                items.append(str(x))
+            elif type(x) is str:
+                items.append(self.encode_string(x))
+            else:
+                items.append(json.dumps(x, separators=(",", ":")))
+        return "[" + ",".join(items) + "]"
 
     def get_message(self):
         """
@@ -80,6 +106,15 @@ class YeelightCommand(YeelightMessage):
         """
         return self.message
 
+    def get_message_bytes(self):
+        """
+            Return the message encoded to be written on the socket, it is encoded only once
+            :rtype: bytes
+        """
+        if self.message_bytes is None:
+            self.message_bytes = self.message.encode()
+        return self.message_bytes
+
     def get_command_id(self):
         """
             Get the unique id
@@ -103,9 +138,9 @@ class YeelightResponse(YeelightMessage):
     def __init__(self, raw_response, command):
         """
             Initiate the response
-            :param raw_response: Not decoded one string response
+            :param raw_response: Not decoded one string response, or the response already decoded into a dict
             :param command : command used to generate the bulb response
-            :type raw_response: str
+            :type raw_response: str or dict
             :type command: YeelightCommand
         """
         super().__init__()
@@ -123,8 +158,10 @@ class YeelightResponse(YeelightMessage):
             :param raw_response:  Not decoded one string response
         """
         # Transform response into a dict
-        import json
-        data = json.loads(raw_response)
+        if isinstance(raw_response, dict):
+            data = raw_response
+        else:
+            data = json.loads(raw_response)
         # Retrieve the response id
         self.response_id = data[self.RESPONSE_ID]
         # Check if the response id match the command id
@@ -151,11 +188,51 @@ class YeelightResponse(YeelightMessage):
 class YeelightNotification(YeelightMessage):
     """
         Class used to handle notification message generate from the bulb
+        The bulb sends a "props" notification to every connected client each time one of its properties changes
     """
 
-    def __init__(self, ):
+    NOTIFICATION_METHOD = "method"
+    NOTIFICATION_PARAMS = "params"
+
+    METHOD_PROPS = "props"
+
+    def __init__(self, raw_notification):
+        """
+            :param raw_notification: Not decoded one string notification, or the notification already decoded
+                                     into a dict
+            :type raw_notification: str or dict
+        """
         super().__init__()
         self.type = self.MESSAGE_TYPE_NOTIFICATION
+        self.method = None
+        self.properties = {}
+        self.decode_notification(raw_notification)
+
+    def decode_notification(self, raw_notification):
+        """
+            Put in self.properties the properties changed on the bulb
+            :param raw_notification: Not decoded one string notification, or the decoded dict
+        """
+        if isinstance(raw_notification, dict):
+            data = raw_notification
+        else:
+            data = json.loads(raw_notification)
+        self.method = data.get(self.NOTIFICATION_METHOD)
+        if self.method == self.METHOD_PROPS:
+            self.properties = dict(data.get(self.NOTIFICATION_PARAMS, {}))
+
+    def is_props(self):
+        return self.method == self.METHOD_PROPS
+
+    def get_properties(self):
+        """
+            Properties changed on the bulb with their new value
+            :rtype: dict
+        """
+        return self.properties
+
+    def __str__(self):
+        return 'Notification : "{}"\nProperties : "{}"'.format(self.method, self.properties)
 
 
 class YeelightError(Exception):
@@ -173,6 +250,87 @@ class YeelightError(Exception):
             :type error_code: int
             :type command: YeelightCommand
         """
+        self.error_message = error_message
+        self.error_code = error_code
+        self.command = command
         message = "Sent to the Yeelight Bulb :\n{}\n".format(command.__str__())
         message += "The Yeelight bulb returns the following error : {} (Code {})\n".format(error_message, error_code)
         Exception.__init__(self, message)
+
+
+class YeelightStreamReader:
+    """
+        Split the byte stream sent by a bulb into messages.
+        Each message is one json object ended by \r\n, but a read can end in the middle of a message or hold
+        several of them : incomplete data is kept in the buffer until the rest comes.
+        The same buffers are reused for every read.
+    """
+
+    SEPARATOR = b"\r\n"
+
+    DEFAULT_CHUNK_SIZE = 4096
+    # A message bigger than this is not a bulb message, the stream is broken
+    MAX_MESSAGE_SIZE = 65536
+
+    def __init__(self, chunk_size=DEFAULT_CHUNK_SIZE):
+        """
+            :param chunk_size: maximum size of one socket read
+            :type chunk_size: int
+        """
+        self.buffer = bytearray()
+        self.chunk = bytearray(chunk_size)
+        self.chunk_view = memoryview(self.chunk)
+
+    def read_from(self, tcp_socket):
+        """
+            Read once from the socket into the reused chunk and return the messages completed by this read
+
+            :param tcp_socket: socket to read, blocks until some data comes
+            :return: decoded messages, None when the socket is closed
+            :rtype: list of dict
+        """
+        size = tcp_socket.recv_into(self.chunk)
+        if size == 0:
+            return None
+        return self.feed(self.chunk_view[:size])
+
+    def feed(self, data):
+        """
+            Add data read from the stream and return the messages it completes
+
+            :param data: bytes read from the stream
+            :return: decoded messages, in the order of the stream
+            :rtype: list of dict
+        """
+        self.buffer += data
+        messages = []
+        start = 0
+        while True:
+            end = self.buffer.find(self.SEPARATOR, start)
+            if end < 0:
+                break
+            if end > start:
+                messages.append(self.decode(self.buffer[start:end]))
+            start = end + len(self.SEPARATOR)
+        # Keep only the incomplete message, deleting at the start of a bytearray doesn't reallocate it
+        if start:
+            del self.buffer[:start]
+        if len(self.buffer) > self.MAX_MESSAGE_SIZE:
+            self.buffer.clear()
+            raise ValueError("Message bigger than {} bytes without separator".format(self.MAX_MESSAGE_SIZE))
+        return [message for message in messages if message is not None]
+
+    def decode(self, line):
+        """
+            :param line: one message without its separator
+            :return: the decoded message, None if it is not valid json
+            :rtype: dict
+        """
+        try:
+            data = json.loads(line)
+        except ValueError:
+            return None
+        return data if isinstance(data, dict) else None
+
+    def clear(self):
+        self.buffer.clear()
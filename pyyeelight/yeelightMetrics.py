@@ -0,0 +1,164 @@
+import bisect
+import logging
+import threading
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class YeelightHistogram:
+    """
+        Latency histogram with fixed buckets, recording a value is a bisect and a few additions
+    """
+
+    # Upper bounds of the buckets in seconds, the last bucket holds everything slower
+    BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(self):
+        self.counts = [0] * (len(self.BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.minimum = None
+        self.maximum = None
+
+    def observe(self, value):
+        """
+            :param value: duration in seconds
+            :type value: float
+        """
+        self.counts[bisect.bisect_left(self.BUCKETS, value)] += 1
+        self.count += 1
+        self.total += value
+        if self.minimum is None or value < self.minimum:
+            self.minimum = value
+        if self.maximum is None or value > self.maximum:
+            self.maximum = value
+
+    def get_percentile(self, percentile):
+        """
+            :param percentile: between 0 and 100
+            :return: upper bound of the bucket holding the percentile, the maximum for the last bucket
+            :rtype: float
+        """
+        if self.count == 0:
+            return None
+        rank = self.count * percentile / 100.0
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count:
+                return self.BUCKETS[index] if index < len(self.BUCKETS) else self.maximum
+        return self.maximum
+
+    def snapshot(self):
+        """
+            :rtype: dict
+        """
+        return {"count": self.count,
+                "total": self.total,
+                "mean": self.total / self.count if self.count else None,
+                "min": self.minimum,
+                "max": self.maximum,
+                "p50": self.get_percentile(50),
+                "p99": self.get_percentile(99),
+                "buckets": dict(zip(self.BUCKETS + ("inf",), self.counts))}
+
+
+class YeelightMetrics:
+    """
+        Instrumentation of the API calls : time of each phase of a command, latency per bulb and per method,
+        errors per YeelightError code (or exception name for transport errors) and hooks called after each command.
+
+        Set it on one API call (YeelightAPICall(..., metrics=metrics)) or on all of them (YeelightAPICall.metrics).
+    """
+
+    PHASE_ENCODE = "encode"
+    PHASE_CONNECT = "connect"
+    PHASE_SEND = "send"
+    PHASE_WAIT = "wait"
+    PHASE_DECODE = "decode"
+    PHASE_TOTAL = "total"
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.hooks = []
+        self.reset()
+
+    def reset(self):
+        """
+            Forget everything recorded so far
+        """
+        with self.lock:
+            self.phases = {}
+            self.bulbs = {}
+            self.methods = {}
+            self.errors = {}
+            self.commands = 0
+
+    def add_hook(self, callback):
+        """
+            Register a callback called after each command with a dict holding "bulb", "method", "timings" (seconds
+            per phase) and "error" (None if the command succeeded)
+
+            :param callback: function taking the event dict
+        """
+        self.hooks.append(callback)
+
+    def remove_hook(self, callback):
+        if callback in self.hooks:
+            self.hooks.remove(callback)
+
+    @staticmethod
+    def error_key(error):
+        """
+            :return: the bulb error code for a YeelightError, the exception name otherwise
+        """
+        code = getattr(error, "error_code", None)
+        return code if code is not None else type(error).__name__
+
+    def record(self, bulb, method, timings, error=None):
+        """
+            Record a command
+
+            :param bulb: "ip:port" of the bulb
+            :param method: method of the command
+            :param timings: duration in seconds of each phase, with the total
+            :param error: exception raised by the command, None if it succeeded
+
+            :type timings: dict
+        """
+        with self.lock:
+            self.commands += 1
+            for phase, duration in timings.items():
+                histogram = self.phases.get(phase)
+                if histogram is None:
+                    histogram = self.phases[phase] = YeelightHistogram()
+                histogram.observe(duration)
+            total = timings.get(self.PHASE_TOTAL)
+            if total is not None:
+                for table, key in ((self.bulbs, bulb), (self.methods, method)):
+                    histogram = table.get(key)
+                    if histogram is None:
+                        histogram = table[key] = YeelightHistogram()
+                    histogram.observe(total)
+            if error is not None:
+                key = self.error_key(error)
+                self.errors[key] = self.errors.get(key, 0) + 1
+        if self.hooks:
+            event = {"bulb": bulb, "method": method, "timings": timings, "error": error}
+            for hook in list(self.hooks):
+                try:
+                    hook(event)
+                except Exception:
+                    _LOGGER.exception("Metrics hook failed")
+
+    def snapshot(self):
+        """
+            Copy of everything recorded, made of plain dicts to be handed to a metrics exporter
+            :rtype: dict
+        """
+        with self.lock:
+            return {"commands": self.commands,
+                    "phases": {name: histogram.snapshot() for name, histogram in self.phases.items()},
+                    "bulbs": {name: histogram.snapshot() for name, histogram in self.bulbs.items()},
+                    "methods": {name: histogram.snapshot() for name, histogram in self.methods.items()},
+                    "errors": dict(self.errors)}
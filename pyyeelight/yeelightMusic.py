@@ -0,0 +1,194 @@
+import collections
+import logging
+import socket
+import threading
+from .yeelightMessage import YeelightCommand, YeelightError
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class YeelightMusicMode:
+    """
+        Music mode channel of a bulb.
+
+        The bulb connects back to a local TCP server and then accepts commands on this connection without quota
+        and without sending any response. Commands are queued and written by a sender thread : when the producer
+        is faster than the socket, a waiting frame of the same set_* method is replaced by the new one, and the
+        oldest frame is dropped when the queue is full (or the producer waits if it asked to). Relative commands
+        (toggle, set_adjust, adjust_*) are never replaced, every frame is sent in order.
+    """
+
+    # set_* methods changing the state by a relative amount, each of their frames must be sent
+    RELATIVE_METHODS = frozenset(("set_adjust",))
+
+    DEFAULT_QUEUE_SIZE = 16
+    # Time in seconds to wait for the bulb to connect back
+    ACCEPT_TIMEOUT = 5
+
+    def __init__(self, api_call, host=None, port=0, queue_size=DEFAULT_QUEUE_SIZE):
+        """
+            :param api_call: API call of the bulb, used to switch the music mode on and off
+            :param host: local ip the bulb connects to, guessed from the route to the bulb if None
+            :param port: local port the bulb connects to, any free port if 0
+            :param queue_size: maximum number of frames waiting to be sent
+
+            :type api_call: YeelightAPICall
+            :type host: str
+            :type port: int
+            :type queue_size: int
+        """
+        self.api_call = api_call
+        self.host = host
+        self.port = port
+        self.queue_size = queue_size
+        # key -> (method, params), the key is the method for the coalesced methods, unique for the others
+        self.queue = collections.OrderedDict()
+        self.condition = threading.Condition()
+        self.socket = None
+        self.sender = None
+        self.running = False
+        self.command_id = 0
+        self.queued = 0
+        self.sent = 0
+        self.coalesced = 0
+        self.dropped = 0
+
+    def is_running(self):
+        return self.running
+
+    def get_local_host(self):
+        """
+            Find the local ip used to reach the bulb, no packet is sent
+            :rtype: str
+        """
+        probe = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            probe.connect((self.api_call.ip, int(self.api_call.port)))
+            return probe.getsockname()[0]
+        finally:
+            probe.close()
+
+    def start(self):
+        """
+            Open the local server, ask the bulb to connect to it and start the sender thread
+        """
+        host = self.host if self.host is not None else self.get_local_host()
+        server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        try:
+            server.bind((host, self.port))
+            server.listen(1)
+            server.settimeout(self.ACCEPT_TIMEOUT)
+            self.port = server.getsockname()[1]
+            self.api_call.operate_on_bulb("set_music", [1, host, self.port])
+            try:
+                self.socket, _ = server.accept()
+            except OSError:
+                # The bulb never connected back, don't leave it waiting in music mode
+                self.switch_off()
+                raise
+        finally:
+            server.close()
+        self.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.running = True
+        self.sender = threading.Thread(target=self.send_loop, name="yeelight-music-{}".format(self.api_call.ip),
+                                       daemon=True)
+        self.sender.start()
+
+    def stop(self):
+        """
+            Stop the sender thread, close the channel and switch the bulb back to normal mode.
+            Frames still waiting are dropped.
+        """
+        with self.condition:
+            self.running = False
+            self.dropped += len(self.queue)
+            self.queue.clear()
+            self.condition.notify_all()
+        if self.sender is not None:
+            self.sender.join()
+            self.sender = None
+        if self.socket is not None:
+            self.socket.close()
+            self.socket = None
+        self.api_call.operate_on_bulb("set_music", [0])
+
+    def switch_off(self):
+        """
+            Switch the bulb back to normal mode after a failed start, without hiding the error of the start
+        """
+        try:
+            self.api_call.operate_on_bulb("set_music", [0])
+        except (OSError, YeelightError):
+            _LOGGER.warning("Music mode of %s could not be switched off", self.api_call.ip)
+
+    def is_coalesced(self, method):
+        """
+            :return: True if only the latest queued frame of the method is worth sending
+            :rtype: bool
+        """
+        return method.startswith("set_") and method not in self.RELATIVE_METHODS
+
+    def send(self, method, params=None, block=False):
+        """
+            Queue a fire-and-forget command
+
+            :param method: method name (see API doc)
+            :param params: parameters used with the method
+            :param block: if the queue is full, wait for a free slot instead of dropping the oldest frame
+            :return: False if the channel is stopped
+            :rtype: bool
+
+            :type method: str
+            :type params: list
+            :type block: bool
+        """
+        with self.condition:
+            if not self.running:
+                return False
+            self.queued += 1
+            key = method if self.is_coalesced(method) else (method, self.queued)
+            if key in self.queue:
+                # Only the latest frame of a method is worth sending
+                del self.queue[key]
+                self.coalesced += 1
+            elif len(self.queue) >= self.queue_size:
+                if block:
+                    self.condition.wait_for(lambda: len(self.queue) < self.queue_size or not self.running)
+                    if not self.running:
+                        return False
+                else:
+                    self.queue.popitem(last=False)
+                    self.dropped += 1
+            self.queue[key] = (method, params)
+            self.condition.notify_all()
+            return True
+
+    def send_loop(self):
+        """
+            Body of the sender thread, write the queued frames until the channel is stopped
+        """
+        while True:
+            with self.condition:
+                self.condition.wait_for(lambda: self.queue or not self.running)
+                if not self.running:
+                    return
+                _, (method, params) = self.queue.popitem(last=False)
+                self.condition.notify_all()
+            self.command_id += 1
+            message = YeelightCommand(self.command_id, method, params).get_message_bytes()
+            try:
+                self.socket.sendall(message)
+                self.sent += 1
+            except OSError:
+                _LOGGER.warning("Music mode connection of %s closed by the bulb", self.api_call.ip)
+                with self.condition:
+                    self.running = False
+                    self.condition.notify_all()
+                return
+
+    def get_stats(self):
+        """
+            :return: number of frames sent, replaced by a newer frame of the same method, and dropped
+            :rtype: dict
+        """
+        return {"sent": self.sent, "coalesced": self.coalesced, "dropped": self.dropped}
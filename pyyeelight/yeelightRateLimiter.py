@@ -0,0 +1,178 @@
+import collections
+import threading
+import time
+from concurrent.futures import Future
+
+
+class YeelightCommandDropped(Exception):
+    """
+        Set on the future of a command dropped by the rate limiter because too many commands were waiting
+    """
+
+
+class YeelightRateLimiter:
+    """
+        Token bucket scheduler of the commands sent to one bulb.
+
+        In normal mode the bulb accepts a limited number of commands per minute and rejects the others. A command
+        is sent right away while tokens are left, otherwise it waits in the queue for the next token. While a
+        command of a method is waiting, a new command of the same method replaces it : only the latest value is
+        sent (e.g. a slider drag sends one set_bright per token instead of one per move). Only the methods setting
+        an absolute value are merged, the others (toggle, set_adjust ...) are all sent, in order.
+    """
+
+    # Methods for which sending the latest command is enough
+    COALESCED_METHODS = frozenset(("set_rgb", "set_bright", "set_ct_abx", "set_hsv", "set_power"))
+
+    # The bulb accepts 60 commands per minute in normal mode
+    DEFAULT_QUOTA = 60
+    DEFAULT_PERIOD = 60.0
+    DEFAULT_BURST = 10
+    DEFAULT_MAX_PENDING = 16
+
+    def __init__(self, quota=DEFAULT_QUOTA, period=DEFAULT_PERIOD, burst=DEFAULT_BURST,
+                 max_pending=DEFAULT_MAX_PENDING):
+        """
+            :param quota: number of commands allowed per period
+            :param period: length of the period in seconds
+            :param burst: maximum number of commands sent back to back after an idle time
+            :param max_pending: maximum number of commands waiting, the oldest one is dropped beyond that
+
+            :type quota: int
+            :type period: float
+            :type burst: int
+            :type max_pending: int
+        """
+        self.rate = quota / period
+        self.burst = burst
+        self.max_pending = max_pending
+        self.tokens = float(burst)
+        self.updated_at = time.monotonic()
+        # key -> (send, method, params, futures), in the order the commands were queued. The key is the method
+        # for the coalesced methods, unique for the others
+        self.pending = collections.OrderedDict()
+        self.condition = threading.Condition()
+        self.worker = None
+        self.sent = 0
+        self.delayed = 0
+        self.coalesced = 0
+        self.dropped = 0
+
+    def refill(self):
+        """
+            Add the tokens earned since the last update. Must be called with the condition held.
+        """
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def take_token(self):
+        """
+            Take a token if one is left. Must be called with the condition held.
+            :return: 0 if a token was taken, otherwise time in seconds until the next one
+            :rtype: float
+        """
+        self.refill()
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.rate
+
+    def submit(self, send, method, params=None):
+        """
+            Send a command now if a token is left and nothing is waiting, otherwise queue it
+
+            :param send: function sending the command, called with method and params
+            :param method: method name (see API doc)
+            :param params: parameters used with the method
+            :return: future resolved with the result of the command, or of the newer command that replaced it.
+                     It fails with YeelightCommandDropped if the command is dropped from a full queue
+            :rtype: Future
+        """
+        return self.schedule(send, method, params, method in self.COALESCED_METHODS)
+
+    def run(self, send, method, params=None):
+        """
+            Send the command after the commands already waiting and return its result.
+            Used by the commands that need their response right away (get_prop ...), they are never coalesced.
+            They go through the queue like the others : a get_prop sent before a waiting set_* would read the old
+            value and overwrite the one the set_* stored locally. Raises YeelightCommandDropped if the command is
+            dropped from a full queue.
+        """
+        return self.schedule(send, method, params, False).result()
+
+    def schedule(self, send, method, params, coalesce):
+        """
+            See submit
+
+            :param coalesce: if a waiting command of the same method is replaced by this one
+            :rtype: Future
+        """
+        future = Future()
+        with self.condition:
+            if not self.pending and self.take_token() == 0:
+                self.sent += 1
+                send_now = True
+            else:
+                send_now = False
+                self.delayed += 1
+                futures = [future]
+                key = method if coalesce else (method, self.delayed)
+                if key in self.pending:
+                    futures = self.pending.pop(key)[3] + futures
+                    self.coalesced += 1
+                elif len(self.pending) >= self.max_pending:
+                    _, (_, _, _, dropped) = self.pending.popitem(last=False)
+                    self.dropped += len(dropped)
+                    for dropped_future in dropped:
+                        dropped_future.set_exception(YeelightCommandDropped("Too many commands waiting for the bulb"))
+                self.pending[key] = (send, method, params, futures)
+                self.start_worker()
+        if send_now:
+            self.resolve([future], send, method, params)
+        return future
+
+    def start_worker(self):
+        """
+            Start the thread sending the queued commands. Must be called with the condition held.
+        """
+        if self.worker is None:
+            self.worker = threading.Thread(target=self.work, name="yeelight-rate-limiter", daemon=True)
+            self.worker.start()
+
+    def work(self):
+        """
+            Body of the worker thread, send the queued commands as tokens come and stop when the queue is empty
+        """
+        while True:
+            with self.condition:
+                if not self.pending:
+                    self.worker = None
+                    return
+                wait = self.take_token()
+                if wait > 0:
+                    self.condition.wait(wait)
+                    continue
+                _, (send, method, params, futures) = self.pending.popitem(last=False)
+                self.sent += 1
+            self.resolve(futures, send, method, params)
+
+    @staticmethod
+    def resolve(futures, send, method, params):
+        try:
+            result = send(method, params)
+        except Exception as error:
+            for future in futures:
+                future.set_exception(error)
+        else:
+            for future in futures:
+                future.set_result(result)
+
+    def get_stats(self):
+        """
+            :return: commands sent, delayed by the quota, replaced by a newer one of the same method and dropped
+            :rtype: dict
+        """
+        with self.condition:
+            return {"sent": self.sent, "delayed": self.delayed, "coalesced": self.coalesced,
+                    "dropped": self.dropped, "pending": len(self.pending)}
@@ -0,0 +1,130 @@
+from . import yeelightValidation
+from . import yeelightColor
+
+
+class YeelightScene:
+    """
+        State applied to a bulb with one set_scene command : power, color and brightness change together,
+        whether the bulb is on or off.
+    """
+
+    SCENE_COLOR = "color"
+    SCENE_HSV = "hsv"
+    SCENE_COLOR_TEMPERATURE = "ct"
+    SCENE_COLOR_FLOW = "cf"
+    SCENE_AUTO_DELAY_OFF = "auto_delay_off"
+
+    # Method a bulb must support to apply each scene type
+    REQUIRED_METHODS = {SCENE_COLOR: "set_rgb", SCENE_HSV: "set_hsv", SCENE_COLOR_TEMPERATURE: "set_ct_abx",
+                        SCENE_COLOR_FLOW: "start_cf"}
+
+    # Values of the color_mode property
+    COLOR_MODE_RGB = 1
+    COLOR_MODE_COLOR_TEMPERATURE = 2
+    COLOR_MODE_HSV = 3
+
+    def __init__(self, scene_type, params, properties):
+        """
+            Use the class methods to build a scene
+
+            :param scene_type: kind of scene (see API doc)
+            :param params: set_scene parameters following the kind of scene
+            :param properties: bulb properties once the scene is applied
+
+            :type scene_type: str
+            :type params: list
+            :type properties: dict
+        """
+        self.scene_type = scene_type
+        self.params = params
+        self.properties = properties
+
+    @classmethod
+    def color(cls, red, green, blue, brightness):
+        """
+            :param red: Red component of the color between 0 and 255
+            :param green: Green component of the color between 0 and 255
+            :param blue: Blue component of the color between 0 and 255
+            :param brightness: brightness between 1 and 100
+            :rtype: YeelightScene
+        """
+        yeelightValidation.validate("set_scene_color", {'red': red, 'green': green, 'blue': blue,
+                                                        'brightness': brightness})
+        rgb = yeelightColor.rgb_to_int(red, green, blue)
+        return cls(cls.SCENE_COLOR, [rgb, brightness],
+                   {"power": "on", "rgb": rgb, "bright": brightness, "color_mode": cls.COLOR_MODE_RGB})
+
+    @classmethod
+    def hsv(cls, hue, saturation, brightness):
+        """
+            :param hue: Hue component of the color between 0 and 359
+            :param saturation: Saturation component of the color between 0 and 100
+            :param brightness: brightness between 1 and 100
+            :rtype: YeelightScene
+        """
+        yeelightValidation.validate("set_scene_hsv", {'hue': hue, 'saturation': saturation,
+                                                      'brightness': brightness})
+        return cls(cls.SCENE_HSV, [hue, saturation, brightness],
+                   {"power": "on", "hue": hue, "sat": saturation, "bright": brightness,
+                    "color_mode": cls.COLOR_MODE_HSV})
+
+    @classmethod
+    def color_temperature(cls, temperature, brightness):
+        """
+            :param temperature: color temperature between 1700 and 6500 K
+            :param brightness: brightness between 1 and 100
+            :rtype: YeelightScene
+        """
+        yeelightValidation.validate("set_scene_ct", {'temperature': temperature, 'brightness': brightness})
+        return cls(cls.SCENE_COLOR_TEMPERATURE, [temperature, brightness],
+                   {"power": "on", "ct": temperature, "bright": brightness,
+                    "color_mode": cls.COLOR_MODE_COLOR_TEMPERATURE})
+
+    @classmethod
+    def color_flow(cls, flow):
+        """
+            Switch the bulb on and start a color flow
+
+            :param flow: flow to start
+            :type flow: YeelightFlow
+            :rtype: YeelightScene
+        """
+        params = flow.get_params()
+        return cls(cls.SCENE_COLOR_FLOW, params, {"power": "on", "flowing": 1, "flow_params": params[2]})
+
+    @classmethod
+    def auto_delay_off(cls, brightness, minutes):
+        """
+            Switch the bulb on at this brightness and switch it off after some minutes
+
+            :param brightness: brightness between 1 and 100
+            :param minutes: time before the bulb is switched off
+            :rtype: YeelightScene
+        """
+        yeelightValidation.validate("set_scene_auto_delay_off", {'brightness': brightness, 'minutes': minutes})
+        return cls(cls.SCENE_AUTO_DELAY_OFF, [brightness, minutes],
+                   {"power": "on", "bright": brightness, "delayoff": minutes})
+
+    def get_params(self):
+        """
+            :return: parameters of the set_scene command
+            :rtype: list
+        """
+        return [self.scene_type] + self.params
+
+    def get_required_method(self):
+        """
+            :return: the method a bulb must support to apply the scene, None if every bulb can
+            :rtype: str
+        """
+        return self.REQUIRED_METHODS.get(self.scene_type)
+
+    def get_properties(self):
+        """
+            :return: bulb properties once the scene is applied
+            :rtype: dict
+        """
+        return self.properties
+
+    def __str__(self):
+        return 'Scene : "{}"\nParameters : "{}"'.format(self.scene_type, self.params)
@@ -0,0 +1,293 @@
+import threading
+import time
+import weakref
+from array import array
+from itertools import compress
+from collections.abc import MutableMapping
+
+
+class YeelightStateStore:
+    """
+        Column store of the properties of many bulbs. Each bulb owns a slot, the same index in every column :
+        power is one byte per bulb, the numeric properties are machine ints, flow_params and name are kept in
+        lists. Every value goes through decode, the one place where the strings sent by the bulb become typed.
+        Fleet queries (e.g. the bulbs that are on) scan the columns instead of every bulb object.
+
+        A slot is released when its bulb is garbage collected and reused by the next bulb.
+    """
+
+    PROPERTIES = ("power", "bright", "ct", "rgb", "hue", "sat", "color_mode", "flowing", "delayoff", "flow_params",
+                  "music_on", "name")
+
+    POWER_UNKNOWN = 0
+    POWER_OFF = 1
+    POWER_ON = 2
+    POWER_FLAGS = {"off": POWER_OFF, "on": POWER_ON}
+    POWER_VALUES = (None, "off", "on")
+    # Translation tables of the power column to 1 for the selected bulbs, 0 for the others
+    POWER_SELECT = {POWER_ON: bytes([0, 0, 1]) + bytes(253), POWER_OFF: bytes([0, 1, 0]) + bytes(253)}
+
+    # Type code of the int columns, -1 is an unknown value
+    INT_COLUMNS = {"bright": "h", "ct": "h", "rgb": "i", "hue": "h", "sat": "h", "color_mode": "b", "flowing": "b",
+                   "delayoff": "h", "music_on": "b"}
+    UNKNOWN = -1
+
+    # Timestamp of a property never read
+    NEVER = float("-inf")
+
+    def __init__(self):
+        self.power = bytearray()
+        self.ints = {name: array(typecode) for name, typecode in self.INT_COLUMNS.items()}
+        self.objects = {name: [] for name in self.PROPERTIES if name != "power" and name not in self.INT_COLUMNS}
+        self.timestamps = {name: array("d") for name in self.PROPERTIES}
+        self.keys = []
+        self.owners = []
+        self.free = []
+        # Slots of the garbage collected bulbs, cleared by the next allocation or query
+        self.released = []
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.keys) - len(self.free) - len(self.released)
+
+    def allocate(self, owner, key):
+        """
+            Give a slot to a bulb
+
+            :param owner: object owning the slot, it is released when the owner is garbage collected
+            :param key: "ip:port" of the bulb
+            :return: the view of the slot, used as the property dict of the bulb
+            :rtype: YeelightBulbState
+        """
+        with self.lock:
+            self.collect()
+            if self.free:
+                slot = self.free.pop()
+                self.keys[slot] = key
+                self.owners[slot] = weakref.ref(owner, lambda ref, slot=slot: self.released.append(slot))
+            else:
+                slot = len(self.keys)
+                self.power.append(self.POWER_UNKNOWN)
+                for column in self.ints.values():
+                    column.append(self.UNKNOWN)
+                for column in self.objects.values():
+                    column.append(None)
+                for column in self.timestamps.values():
+                    column.append(self.NEVER)
+                self.keys.append(key)
+                self.owners.append(weakref.ref(owner, lambda ref, slot=slot: self.released.append(slot)))
+        return YeelightBulbState(self, slot)
+
+    def collect(self):
+        """
+            Forget the values of the released slots and make them available to other bulbs.
+            Must be called with the lock held : the slots are not cleared by the weakref callback itself, which can
+            run in the middle of an allocation.
+        """
+        while self.released:
+            slot = self.released.pop()
+            self.power[slot] = self.POWER_UNKNOWN
+            for column in self.ints.values():
+                column[slot] = self.UNKNOWN
+            for column in self.objects.values():
+                column[slot] = None
+            for column in self.timestamps.values():
+                column[slot] = self.NEVER
+            self.keys[slot] = None
+            self.owners[slot] = None
+            self.free.append(slot)
+
+    def get_value(self, slot, name):
+        """
+            :return: the value of a property, None if it is unknown
+        """
+        if name == "power":
+            return self.POWER_VALUES[self.power[slot]]
+        column = self.ints.get(name)
+        if column is not None:
+            value = column[slot]
+            return None if value == self.UNKNOWN else value
+        return self.objects[name][slot]
+
+    @classmethod
+    def decode(cls, name, value):
+        """
+            Type a property value as sent by the bulb (get_prop result, notification or discovery header) :
+            "on"/"off" for power, an int for the numeric properties, a str for flow_params and name.
+
+            :return: the typed value, None if it can't be decoded (e.g. "" for a property the bulb doesn't have)
+        """
+        if name == "power":
+            return value if value in cls.POWER_FLAGS else None
+        if name in cls.INT_COLUMNS:
+            try:
+                return int(value)
+            except (TypeError, ValueError):
+                return None
+        return None if value is None else str(value)
+
+    def set_value(self, slot, name, value, timestamp):
+        """
+            Store a property, decoded to its column type. A value that can't be decoded is stored as unknown.
+
+            :raise KeyError: the property is unknown
+        """
+        value = self.decode(name, value)
+        if name == "power":
+            self.power[slot] = self.POWER_FLAGS.get(value, self.POWER_UNKNOWN)
+        elif name in self.ints:
+            try:
+                self.ints[name][slot] = self.UNKNOWN if value is None else value
+            except OverflowError:
+                self.ints[name][slot] = self.UNKNOWN
+        else:
+            self.objects[name][slot] = value
+        self.timestamps[name][slot] = timestamp
+
+    def expire(self, slot):
+        """
+            Mark every property of a bulb as never read, the values are kept until they are read again
+        """
+        for column in self.timestamps.values():
+            column[slot] = self.NEVER
+
+    def get_timestamp(self, slot, name):
+        """
+            :return: monotonic time of the last update of the property, None if it has never been read
+        """
+        timestamp = self.timestamps[name][slot]
+        return None if timestamp == self.NEVER else timestamp
+
+    def get_changes(self, since):
+        """
+            Properties updated after a given time, scanned column by column
+
+            :param since: monotonic time, NEVER for every known property
+            :return: new value of each changed property, keyed by "ip:port" of each bulb
+            :rtype: dict
+        """
+        if self.released:
+            with self.lock:
+                self.collect()
+        changes = {}
+        keys = self.keys
+        for name, column in self.timestamps.items():
+            for slot in compress(range(len(column)), [timestamp > since for timestamp in column]):
+                key = keys[slot]
+                if key is not None:
+                    changes.setdefault(key, {})[name] = self.get_value(slot, name)
+        return changes
+
+    def find_slots(self, power=None, min_brightness=None, max_brightness=None, color_mode=None):
+        """
+            Select the slots matching every given criteria
+
+            :param power: True for the bulbs that are on, False for the bulbs that are off
+            :param min_brightness: minimum brightness
+            :param max_brightness: maximum brightness
+            :param color_mode: value of the color_mode property
+            :rtype: list of int
+        """
+        if self.released:
+            with self.lock:
+                self.collect()
+        if power is None:
+            slots = [slot for slot, key in enumerate(self.keys) if key is not None]
+        else:
+            table = self.POWER_SELECT[self.POWER_ON if power else self.POWER_OFF]
+            slots = list(compress(range(len(self.power)), self.power.translate(table)))
+        if min_brightness is not None or max_brightness is not None:
+            brightness = self.ints["bright"]
+            low = min_brightness if min_brightness is not None else 0
+            high = max_brightness if max_brightness is not None else 100
+            slots = [slot for slot in slots if low <= brightness[slot] <= high]
+        if color_mode is not None:
+            modes = self.ints["color_mode"]
+            slots = [slot for slot in slots if modes[slot] == color_mode]
+        return slots
+
+    def find_bulbs(self, **criteria):
+        """
+            :param criteria: see find_slots
+            :return: the bulbs matching every criteria
+            :rtype: list of YeelightBulb
+        """
+        owners = self.owners
+        bulbs = [owners[slot]() for slot in self.find_slots(**criteria)]
+        return [bulb for bulb in bulbs if bulb is not None]
+
+    def find_keys(self, **criteria):
+        """
+            :param criteria: see find_slots
+            :return: "ip:port" of the bulbs matching every criteria
+            :rtype: list of str
+        """
+        return [self.keys[slot] for slot in self.find_slots(**criteria)]
+
+    def count_on(self):
+        if self.released:
+            with self.lock:
+                self.collect()
+        return self.power.count(self.POWER_ON)
+
+    def count_off(self):
+        if self.released:
+            with self.lock:
+                self.collect()
+        return self.power.count(self.POWER_OFF)
+
+
+class YeelightBulbState(MutableMapping):
+    """
+        Property dict of one bulb, backed by its slot in a YeelightStateStore
+    """
+
+    __slots__ = ("store", "slot")
+
+    def __init__(self, store, slot):
+        self.store = store
+        self.slot = slot
+
+    def __getitem__(self, name):
+        if name not in self.store.timestamps:
+            raise KeyError(name)
+        return self.store.get_value(self.slot, name)
+
+    def __setitem__(self, name, value):
+        self.store.set_value(self.slot, name, value, time.monotonic())
+
+    def __delitem__(self, name):
+        raise TypeError("The properties of a bulb can't be removed")
+
+    def __iter__(self):
+        return iter(self.store.PROPERTIES)
+
+    def __len__(self):
+        return len(self.store.PROPERTIES)
+
+    def __contains__(self, name):
+        return name in self.store.timestamps
+
+    def __repr__(self):
+        return repr(dict(self))
+
+    def set_values(self, changes, timestamp):
+        """
+            :param changes: new value of each changed property
+            :param timestamp: monotonic time of the update
+            :type changes: dict
+        """
+        for name, value in changes.items():
+            self.store.set_value(self.slot, name, value, timestamp)
+
+    def get_timestamp(self, name):
+        """
+            :return: monotonic time of the last update of the property, None if it has never been read
+        """
+        return self.store.get_timestamp(self.slot, name)
+
+    def expire(self):
+        """
+            See YeelightStateStore.expire
+        """
+        self.store.expire(self.slot)
@@ -0,0 +1,130 @@
+MODE_SCHEMA = "schema"
+MODE_FAST = "fast"
+
+# Integer parameters : (minimum, maximum), None if there is no maximum
+INT_RULES = {
+    "temperature": (1700, 6500),
+    "red": (0, 255),
+    "green": (0, 255),
+    "blue": (0, 255),
+    "hue": (0, 359),
+    "saturation": (0, 100),
+    "brightness": (1, 100),
+    "transition_time": (30, None),
+    "minutes": (1, None),
+    "duration": (50, None),
+}
+
+# Parameters taking one value among a list
+CHOICE_RULES = {
+    "effect": ("sudden", "smooth"),
+    "action": ("increase", "decrease", "circle"),
+    "prop": ("bright", "ct", "color"),
+}
+
+# Parameters checked for each method of the bulb API
+COMMAND_PARAMETERS = {
+    "set_ct_abx": ("temperature", "effect", "transition_time"),
+    "set_rgb": ("red", "green", "blue", "effect", "transition_time"),
+    "set_hsv": ("hue", "saturation", "effect", "transition_time"),
+    "set_bright": ("brightness", "effect", "transition_time"),
+    "set_power": ("effect", "transition_time"),
+    "set_adjust": ("action", "prop"),
+    # set_scene takes different parameters for each kind of scene
+    "set_scene_color": ("red", "green", "blue", "brightness"),
+    "set_scene_hsv": ("hue", "saturation", "brightness"),
+    "set_scene_ct": ("temperature", "brightness"),
+    "set_scene_auto_delay_off": ("brightness", "minutes"),
+    # Steps of a start_cf flow expression
+    "flow_color": ("red", "green", "blue", "duration"),
+    "flow_ct": ("temperature", "duration"),
+    "flow_sleep": ("duration",),
+    "flow_brightness": ("brightness",),
+}
+
+# Mode used by the bulbs that don't set their own
+default_mode = MODE_SCHEMA
+
+
+def build_schema(parameters):
+    """
+        Compile the rules of some parameters into a voluptuous Schema
+
+        :param parameters: names of the parameters
+        :rtype: Schema
+    """
+    # voluptuous is only imported by the first schema mode validation, it is slow to import
+    from voluptuous import Schema, All, Any, Range
+    rules = {}
+    for name in parameters:
+        if name in INT_RULES:
+            minimum, maximum = INT_RULES[name]
+            rules[name] = All(int, Range(min=minimum, max=maximum))
+        else:
+            rules[name] = Any(*CHOICE_RULES[name])
+    return Schema(rules)
+
+
+# Schemas compiled so far, each one is compiled the first time its method is validated
+SCHEMAS = {}
+
+
+def get_schema(method):
+    """
+        :param method: method of the bulb API
+        :return: the compiled schema of the method
+        :rtype: Schema
+    """
+    schema = SCHEMAS.get(method)
+    if schema is None:
+        schema = SCHEMAS[method] = build_schema(COMMAND_PARAMETERS[method])
+    return schema
+
+
+def set_default_mode(mode):
+    """
+        Select the validation mode of every bulb that doesn't set its own
+
+        :param mode: MODE_SCHEMA or MODE_FAST
+    """
+    global default_mode
+    if mode not in (MODE_SCHEMA, MODE_FAST):
+        raise ValueError("Unknown validation mode '{}'".format(mode))
+    default_mode = mode
+
+
+def validate(method, values, mode=None):
+    """
+        Check the parameters of a command
+
+        :param method: method of the bulb API
+        :param values: value of each parameter
+        :param mode: MODE_SCHEMA or MODE_FAST, default_mode if None
+
+        :type method: str
+        :type values: dict
+    """
+    if mode is None:
+        mode = default_mode
+    if mode == MODE_FAST:
+        check(method, values)
+    else:
+        get_schema(method)(values)
+
+
+def check(method, values):
+    """
+        Fast mode validation : same rules as the schemas checked with plain comparisons.
+        Raise ValueError instead of voluptuous.Invalid
+
+        :param method: method of the bulb API
+        :param values: value of each parameter
+    """
+    for name in COMMAND_PARAMETERS[method]:
+        value = values[name]
+        if name in INT_RULES:
+            minimum, maximum = INT_RULES[name]
+            if not isinstance(value, int) or value < minimum or (maximum is not None and value > maximum):
+                raise ValueError("{} must be an int between {} and {}, got {!r}".format(name, minimum, maximum, value))
+        elif value not in CHOICE_RULES[name]:
+            raise ValueError("{} must be one of {}, got {!r}".format(name, CHOICE_RULES[name], value))